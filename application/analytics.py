@@ -0,0 +1,246 @@
+import math, threading
+from array import array
+from bisect import bisect_left
+
+from .storage import reading_epoch, NO_DBM, FLAG_AVAILABLE, FLAG_AVAILABILITY_SET
+
+np = None                 # NumPy is optional and slow to import; see load_numpy()
+_numpy_missing = False
+
+
+def load_numpy():
+    """Import NumPy on first use; returns the module, or None if not installed"""
+    global np, _numpy_missing
+    if np is None and not _numpy_missing:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            _numpy_missing = True
+    return np
+
+PERCENTILES = (5, 50, 95)
+QUALITY_BINS = list(range(0, 101, 10))
+# dBm histogram used for percentiles
+DBM_MIN, DBM_MAX, BIN_WIDTH = -120, -50, 0.5
+N_BINS = int((DBM_MAX - DBM_MIN) / BIN_WIDTH) + 1
+
+
+class ReadingColumns(object):
+    """Readings kept as typed column buffers for vectorised analytics.
+
+    Columns are plain ``array`` buffers so appends stay cheap; queries wrap
+    them in NumPy arrays without copying. Operators and network types are
+    dictionary-encoded. Rows are kept sorted by epoch so a time range is two
+    binary searches. Resizing a buffer while NumPy views exist is not
+    allowed, so every access goes through ``lock``.
+    """
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.epochs = array('d')
+        self.dbm = array('f')          # NaN when the signal strength is unknown
+        self.operator_codes = array('H')
+        self.type_codes = array('H')
+        self.available = array('B')
+        self.operators, self._operator_index = [], {}
+        self.network_types, self._type_index = [], {}
+        self.max_id = 0
+        self.sorted = True
+
+    def __len__(self):
+        return len(self.epochs)
+
+    def _code(self, names, index, name):
+        code = index.get(name)
+        if code is None:
+            code = index[name] = len(names)
+            names.append(name)
+        return code
+
+    def extend(self, readings):
+        with self.lock:
+            for reading in readings:
+                epoch = reading_epoch(reading)
+                try:
+                    dbm = float(reading['signal_strength'])
+                except (KeyError, TypeError, ValueError):
+                    dbm = math.nan
+                if self.epochs and epoch < self.epochs[-1]:
+                    self.sorted = False
+                self.epochs.append(epoch)
+                self.dbm.append(dbm)
+                self.operator_codes.append(self._code(self.operators, self._operator_index, reading.get('operator')))
+                self.type_codes.append(self._code(self.network_types, self._type_index, reading.get('network_type')))
+                self.available.append(1 if reading.get('availability', True) else 0)
+                if isinstance(reading.get('id'), int):
+                    self.max_id = max(self.max_id, reading['id'])
+
+    def extend_records(self, records, operators, network_types):
+        """Append rows from a BinaryStore ``view()`` without decoding them one by one;
+        ``operators`` and ``network_types`` are the store's names by code"""
+        if not len(records):
+            return
+        with self.lock:
+            operator_map = np.array([self._code(self.operators, self._operator_index, name)
+                                     for name in operators], dtype=np.uint16)
+            type_map = np.array([self._code(self.network_types, self._type_index, name)
+                                 for name in network_types], dtype=np.uint16)
+            epochs = records["epoch"].astype(np.float64)
+            if (self.epochs and epochs[0] < self.epochs[-1]) or bool(np.any(np.diff(epochs) < 0)):
+                self.sorted = False
+            dbm = records["dbm"]
+            flags = records["flags"]
+            self.epochs.frombytes(epochs.tobytes())
+            self.dbm.frombytes(np.where(dbm == NO_DBM, np.nan, dbm / 10.0).astype(np.float32).tobytes())
+            self.operator_codes.frombytes(operator_map[records["operator"]].tobytes())
+            self.type_codes.frombytes(type_map[records["network_type"]].tobytes())
+            self.available.frombytes(np.where(flags & FLAG_AVAILABILITY_SET, flags & FLAG_AVAILABLE, 1)
+                                     .astype(np.uint8).tobytes())
+            self.max_id = max(self.max_id, int(records["id"].max()))
+
+    def _sort(self):
+        order = np.argsort(np.frombuffer(self.epochs, dtype=np.float64), kind="stable")
+        for name in ("epochs", "dbm", "operator_codes", "type_codes", "available"):
+            column = getattr(self, name)
+            setattr(self, name, array(column.typecode, np.frombuffer(column, dtype=column.typecode)[order].tobytes()))
+        self.sorted = True
+
+    def drop_before(self, epoch):
+        """Forget rows older than ``epoch`` (after raw data was purged)"""
+        with self.lock:
+            if not self.sorted:
+                self._sort()
+            cut = bisect_left(self.epochs, epoch)
+            for name in ("epochs", "dbm", "operator_codes", "type_codes", "available"):
+                del getattr(self, name)[:cut]
+
+    def window(self, start=None, end=None):
+        """Zero-copy NumPy views of the rows with ``start <= epoch < end``.
+
+        Must be called, and the result used, while holding ``lock``.
+        """
+        if not self.sorted:
+            self._sort()
+        epochs = np.frombuffer(self.epochs, dtype=np.float64)
+        lo = 0 if start is None else int(np.searchsorted(epochs, start, side="left"))
+        hi = len(epochs) if end is None else int(np.searchsorted(epochs, end, side="left"))
+        return {
+            "epoch": epochs[lo:hi],
+            "dbm": np.frombuffer(self.dbm, dtype=np.float32)[lo:hi],
+            "operator": np.frombuffer(self.operator_codes, dtype=np.uint16)[lo:hi],
+            "network_type": np.frombuffer(self.type_codes, dtype=np.uint16)[lo:hi],
+            "available": np.frombuffer(self.available, dtype=np.uint8)[lo:hi],
+        }
+
+
+def _quality(dbm):
+    """Vectorised NetworkDataHandler.get_signal_quality"""
+    return np.clip(((dbm + 120) / 70) * 100, 0, 100).astype(np.int64)
+
+
+def _percentiles(histogram, total):
+    """Percentile values from a row of the dBm histogram"""
+    cumulative = np.cumsum(histogram)
+    ranks = np.maximum(1, np.ceil(np.array(PERCENTILES) / 100 * total))
+    bins = np.searchsorted(cumulative, ranks)
+    return DBM_MIN + bins * BIN_WIDTH
+
+
+def _aggregate(codes, n_groups, dbm, available):
+    """Additive per-group aggregates in one bincount pass each: counts,
+    availability, dBm sums, quality sums and a dBm histogram per group"""
+    valid = ~np.isnan(dbm)
+    valid_codes = codes[valid]
+    values = dbm[valid].astype(np.float64)
+    quality = _quality(values)
+    bins = np.clip(np.rint((values - DBM_MIN) / BIN_WIDTH), 0, N_BINS - 1).astype(np.int64)
+    aggregates = {
+        "count": np.bincount(codes, minlength=n_groups),
+        "available": np.bincount(codes, weights=available, minlength=n_groups),
+        "dbm_count": np.bincount(valid_codes, minlength=n_groups),
+        "dbm_sum": np.bincount(valid_codes, weights=values, minlength=n_groups),
+        "quality_sum": np.bincount(valid_codes, weights=quality, minlength=n_groups),
+        "histogram": np.bincount(valid_codes * N_BINS + bins,
+                                 minlength=n_groups * N_BINS).reshape(n_groups, N_BINS),
+    }
+    quality_histogram = np.bincount(np.minimum(quality // 10, len(QUALITY_BINS) - 2),
+                                    minlength=len(QUALITY_BINS) - 1)
+    return aggregates, quality_histogram
+
+
+def _summaries(aggregates):
+    """One summary dict per group index with at least one reading"""
+    summaries = {}
+    for code in np.nonzero(aggregates["count"])[0]:
+        n, n_valid = int(aggregates["count"][code]), int(aggregates["dbm_count"][code])
+        up = int(aggregates["available"][code])
+        summary = {
+            "count": n,
+            "availability": round(up / n, 4),
+            "unavailable": n - up,
+            "mean_dbm": round(float(aggregates["dbm_sum"][code] / n_valid), 2) if n_valid else None,
+        }
+        values = _percentiles(aggregates["histogram"][code], n_valid) if n_valid else [None] * len(PERCENTILES)
+        for q, value in zip(PERCENTILES, values):
+            summary[f"p{q}_dbm"] = None if value is None else float(value)
+        summary["mean_quality"] = round(float(aggregates["quality_sum"][code] / n_valid), 2) if n_valid else None
+        summaries[int(code)] = summary
+    return summaries
+
+
+def _empty_summary():
+    summary = {"count": 0, "availability": None, "unavailable": 0, "mean_dbm": None}
+    summary.update({f"p{q}_dbm": None for q in PERCENTILES})
+    summary["mean_quality"] = None
+    return summary
+
+
+def compute_stats(columns, start=None, end=None, operator=None, network_type=None):
+    """Batch statistics over a time range: overall, per operator, per network
+    type, per operator/type pair, and a signal quality histogram.
+
+    Aggregates are computed once per operator/type pair and summed for the
+    coarser groupings. Percentiles come from a 0.5 dB histogram over
+    -120..-50 dBm.
+    """
+    if load_numpy() is None:
+        raise RuntimeError("NumPy is required for analytics")
+    with columns.lock:
+        view = columns.window(start, end)
+        mask = None
+        for name, index, value in (("operator", columns._operator_index, operator),
+                                   ("network_type", columns._type_index, network_type)):
+            if value is None:
+                continue
+            code = index.get(value)
+            match = view[name] == code if code is not None else np.zeros(len(view[name]), dtype=bool)
+            mask = match if mask is None else mask & match
+        if mask is not None:
+            view = {name: column[mask] for name, column in view.items()}
+
+        n_operators, n_types = max(len(columns.operators), 1), max(len(columns.network_types), 1)
+        pairs = view["operator"].astype(np.int64) * n_types + view["network_type"]
+        by_pair, quality_histogram = _aggregate(pairs, n_operators * n_types, view["dbm"], view["available"])
+        del view, pairs
+
+    grid = {name: values.reshape((n_operators, n_types) + values.shape[1:]) for name, values in by_pair.items()}
+    by_operator = _summaries({name: values.sum(axis=1) for name, values in grid.items()})
+    by_type = _summaries({name: values.sum(axis=0) for name, values in grid.items()})
+    overall = _summaries({name: values.sum(axis=(0, 1))[np.newaxis] for name, values in grid.items()})
+
+    return {
+        "start": start,
+        "end": end,
+        "overall": overall.get(0, _empty_summary()),
+        "by_operator": {str(columns.operators[code]): summary for code, summary in by_operator.items()},
+        "by_network_type": {str(columns.network_types[code]): summary for code, summary in by_type.items()},
+        "by_operator_type": [
+            dict(operator=columns.operators[key // n_types], network_type=columns.network_types[key % n_types],
+                 **summary)
+            for key, summary in _summaries(by_pair).items()
+        ],
+        "quality_histogram": [
+            {"from": lo, "to": hi, "count": int(count)}
+            for lo, hi, count in zip(QUALITY_BINS[:-1], QUALITY_BINS[1:], quality_histogram)
+        ],
+    }
@@ -0,0 +1,219 @@
+import sys, threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+from .storage import reading_epoch
+
+
+def _reading_size(reading):
+    """Rough in-memory footprint of a reading dict"""
+    return sys.getsizeof(reading) + sum(sys.getsizeof(value) for value in reading.values())
+
+
+class ReadingCache(object):
+    """Process-level hot cache in front of a readings store.
+
+    Readings are cached in fixed time buckets (``bucket_seconds`` wide). The
+    newest ``pinned_buckets`` buckets and the latest reading stay resident;
+    older buckets are evicted least-recently-used once ``max_bytes`` is
+    exceeded. Our own writes update the cache in place, while writes from
+    other processes are noticed through the store's file signature
+    (mtime/size) and invalidate everything.
+
+    Cached readings are shared between callers and must be treated as
+    read-only.
+    """
+    def __init__(self, store, max_bytes=32 * 1024 * 1024, bucket_seconds=3600, pinned_buckets=2):
+        self.store = store
+        self.max_bytes = max_bytes
+        self.bucket_seconds = bucket_seconds
+        self.pinned_buckets = pinned_buckets
+        self.lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.clear()
+        self._signature = store.signature()
+
+    def clear(self):
+        with self.lock:
+            # bucket number -> [epochs, readings, bytes]
+            self.buckets = OrderedDict()
+            self.bytes = 0
+            self.tail = None
+            self.tail_loaded = False
+
+    def reset(self):
+        """Forget everything after the store was rewritten in-process"""
+        with self.lock:
+            self.clear()
+            self._signature = self.store.signature()
+
+    def _check(self):
+        """Drop everything if another process changed the store under us"""
+        signature = self.store.signature()
+        if signature != self._signature:
+            self.store.refresh()
+            self.clear()
+            self.invalidations += 1
+            self._signature = self.store.signature()
+
+    def _bucket_of(self, epoch):
+        return int(epoch // self.bucket_seconds)
+
+    def _pinned_from(self):
+        bounds = self.store.bounds()
+        if bounds[1] is None:
+            return None
+        return self._bucket_of(bounds[1]) - self.pinned_buckets + 1
+
+    def _add_bucket(self, number, readings):
+        epochs = [reading_epoch(reading) for reading in readings]
+        size = sum(_reading_size(reading) for reading in readings)
+        self.buckets[number] = [epochs, readings, size]
+        self.bytes += size
+
+    def _evict(self):
+        pinned_from = self._pinned_from()
+        for number in list(self.buckets):
+            if self.bytes <= self.max_bytes:
+                break
+            if pinned_from is not None and number >= pinned_from:
+                continue
+            self.bytes -= self.buckets.pop(number)[2]
+            self.evictions += 1
+
+    def _load_buckets(self, first, last):
+        """Fill missing buckets, scanning each contiguous gap only once"""
+        run_start = None
+        for number in range(first, last + 2):
+            missing = number <= last and number not in self.buckets
+            if missing:
+                self.misses += 1
+                if run_start is None:
+                    run_start = number
+                continue
+            if number <= last:
+                self.hits += 1
+                self.buckets.move_to_end(number)
+            if run_start is not None:
+                grouped = {n: [] for n in range(run_start, number)}
+                rows = self.store.scan(run_start * self.bucket_seconds, number * self.bucket_seconds)
+                for reading in rows:
+                    grouped[self._bucket_of(reading_epoch(reading))].append(reading)
+                for n, readings in grouped.items():
+                    self._add_bucket(n, readings)
+                run_start = None
+
+    # -- public API ----------------------------------------------------------
+
+    def latest(self):
+        with self.lock:
+            self._check()
+            if self.tail_loaded:
+                self.hits += 1
+                return self.tail
+            self.misses += 1
+            self.tail = self.store.latest()
+            self.tail_loaded = True
+            return self.tail
+
+    def range(self, start=None, end=None, operator=None):
+        """Readings with ``start <= epoch < end`` in time order"""
+        with self.lock:
+            self._check()
+            first_epoch, last_epoch = self.store.bounds()
+            if first_epoch is None:
+                return []
+            start = first_epoch if start is None else max(start, first_epoch)
+            stop = last_epoch if end is None else min(end, last_epoch + 1)
+            if start > stop:
+                return []
+
+            first, last = self._bucket_of(start), self._bucket_of(stop)
+            self._load_buckets(first, last)
+
+            result = []
+            for number in range(first, last + 1):
+                epochs, readings, _ = self.buckets[number]
+                lo = bisect_left(epochs, start) if number == first else 0
+                hi = bisect_left(epochs, end) if end is not None and number == last else len(epochs)
+                if operator is None:
+                    result.extend(readings[lo:hi])
+                else:
+                    result.extend(r for r in readings[lo:hi] if r.get('operator') == operator)
+            self._evict()
+            return result
+
+    def page(self, start=None, end=None, operator=None, after=None, limit=100):
+        """Up to ``limit`` readings with ``start <= epoch < end`` that sort
+        after the ``(epoch, id)`` keyset cursor ``after``, from cached buckets.
+
+        Returns None as soon as a bucket the page needs is not cached, so the
+        caller can read the store instead; pages never load buckets.
+        """
+        with self.lock:
+            self._check()
+            first_epoch, last_epoch = self.store.bounds()
+            if first_epoch is None:
+                return []
+            if after is not None:
+                start = after[0] if start is None else max(start, after[0])
+            start = first_epoch if start is None else max(start, first_epoch)
+            stop = last_epoch if end is None else min(end, last_epoch + 1)
+            result = []
+            if start > stop:
+                return result
+            for number in range(self._bucket_of(start), self._bucket_of(stop) + 1):
+                bucket = self.buckets.get(number)
+                if bucket is None:
+                    return None
+                self.hits += 1
+                epochs, readings, _ = bucket
+                hi = bisect_left(epochs, end) if end is not None else len(epochs)
+                for reading in readings[bisect_left(epochs, start):hi]:
+                    if operator is not None and reading.get('operator') != operator:
+                        continue
+                    if after is not None and reading_epoch(reading) == after[0] and reading.get('id', 0) <= after[1]:
+                        continue
+                    result.append(reading)
+                    if len(result) >= limit:
+                        return result
+            return result
+
+    def on_append(self, readings):
+        """Fold readings we just wrote into the cache"""
+        with self.lock:
+            for reading in readings:
+                epoch = reading_epoch(reading)
+                if not self.tail_loaded or self.tail is None or epoch >= reading_epoch(self.tail):
+                    self.tail = reading
+                    self.tail_loaded = True
+                bucket = self.buckets.get(self._bucket_of(epoch))
+                if bucket is not None:
+                    i = bisect_right(bucket[0], epoch)
+                    if any(r.get('id') == reading.get('id') for r in bucket[1][bisect_left(bucket[0], epoch):i]):
+                        continue  # another process's reading, already loaded when the cache refilled
+                    bucket[0].insert(i, epoch)
+                    bucket[1].insert(i, reading)
+                    size = _reading_size(reading)
+                    bucket[2] += size
+                    self.bytes += size
+            self._signature = self.store.signature()
+            self._evict()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "buckets": len(self.buckets),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,196 @@
+import os, json, math, time, logging, threading
+
+from .storage import reading_epoch
+
+# Cell edge in degrees: ~11 km, ~1.1 km and ~110 m at the equator
+GRIDS = {"coarse": 0.1, "medium": 0.01, "fine": 0.001}
+
+# Aggregate slots
+COUNT, DBM_COUNT, DBM_SUM, DBM_MIN, DBM_MAX, QUALITY_SUM, AVAILABLE = range(7)
+
+
+def _cell(latitude, longitude, size):
+    """Grid (row, column) containing a point"""
+    return int(math.floor((latitude + 90) / size)), int(math.floor((longitude + 180) / size))
+
+
+class CoverageIndex(object):
+    """Fixed-grid spatial index of signal coverage per operator.
+
+    Every reading with a position is folded into one cell per grid size
+    (``GRIDS``), keeping count, min/avg/max dBm, average quality and the
+    availability ratio per (cell, operator). Cells are updated as readings
+    are saved, so a bounding-box query only visits the cells inside the box
+    and never touches raw readings. Coverage spans all saved readings; it is
+    checkpointed to ``path`` and caught up from the store on startup.
+    """
+    def __init__(self, path, quality, max_cells=10000, save_interval=60):
+        self.path = path
+        self.quality = quality
+        self.max_cells = max_cells
+        self.save_interval = save_interval
+        self.lock = threading.RLock()
+        self.cells = {name: {} for name in GRIDS}
+        self.last_id = 0
+        self.last_epoch = None
+        self._last_save = time.monotonic()
+        self.loaded = self._load()
+
+    # -- persistence ---------------------------------------------------------
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            for name in GRIDS:
+                for row, column, operator, aggregate in data["cells"].get(name, []):
+                    self.cells[name].setdefault((row, column), {})[operator] = aggregate
+            self.last_id = data.get("last_id", 0)
+            self.last_epoch = data.get("last_epoch")
+            return True
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Discarding unreadable coverage file {self.path}: {e}")
+            self.cells = {name: {} for name in GRIDS}
+            return False
+
+    def save(self):
+        with self.lock:
+            data = {
+                "last_id": self.last_id,
+                "last_epoch": self.last_epoch,
+                "cells": {
+                    name: [[key[0], key[1], operator, aggregate]
+                           for key, operators in cells.items() for operator, aggregate in operators.items()]
+                    for name, cells in self.cells.items()
+                },
+            }
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"   # several worker processes may save
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+            self._last_save = time.monotonic()
+
+    # -- updates -------------------------------------------------------------
+
+    def add(self, reading):
+        if isinstance(reading.get('id'), int):
+            self.last_id = max(self.last_id, reading['id'])
+        epoch = reading_epoch(reading)
+        self.last_epoch = epoch if self.last_epoch is None else max(self.last_epoch, epoch)
+        try:
+            latitude, longitude = float(reading['latitude']), float(reading['longitude'])
+        except (KeyError, TypeError, ValueError):
+            return
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            return
+        operator = reading.get('operator')
+        available = bool(reading.get('availability', True))
+        try:
+            dbm = float(reading['signal_strength'])
+        except (KeyError, TypeError, ValueError):
+            dbm = None
+
+        for name, size in GRIDS.items():
+            operators = self.cells[name].setdefault(_cell(latitude, longitude, size), {})
+            aggregate = operators.get(operator)
+            if aggregate is None:
+                aggregate = operators[operator] = [0, 0, 0.0, None, None, 0, 0]
+            aggregate[COUNT] += 1
+            aggregate[AVAILABLE] += available
+            if dbm is not None:
+                aggregate[DBM_COUNT] += 1
+                aggregate[DBM_SUM] += dbm
+                aggregate[DBM_MIN] = dbm if aggregate[DBM_MIN] is None else min(aggregate[DBM_MIN], dbm)
+                aggregate[DBM_MAX] = dbm if aggregate[DBM_MAX] is None else max(aggregate[DBM_MAX], dbm)
+                aggregate[QUALITY_SUM] += self.quality(dbm)
+
+    def add_many(self, readings):
+        with self.lock:
+            since = self.last_id
+            for reading in readings:
+                # Already counted (e.g. by catch_up while another process was writing)
+                if isinstance(reading.get('id'), int) and reading['id'] <= since:
+                    continue
+                self.add(reading)
+            if time.monotonic() - self._last_save >= self.save_interval:
+                self.save()
+
+    def rebuild(self, readings):
+        """Recompute every cell from raw readings"""
+        with self.lock:
+            self.cells = {name: {} for name in GRIDS}
+            self.last_id = 0
+            self.last_epoch = None
+            for reading in readings:
+                self.add(reading)
+            self.save()
+            self.loaded = True
+
+    def catch_up(self, readings):
+        """Fold in readings saved after the last persisted checkpoint"""
+        with self.lock:
+            added = 0
+            # Scans run in time order, and ids from several writers need not be
+            since = self.last_id
+            for reading in readings:
+                if isinstance(reading.get('id'), int) and reading['id'] <= since:
+                    continue
+                self.add(reading)
+                added += 1
+            if added:
+                self.save()
+            return added
+
+    # -- queries -------------------------------------------------------------
+
+    def pick_resolution(self, min_lat, min_lon, max_lat, max_lon):
+        """Finest grid whose cell count over the box stays within ``max_cells``"""
+        for name in sorted(GRIDS, key=GRIDS.get):
+            size = GRIDS[name]
+            rows = math.floor((max_lat + 90) / size) - math.floor((min_lat + 90) / size) + 1
+            columns = math.floor((max_lon + 180) / size) - math.floor((min_lon + 180) / size) + 1
+            if rows * columns <= self.max_cells:
+                return name
+        return max(GRIDS, key=GRIDS.get)
+
+    def query(self, min_lat, min_lon, max_lat, max_lon, operator=None, resolution=None):
+        """Per-cell, per-operator aggregates for cells overlapping the box"""
+        resolution = resolution or self.pick_resolution(min_lat, min_lon, max_lat, max_lon)
+        size = GRIDS[resolution]
+        row_lo, column_lo = _cell(min_lat, min_lon, size)
+        row_hi, column_hi = _cell(max_lat, max_lon, size)
+        rows = []
+        with self.lock:
+            cells = self.cells[resolution]
+            if (row_hi - row_lo + 1) * (column_hi - column_lo + 1) <= len(cells):
+                keys = ((row, column) for row in range(row_lo, row_hi + 1)
+                        for column in range(column_lo, column_hi + 1) if (row, column) in cells)
+            else:
+                keys = (key for key in cells
+                        if row_lo <= key[0] <= row_hi and column_lo <= key[1] <= column_hi)
+            for key in keys:
+                for op, aggregate in cells[key].items():
+                    if operator is not None and op != operator:
+                        continue
+                    rows.append(self._row(resolution, size, key, op, aggregate))
+        rows.sort(key=lambda row: (row["cell"], str(row["operator"])))
+        return rows
+
+    @staticmethod
+    def _row(resolution, size, key, operator, aggregate):
+        min_lat, min_lon = key[0] * size - 90, key[1] * size - 180
+        dbm_count = aggregate[DBM_COUNT]
+        return {
+            "resolution": resolution,
+            "cell": [key[0], key[1]],
+            "bbox": [round(min_lat, 6), round(min_lon, 6), round(min_lat + size, 6), round(min_lon + size, 6)],
+            "operator": operator,
+            "count": aggregate[COUNT],
+            "min_dbm": aggregate[DBM_MIN],
+            "avg_dbm": round(aggregate[DBM_SUM] / dbm_count, 1) if dbm_count else None,
+            "max_dbm": aggregate[DBM_MAX],
+            "avg_quality": round(aggregate[QUALITY_SUM] / dbm_count, 1) if dbm_count else None,
+            "availability": round(aggregate[AVAILABLE] / aggregate[COUNT], 4),
+        }
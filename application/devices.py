@@ -0,0 +1,143 @@
+import logging, threading
+
+import serial
+
+import config
+from .logic import SIM800C
+from .sampler import Sampler
+from .pool import ModemPool
+from .status import ModemStatus, SharedStatus
+from .retention import RetentionWorker
+from .sms import MessageStore, SMSReceiver
+
+
+def probe_ports(ports):
+    """First port in ``ports`` that can be opened, or None"""
+    for port in ports:
+        try:
+            # Probe only; the SIM800C connection owns the one open handle
+            serial.Serial(port, 9600, timeout=1).close()  # Adjust the baud rate as needed
+            print(f"Serial port initialized successfully on {port}.")
+            return port
+        except serial.SerialException as e:
+            print(f"Error initializing serial port on {port}: {e}")
+    print("No valid serial port found. Network Analyser functionality will be disabled.")
+    return None
+
+
+class DeviceManager(object):
+    """Finds, connects and samples the SIM800C module(s) off the request path.
+
+    Nothing touches the hardware at import time: ``start()`` (called on the
+    first request, or by sampler.py) runs port probing, the modem connection
+    and the sampler or modem pool in a background thread. Until it finishes,
+    ``status`` reports that the module is still being looked for; after
+    that, that it is not connected when no port answered.
+
+    With several worker processes only the primary (see
+    ``NetworkDataHandler.claim_primary``) touches the modem and publishes
+    its status to STATUS_FILE. The others are ``secondary``: they show that
+    shared status and keep trying to take over in case the primary exits.
+    """
+    def __init__(self, handler, ports):
+        self.handler = handler
+        self.ports = ports
+        self.port = None
+        self.sim800c = None
+        self.status = ModemStatus(None, ttl=config.STATUS_TTL, max_age=config.STATUS_MAX_AGE,
+                                  path=config.STATUS_FILE)
+        self.sampler = None
+        self.pool = None
+        self.publisher = None
+        self.messages = MessageStore(config.SMS_FILE)
+        self.sms = None
+        self.state = "idle"
+        self.ready = threading.Event()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def start(self, sampling=True):
+        """Begin discovery in the background (only the first call does anything)"""
+        with self._lock:
+            if self.state != "idle":
+                return self
+            if self.handler.claim_primary():
+                self.state = "discovering"
+                target = self._discover
+            else:
+                self.state = "secondary"
+                self.status = SharedStatus(config.STATUS_FILE, max_age=config.STATUS_MAX_AGE)
+                target = self._wait_for_primary
+        threading.Thread(target=target, args=(sampling,), name="device-discovery", daemon=True).start()
+        return self
+
+    def _wait_for_primary(self, sampling):
+        """Take over the modem once the primary process goes away"""
+        self.ready.set()
+        while not self._stop.wait(config.PRIMARY_RETRY_INTERVAL):
+            if self.handler.claim_primary():
+                logging.info("Primary worker went away; taking over the SIM800C module")
+                self.ready.clear()
+                self.status = ModemStatus(None, ttl=config.STATUS_TTL, max_age=config.STATUS_MAX_AGE,
+                                          path=config.STATUS_FILE)
+                self.state = "discovering"
+                self._discover(sampling)
+                return
+
+    def _discover(self, sampling):
+        try:
+            self.port = probe_ports(self.ports)
+            if self.port:
+                self.sim800c = SIM800C(port=self.port, baudrate=9600)
+                self.sim800c.connect()
+                if config.SMS_ENABLED:
+                    self.sms = SMSReceiver(self.sim800c.connection, self.messages,
+                                           delete=config.SMS_DELETE_AFTER_SAVE).start()
+            self.status.discovery_finished(self.sim800c)
+            if sampling:
+                self._start_sampling()
+            if self.port and config.STATUS_FILE:
+                # Keep the shared snapshot fresh for the other worker processes
+                self.publisher = RetentionWorker(self.status.get, interval=config.STATUS_TTL,
+                                                 name="status").start()
+            self.state = "ready" if self.port else "no_device"
+        except Exception as e:
+            logging.error(f"Device discovery failed: {e}")
+            self.state = "failed"
+            self.status.discovery_finished(self.sim800c)
+        finally:
+            self.ready.set()
+
+    def _start_sampling(self):
+        """Background sampling (see config.SAMPLER_*)"""
+        if config.MODEM_POOL_ENABLED:
+            shared = {self.port: self.sim800c} if self.port else {}
+            self.pool = ModemPool(self.handler, config.SAMPLER_INTERVALS, jitter=config.SAMPLER_JITTER,
+                                  scan_interval=config.MODEM_POOL_SCAN_INTERVAL, ports=config.MODEM_POOL_PORTS,
+                                  shared=shared, on_sample=self.status.update).start()
+        elif config.SAMPLER_ENABLED:
+            modem = SIM800C(port=config.SAMPLER_PORT, baudrate=9600) if config.SAMPLER_PORT else self.sim800c
+            if modem is not None and modem.connect():
+                self.sampler = Sampler(modem, self.handler, config.SAMPLER_INTERVALS,
+                                       jitter=config.SAMPLER_JITTER,
+                                       on_sample=self.status.update if modem is self.sim800c else None).start()
+            else:
+                print("Sampler disabled: SIM800C module not connected.")
+
+    def stop(self):
+        self._stop.set()
+        if self.publisher:
+            self.publisher.stop()
+        if self.sms:
+            self.sms.stop()
+        if self.pool:
+            self.pool.stop()
+        if self.sampler:
+            self.sampler.stop()
+
+    def sampler_stats(self):
+        if self.pool is not None:
+            return self.pool.stats()
+        if self.sampler is None:
+            return {"running": False, "saved": 0, "metrics": {}}
+        return self.sampler.stats()
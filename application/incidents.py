@@ -0,0 +1,243 @@
+import os, json, time, logging, threading
+from datetime import datetime
+
+from .storage import reading_epoch, TIMESTAMP_FORMAT
+from .metrics import INCIDENTS
+
+KINDS = ("degradation", "outage")
+
+# Detector state slots, one list per (operator, device_id)
+FAST, BASELINE, SAMPLES, UNAVAILABLE_RUN, FIRST_UNAVAILABLE, DEGRADATION, OUTAGE = range(7)
+
+
+class IncidentDetector(object):
+    """Online degradation and outage detection, with the incidents it found.
+
+    Readings are fed in as they are saved, in id order. Per (operator,
+    device_id) it keeps a handful of numbers: a fast EWMA of dBm (the current
+    level), a slow EWMA baseline that stops learning while degraded, and the
+    run of consecutive unavailable readings. A degradation opens when the
+    current level falls ``drop_db`` below the baseline or reaches
+    ``floor_dbm``, and closes once it is back ``hysteresis_db`` inside both.
+    An outage opens after ``outage_after`` unavailable readings in a row
+    (starting at the first of them) and closes at the next available one.
+
+    Incidents are kept in memory, checkpointed to ``path`` with the detector
+    state and caught up from the store on startup like the rollups.
+    """
+    def __init__(self, path, fast_alpha=0.3, baseline_alpha=0.02, warmup=10, drop_db=15,
+                 floor_dbm=-105, hysteresis_db=3, outage_after=3, retention=None, save_interval=60):
+        self.path = path
+        self.fast_alpha = fast_alpha
+        self.baseline_alpha = baseline_alpha
+        self.warmup = warmup
+        self.drop_db = drop_db
+        self.floor_dbm = floor_dbm
+        self.hysteresis_db = hysteresis_db
+        self.outage_after = outage_after
+        self.retention = retention
+        self.save_interval = save_interval
+        self.lock = threading.RLock()
+        self._reset()
+        self._last_save = time.monotonic()
+        self.loaded = self._load()
+
+    def _reset(self):
+        self.state = {}                 # (operator, device_id) -> slots
+        self.incidents = {}             # id -> incident, in the order they opened
+        self.next_id = 1
+        self.last_id = 0
+        self.last_epoch = None
+
+    # -- persistence ---------------------------------------------------------
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            self.state = {(operator, device_id): slots for operator, device_id, slots in data["state"]}
+            self.incidents = {incident["id"]: incident for incident in data["incidents"]}
+            self.next_id = data.get("next_id", 1)
+            self.last_id = data.get("last_id", 0)
+            self.last_epoch = data.get("last_epoch")
+            return True
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logging.warning(f"Discarding unreadable incidents file {self.path}: {e}")
+            self._reset()
+            return False
+
+    def save(self):
+        with self.lock:
+            data = {
+                "next_id": self.next_id,
+                "last_id": self.last_id,
+                "last_epoch": self.last_epoch,
+                "state": [[key[0], key[1], slots] for key, slots in self.state.items()],
+                "incidents": list(self.incidents.values()),
+            }
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"   # several worker processes may save
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+            self._last_save = time.monotonic()
+
+    def prune(self, now=None):
+        """Drop closed incidents that ended before the retention window"""
+        if self.retention is None:
+            return
+        cutoff = (time.time() if now is None else now) - self.retention
+        with self.lock:
+            for incident_id, incident in list(self.incidents.items()):
+                if incident["end"] is not None and incident["end"] < cutoff:
+                    del self.incidents[incident_id]
+
+    # -- detection -----------------------------------------------------------
+
+    def _open(self, kind, key, start, **fields):
+        incident = {"id": self.next_id, "kind": kind, "operator": key[0], "device_id": key[1],
+                    "start": start, "end": None, "last_seen": start, "readings": 0}
+        incident.update(fields)
+        self.incidents[incident["id"]] = incident
+        self.next_id += 1
+        INCIDENTS.inc(kind=kind, event="opened")
+        logging.info(f"{kind.capitalize()} started for {key[0]} (device {key[1]}) at "
+                     f"{datetime.fromtimestamp(start).strftime(TIMESTAMP_FORMAT)}")
+        return incident["id"]
+
+    def _close(self, incident_id, end):
+        incident = self.incidents.get(incident_id)
+        if incident is None:
+            return
+        incident["end"] = max(end, incident["start"])
+        INCIDENTS.inc(kind=incident["kind"], event="closed")
+        logging.info(f"{incident['kind'].capitalize()} ended for {incident['operator']} "
+                     f"(device {incident['device_id']}) after {incident['end'] - incident['start']:.0f}s")
+
+    def _seen(self, incident_id, epoch):
+        incident = self.incidents.get(incident_id)
+        if incident is not None:
+            incident["readings"] += 1
+            incident["last_seen"] = max(incident["last_seen"], epoch)
+        return incident
+
+    def add(self, reading):
+        epoch = reading_epoch(reading)
+        key = (reading.get('operator'), reading.get('device_id'))
+        slots = self.state.get(key)
+        if slots is None:
+            slots = self.state[key] = [None, None, 0, 0, None, None, None]
+
+        if not reading.get('availability', True):
+            if slots[UNAVAILABLE_RUN] == 0:
+                slots[FIRST_UNAVAILABLE] = epoch
+            slots[UNAVAILABLE_RUN] += 1
+            if slots[OUTAGE] is not None:
+                self._seen(slots[OUTAGE], epoch)
+            elif slots[UNAVAILABLE_RUN] >= self.outage_after:
+                slots[OUTAGE] = self._open("outage", key, slots[FIRST_UNAVAILABLE])
+                incident = self.incidents[slots[OUTAGE]]
+                incident["readings"] = slots[UNAVAILABLE_RUN]
+                incident["last_seen"] = epoch
+        else:
+            if slots[OUTAGE] is not None:
+                self._close(slots[OUTAGE], epoch)
+                slots[OUTAGE] = None
+            slots[UNAVAILABLE_RUN] = 0
+            slots[FIRST_UNAVAILABLE] = None
+            self._add_signal(key, slots, reading, epoch)
+
+        if isinstance(reading.get('id'), int):
+            self.last_id = max(self.last_id, reading['id'])
+        self.last_epoch = epoch if self.last_epoch is None else max(self.last_epoch, epoch)
+
+    def _add_signal(self, key, slots, reading, epoch):
+        try:
+            dbm = float(reading['signal_strength'])
+        except (KeyError, TypeError, ValueError):
+            return
+        slots[SAMPLES] += 1
+        fast = slots[FAST] = dbm if slots[FAST] is None else slots[FAST] + self.fast_alpha * (dbm - slots[FAST])
+
+        if slots[DEGRADATION] is None:
+            baseline = slots[BASELINE] = dbm if slots[BASELINE] is None else \
+                slots[BASELINE] + self.baseline_alpha * (dbm - slots[BASELINE])
+            if slots[SAMPLES] >= self.warmup and (baseline - fast >= self.drop_db or fast <= self.floor_dbm):
+                slots[DEGRADATION] = self._open("degradation", key, epoch, readings=1, worst_dbm=dbm,
+                                                baseline_dbm=round(baseline, 1))
+        else:
+            incident = self._seen(slots[DEGRADATION], epoch)
+            if incident is not None:
+                incident["worst_dbm"] = min(incident["worst_dbm"], dbm)
+            if slots[BASELINE] - fast < self.drop_db - self.hysteresis_db and \
+                    fast > self.floor_dbm + self.hysteresis_db:
+                self._close(slots[DEGRADATION], epoch)
+                slots[DEGRADATION] = None
+
+    def add_many(self, readings):
+        with self.lock:
+            since = self.last_id
+            for reading in readings:
+                # Already seen (e.g. by catch_up while another process was writing)
+                if isinstance(reading.get('id'), int) and reading['id'] <= since:
+                    continue
+                self.add(reading)
+            if time.monotonic() - self._last_save >= self.save_interval:
+                self.prune()
+                self.save()
+
+    def rebuild(self, readings):
+        """Replay the whole history"""
+        with self.lock:
+            self._reset()
+            for reading in readings:
+                self.add(reading)
+            self.prune()
+            self.save()
+            self.loaded = True
+
+    def catch_up(self, readings):
+        """Feed readings saved after the last checkpoint"""
+        with self.lock:
+            added = 0
+            since = self.last_id
+            for reading in readings:
+                if isinstance(reading.get('id'), int) and reading['id'] <= since:
+                    continue
+                self.add(reading)
+                added += 1
+            if added:
+                self.save()
+            return added
+
+    # -- queries -------------------------------------------------------------
+
+    def query(self, start, end, operator=None, device_id=None, kind=None, ongoing=False, limit=None):
+        """Incidents overlapping ``start <= t < end``, newest first"""
+        rows = []
+        with self.lock:
+            for incident in self.incidents.values():
+                if incident["start"] >= end or (incident["end"] is not None and incident["end"] < start):
+                    continue
+                if operator is not None and incident["operator"] != operator:
+                    continue
+                if device_id is not None and incident["device_id"] != device_id:
+                    continue
+                if kind is not None and incident["kind"] != kind:
+                    continue
+                if ongoing and incident["end"] is not None:
+                    continue
+                rows.append(self._row(incident))
+        rows.sort(key=lambda row: (row["start"], row["id"]), reverse=True)
+        return rows[:limit] if limit else rows
+
+    @staticmethod
+    def _row(incident):
+        row = dict(incident)
+        row["ongoing"] = incident["end"] is None
+        row["duration"] = round((incident["last_seen"] if row["ongoing"] else incident["end"]) - incident["start"], 1)
+        row["start_time"] = datetime.fromtimestamp(incident["start"]).strftime(TIMESTAMP_FORMAT)
+        row["end_time"] = None if row["ongoing"] else \
+            datetime.fromtimestamp(incident["end"]).strftime(TIMESTAMP_FORMAT)
+        return row
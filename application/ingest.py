@@ -0,0 +1,116 @@
+import json, codecs
+
+REQUIRED_FIELDS = ['operator', 'signal_strength', 'network_type', 'latitude', 'longitude']
+WHITESPACE = " \t\r\n"
+
+
+def validate_reading(data):
+    """Check a posted reading; returns an error message or None.
+
+    Fills in ``availability`` (default True) on valid readings.
+    """
+    if not isinstance(data, dict):
+        return "Reading must be a JSON object"
+
+    # Check for missing fields
+    if not all(field in data for field in REQUIRED_FIELDS):
+        return "Missing required fields"
+
+    # Validate signal strength
+    try:
+        signal_strength = float(data['signal_strength'])
+        if signal_strength < -120 or signal_strength > -50:
+            return "Invalid signal strength range"
+    except (TypeError, ValueError):
+        return "Signal strength must be a number"
+
+    # Ensure latitude and longitude are numeric
+    try:
+        float(data['latitude'])
+        float(data['longitude'])
+    except (TypeError, ValueError):
+        return "Invalid latitude or longitude"
+
+    # Set availability to True if not provided
+    data['availability'] = data.get('availability', True)
+    return None
+
+
+def iter_json_items(stream, chunk_size=64 * 1024):
+    """Incrementally parse a JSON array or NDJSON request body.
+
+    Yields ``(item, error)`` pairs while reading ``stream`` in chunks, so
+    memory stays proportional to one item rather than the whole upload. A
+    malformed NDJSON line yields ``(None, message)`` and parsing carries on;
+    a malformed JSON array cannot be resynchronised and raises ValueError.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    pos = 0
+    eof = False
+    mode = None
+    expect = "item_or_end"
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in WHITESPACE:
+            pos += 1
+        if pos >= len(buffer) or (mode == "ndjson" and buffer.find("\n", pos) == -1 and not eof):
+            if eof:
+                break
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + text.decode(chunk or b"", final=eof)
+            pos = 0
+            continue
+
+        if mode is None:
+            if buffer[pos] == "[":
+                mode = "array"
+                pos += 1
+            else:
+                mode = "ndjson"
+            continue
+
+        if mode == "ndjson":
+            end = buffer.find("\n", pos)
+            end = len(buffer) if end == -1 else end
+            line = buffer[pos:end].strip()
+            pos = end + 1
+            try:
+                yield json.loads(line), None
+            except ValueError as e:
+                yield None, f"Invalid JSON: {e}"
+            continue
+
+        # JSON array
+        c = buffer[pos]
+        if expect == "separator":
+            if c == ",":
+                expect = "item"
+                pos += 1
+                continue
+            if c == "]":
+                return
+            raise ValueError(f"Expected ',' or ']' in JSON array, got {c!r}")
+        if c == "]" and expect == "item_or_end":
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except ValueError:
+            item, end = None, None
+        if end is None or (end == len(buffer) and not eof):
+            if eof:
+                raise ValueError("Malformed or truncated JSON array")
+            # Item may continue in the next chunk
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + text.decode(chunk or b"", final=eof)
+            pos = 0
+            continue
+        pos = end
+        expect = "separator"
+        yield item, None
+
+    if mode == "array":
+        raise ValueError("Unterminated JSON array")
@@ -0,0 +1,88 @@
+import json, threading
+from collections import deque
+
+from .metrics import LIVE_SUBSCRIBERS, LIVE_DROPPED
+
+
+class Subscription(object):
+    """Bounded queue of encoded events for one client.
+
+    When the client falls behind, the oldest events are dropped (a live view
+    only needs the newest) and counted in ``dropped``.
+    """
+    def __init__(self, max_queue=100):
+        self.events = deque(maxlen=max_queue)
+        self.condition = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, event):
+        with self.condition:
+            if len(self.events) == self.events.maxlen:
+                self.dropped += 1
+                LIVE_DROPPED.inc()
+            self.events.append(event)
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        """Next event, or None after ``timeout`` seconds without one"""
+        with self.condition:
+            if not self.events and not self.closed:
+                self.condition.wait(timeout)
+            return self.events.popleft() if self.events else None
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+class LiveFeed(object):
+    """In-process publish/subscribe of new readings for /api/live/stream.
+
+    ``publish`` encodes an event once and appends it to every subscriber's
+    queue without blocking, so a slow client never holds up the writer.
+    At most ``max_subscribers`` clients are accepted at a time.
+    """
+    def __init__(self, max_queue=100, max_subscribers=100):
+        self.max_queue = max_queue
+        self.max_subscribers = max_subscribers
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.published = 0
+        LIVE_SUBSCRIBERS.set_function(lambda: len(self.subscribers))
+
+    def subscribe(self):
+        """A new Subscription, or None when the subscriber limit is reached"""
+        with self.lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                return None
+            subscription = Subscription(self.max_queue)
+            self.subscribers.add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+        subscription.close()
+
+    def publish(self, event):
+        """Send ``event`` (a JSON-serialisable dict) to every subscriber"""
+        if not self.subscribers:
+            return
+        data = json.dumps(event)
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscription in subscribers:
+            subscription.put(data)
+        self.published += 1
+
+    def stats(self):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        return {
+            "subscribers": len(subscribers),
+            "published": self.published,
+            "queued": sum(len(subscription.events) for subscription in subscribers),
+            "dropped": sum(subscription.dropped for subscription in subscribers),
+        }
@@ -0,0 +1,71 @@
+import os, threading
+
+try:
+    import fcntl
+except ImportError:     # Windows: no flock, single-process only
+    fcntl = None
+
+
+class FileLock(object):
+    """Exclusive lock shared by threads and processes through ``flock`` on ``path``.
+
+    Re-entrant within a process: nested ``with`` blocks in the same thread
+    only take the file lock once.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def acquire(self):
+        self._lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                if self._fd is None:
+                    self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except Exception:
+                self._lock.release()
+                raise
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None and self._depth == 0:
+                os.close(self._fd)
+                self._fd = None
+
+
+def try_claim(path):
+    """Hold an exclusive lock on ``path`` for the life of the process.
+
+    Returns the open file descriptor, or None if another process holds it.
+    The lock is released when the process exits, so a replacement worker
+    can claim it. Claim after forking: a descriptor inherited across
+    ``fork`` is shared with the parent.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    if fcntl is None:
+        return fd
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    os.ftruncate(fd, 0)
+    os.write(fd, str(os.getpid()).encode())
+    return fd
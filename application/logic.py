@@ -1,25 +1,211 @@
 
-import os, json, random, time, logging
+import os, json, random, time, logging, atexit, threading
+from itertools import islice, chain
 import serial
 from datetime import datetime, timedelta
 
+import config
+from .storage import open_store, to_epoch, reading_epoch, TIMESTAMP_FORMAT
+from .cache import ReadingCache
+from .writer import GroupCommitWriter, WriterBusy
+from .rollups import RollupStore
+from .coverage import CoverageIndex
+from .incidents import IncidentDetector
+from .retention import ColdStore, RetentionWorker, compact as compact_readings
+from .analytics import ReadingColumns, compute_stats, load_numpy
+from .locks import try_claim
+from .live import LiveFeed
+from .metrics import STORAGE_SECONDS, STORAGE_READINGS, WRITER_QUEUE_DEPTH
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
+# Catch-up rescans this many seconds before the last aggregated reading: with
+# several writer processes a reading stamped earlier can be committed later.
+# Aggregates skip ids they already hold, so the overlap is never counted twice.
+CATCH_UP_OVERLAP = 300
+
+
+def _catch_up_start(last_epoch):
+    return None if last_epoch is None else last_epoch - CATCH_UP_OVERLAP
+
 class NetworkDataHandler:
-    def __init__(self, readings_file="data/network_readings.json", operators_file="data/network_operators.json"):
+    def __init__(self, readings_file="data/network_readings.json", operators_file="data/network_operators.json",
+                 backend=None):
         self.readings_file = readings_file
         self.operators_file = operators_file
+        self.backend = backend or config.STORAGE_BACKEND
         
         # Ensure data directory exists
         os.makedirs("data", exist_ok=True)
         
         # Initialize files if they don't exist
         self._init_files()
+
+        self.store = self._open_store()
+        self.cache = ReadingCache(self.store,
+                                  max_bytes=config.CACHE_MAX_BYTES,
+                                  bucket_seconds=config.CACHE_BUCKET_SECONDS,
+                                  pinned_buckets=config.CACHE_PINNED_BUCKETS)
+        self.cold = ColdStore(config.COLD_DIRECTORY, codec=config.COLD_CODEC)
+        self._compact_lock = threading.Lock()
+        self.columns = None
+        self._columns_lock = threading.Lock()
+        self._columns_base = 0
+        self._apply_lock = threading.RLock()
+        self.rollups = self._open_rollups()
+        self.coverage = self._open_coverage()
+        self.incidents = self._open_incidents()
+        self.live = LiveFeed(max_queue=config.LIVE_QUEUE_SIZE, max_subscribers=config.LIVE_MAX_SUBSCRIBERS)
+        self.writer = None
+        if config.WRITE_BEHIND:
+            self.writer = GroupCommitWriter(self._commit, sync=self.store.sync,
+                                            max_queue=config.WRITE_BEHIND_QUEUE,
+                                            max_batch=config.WRITE_BEHIND_BATCH,
+                                            max_delay=config.WRITE_BEHIND_MAX_DELAY,
+                                            retries=config.WRITE_BEHIND_RETRIES)
+            WRITER_QUEUE_DEPTH.set_function(self.writer.depth)
+        self.retention = None
+        self.primary = None
+        self._primary_lock = threading.Lock()
+        self._follow_signature = self.store.signature()
+        self.follower = None
+        if config.FOLLOW_INTERVAL:
+            self.follower = RetentionWorker(self.follow, interval=config.FOLLOW_INTERVAL, name="follower").start()
+        atexit.register(self.close)
+
+    def claim_primary(self):
+        """Try to become the one process that runs retention and owns the modem.
+
+        With several worker processes the first to claim PRIMARY_LOCK_FILE
+        wins; the lock goes with the process, so a replacement can take
+        over. Returns whether this process is the primary.
+        """
+        with self._primary_lock:
+            if not self.primary:
+                self.primary = try_claim(config.PRIMARY_LOCK_FILE) is not None
+                if self.primary and config.RETENTION_ENABLED:
+                    self.retention = RetentionWorker(self.compact, interval=config.RETENTION_INTERVAL).start()
+            return self.primary
     
+    def _open_store(self):
+        """Open the readings store selected in config.py"""
+        options = {}
+        if self.backend == "log":
+            options = {
+                "fsync": config.LOG_FSYNC,
+                "fsync_interval": config.LOG_FSYNC_INTERVAL,
+                "segment_bytes": config.LOG_SEGMENT_BYTES,
+                "checkpoint_every": config.LOG_CHECKPOINT_EVERY,
+            }
+        elif self.backend == "sqlite":
+            options = {
+                "path": config.SQLITE_PATH,
+                "synchronous": config.SQLITE_SYNCHRONOUS,
+                "operators_file": self.operators_file,
+            }
+        elif self.backend == "binary":
+            options = {"path": config.BINARY_PATH, "operators_file": self.operators_file}
+        return open_store(self.backend, self.readings_file, **options)
+
+    def _open_rollups(self):
+        """Load persisted rollups, rebuilding or catching up from raw readings"""
+        rollups = RollupStore(config.ROLLUPS_FILE, self.get_signal_quality,
+                              retention=config.ROLLUP_RETENTION,
+                              save_interval=config.ROLLUP_SAVE_INTERVAL)
+        try:
+            if not rollups.loaded:
+                rollups.rebuild(chain(self.cold.scan(), iter(self.store)))
+            else:
+                rollups.catch_up(self.store.scan(start=_catch_up_start(rollups.last_epoch)))
+        except Exception as e:
+            logging.error(f"Error building rollups: {e}")
+        return rollups
+
+    def _open_coverage(self):
+        """Load the persisted coverage grid, rebuilding or catching up from raw readings"""
+        coverage = CoverageIndex(config.COVERAGE_FILE, self.get_signal_quality,
+                                 max_cells=config.COVERAGE_MAX_CELLS,
+                                 save_interval=config.COVERAGE_SAVE_INTERVAL)
+        try:
+            if not coverage.loaded:
+                coverage.rebuild(chain(self.cold.scan(), iter(self.store)))
+            else:
+                coverage.catch_up(self.store.scan(start=_catch_up_start(coverage.last_epoch)))
+        except Exception as e:
+            logging.error(f"Error building coverage grid: {e}")
+        return coverage
+
+    def _open_incidents(self):
+        """Load the persisted incident detector, replaying or catching up from raw readings"""
+        incidents = IncidentDetector(config.INCIDENTS_FILE,
+                                     fast_alpha=config.INCIDENT_FAST_ALPHA,
+                                     baseline_alpha=config.INCIDENT_BASELINE_ALPHA,
+                                     warmup=config.INCIDENT_WARMUP,
+                                     drop_db=config.INCIDENT_DROP_DB,
+                                     floor_dbm=config.INCIDENT_FLOOR_DBM,
+                                     hysteresis_db=config.INCIDENT_HYSTERESIS_DB,
+                                     outage_after=config.INCIDENT_OUTAGE_AFTER,
+                                     retention=config.INCIDENT_RETENTION_DAYS * 86400,
+                                     save_interval=config.INCIDENT_SAVE_INTERVAL)
+        try:
+            if not incidents.loaded:
+                incidents.rebuild(chain(self.cold.scan(), iter(self.store)))
+            else:
+                incidents.catch_up(self.store.scan(start=_catch_up_start(incidents.last_epoch)))
+        except Exception as e:
+            logging.error(f"Error building incidents: {e}")
+        return incidents
+
+    def rebuild_rollups(self):
+        """Recompute all rollups from the raw readings, cold segments included"""
+        self.rollups.rebuild(chain(self.cold.scan(), iter(self.store)))
+
+    def compact(self, now=None):
+        """Move readings past COMPACT_AFTER_DAYS into compressed cold segments
+        and purge raw data past RAW_RETENTION_DAYS (rollups are kept)"""
+        now = time.time() if now is None else now
+        with self._compact_lock:
+            result = compact_readings(self.store, self.cold,
+                                      compact_before=now - config.COMPACT_AFTER_DAYS * 86400,
+                                      purge_before=now - config.RAW_RETENTION_DAYS * 86400)
+            self.cache.reset()
+            if self.columns is not None:
+                self.columns.drop_before(now - config.RAW_RETENTION_DAYS * 86400)
+        logging.info(f"Compaction finished: {result}")
+        return result
+
+    def _cold_end(self, start, end):
+        """Where a query has to switch from cold segments to the hot store;
+        None when the range lies entirely in hot data"""
+        if self.cold.bounds()[0] is None:
+            return None
+        hot_first = self.store.bounds()[0]
+        if hot_first is None:
+            return end if end is not None else float("inf")
+        if start is not None and start >= hot_first:
+            return None
+        return hot_first if end is None else min(end, hot_first)
+
+    def close(self):
+        """Drain the write-behind queue, then flush and close the readings store"""
+        try:
+            if self.retention:
+                self.retention.stop()
+            if self.follower:
+                self.follower.stop()
+            if self.writer:
+                self.writer.close()
+            self.rollups.save()
+            self.coverage.save()
+            self.incidents.save()
+            self.store.close()
+        except Exception as e:
+            logging.error(f"Error closing readings store: {e}")
+
     def _init_files(self):
         """Initialize JSON files if they don't exist"""
-        if not os.path.exists(self.readings_file):
+        if self.backend == "json" and not os.path.exists(self.readings_file):
             with open(self.readings_file, 'w') as f:
                 json.dump([], f)
         
@@ -47,61 +233,256 @@ class NetworkDataHandler:
         elif dbm <= -120: return 0
         return int(((dbm + 120) / 70) * 100)
     
-    def save_reading(self, reading_data):
-        """Save a new network reading"""
+    def live_event(self, reading):
+        """A reading plus its signal quality, as pushed to live subscribers"""
+        signal_strength = reading.get('signal_strength')
+        quality = self.get_signal_quality(signal_strength) if isinstance(signal_strength, (int, float)) else None
+        return dict(reading, signal_quality=quality)
+
+    def _stamp(self, reading_data):
+        """Add timestamp; the store assigns the ID"""
+        now = datetime.now()
+        reading_data['timestamp'] = now.strftime(TIMESTAMP_FORMAT)
+        reading_data['epoch'] = round(now.timestamp(), 3)
+        return reading_data
+
+    def _commit(self, readings):
+        """Write readings to the store and fold them into the cache"""
+        with self._apply_lock:
+            with STORAGE_SECONDS.time(operation="write"):
+                self.store.append_many(readings)
+                # Readings other processes appended first come first, keeping id order
+                self._apply(self.store.take_foreign() + readings)
+        STORAGE_READINGS.inc(len(readings), operation="write")
+
+    def _apply(self, readings):
+        """Fold stored readings into the cache, aggregates and live feed"""
+        self.cache.on_append(readings)
+        self.rollups.add_many(readings)
+        self.coverage.add_many(readings)
+        self.incidents.add_many(readings)
+        if self.columns is not None:
+            self.columns.extend(r for r in readings if r.get('id', 0) > self._columns_base)
+        if self.live.subscribers:
+            for reading in readings:
+                self.live.publish(self.live_event(reading))
+
+    def follow(self):
+        """Fold in readings other worker processes saved since we last looked"""
+        with self._apply_lock:
+            signature = self.store.signature()
+            if signature != self._follow_signature:
+                self.store.refresh()
+                self.cold.refresh()     # the primary may have compacted
+                self._follow_signature = signature
+            foreign = self.store.take_foreign()
+            if foreign:
+                self._apply(foreign)
+            return len(foreign)
+
+    def save_reading(self, reading_data, durable=False):
+        """Save a new network reading.
+
+        With write-behind enabled the reading is queued and this returns
+        straight away, unless ``durable`` asks to wait for the group commit.
+        Raises WriterBusy when the queue is full.
+        """
+        return self.save_readings([reading_data], durable=durable)
+    
+    def save_readings(self, readings, durable=False):
+        """Save a batch of readings in one append/transaction"""
         try:
-            with open(self.readings_file, 'r') as f:
-                readings = json.load(f)
+            for reading_data in readings:
+                self._stamp(reading_data)
+            if self.writer:
+                self.writer.submit(readings, durable=durable)
+            else:
+                self._commit(readings)
+                if durable:
+                    self.store.sync()
             
-            # Add timestamp and ID
-            reading_data['id'] = len(readings) + 1
-            reading_data['timestamp'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            readings.append(reading_data)
-            
-            with open(self.readings_file, 'w') as f:
-                json.dump(readings, f, indent=4)
-            
-            logging.info(f"Saved reading: {reading_data}")
+            logging.debug(f"Saved {len(readings)} reading(s)")
             return True
+        except WriterBusy:
+            raise
         except Exception as e:
-            logging.error(f"Error saving reading: {e}")
+            logging.error(f"Error saving readings: {e}")
             return False
     
     def get_latest_reading(self):
         """Get the most recent network reading"""
         try:
-            with open(self.readings_file, 'r') as f:
-                readings = json.load(f)
-            
-            if readings:
-                return readings[-1]
-            return None
+            with STORAGE_SECONDS.time(operation="latest"):
+                return self.cache.latest()
         except Exception as e:
             logging.error(f"Error getting latest reading: {e}")
             return None
     
-    def get_historical_data(self, days=7):
-        """Get historical readings for the specified number of days"""
+    def get_historical_data(self, days=7, start=None, end=None, operator=None):
+        """Get historical readings for the specified number of days.
+
+        ``start``/``end`` (datetimes or epoch seconds) select an explicit
+        half-open range instead and ``operator`` narrows it to one network.
+        """
         try:
-            with open(self.readings_file, 'r') as f:
-                readings = json.load(f)
-            
-            cutoff_date = (datetime.now() - timedelta(days=days))
-            
-            filtered_readings = [
-                reading for reading in readings
-                if datetime.strptime(reading['timestamp'], "%Y-%m-%d %H:%M:%S") >= cutoff_date
-            ]
-            
-            return filtered_readings
+            if start is None and end is None:
+                start = datetime.now() - timedelta(days=days)
+            start, end = to_epoch(start), to_epoch(end)
+            with STORAGE_SECONDS.time(operation="historical"):
+                readings = self.cache.range(start, end, operator)
+                cold_end = self._cold_end(start, end)
+                if cold_end is not None:
+                    readings = list(self.cold.scan(start, cold_end, operator)) + readings
+            STORAGE_READINGS.inc(len(readings), operation="historical")
+            return readings
         except Exception as e:
             logging.error(f"Error getting historical data: {e}")
             return []
     
+    def iter_readings(self, days=7, start=None, end=None, operator=None, after=None):
+        """Lazily yield readings in time order straight from the store.
+
+        ``after`` is an ``(epoch, id)`` keyset cursor: only rows that sort
+        after it are returned, and the store's index seeks to it directly.
+        """
+        if start is None and end is None:
+            start = datetime.now() - timedelta(days=days)
+        start, end = to_epoch(start), to_epoch(end)
+        if after is not None:
+            start = after[0] if start is None else max(start, after[0])
+        readings = self.store.scan(start, end, operator)
+        cold_end = self._cold_end(start, end)
+        if cold_end is not None:
+            readings = chain(self.cold.scan(start, cold_end, operator), readings)
+        for reading in readings:
+            if after is not None and reading_epoch(reading) == after[0] and reading.get('id', 0) <= after[1]:
+                continue
+            yield reading
+
+    def get_historical_page(self, days=7, start=None, end=None, operator=None, cursor=None, limit=100):
+        """One page of readings and the cursor of the next page (None at the end).
+
+        Pages whose buckets are all cached (typically the recent ones) come
+        from the cache; anything else is read from the store.
+        """
+        try:
+            with STORAGE_SECONDS.time(operation="page"):
+                readings = None
+                if start is None and end is None:
+                    start = datetime.now() - timedelta(days=days)
+                start, end = to_epoch(start), to_epoch(end)
+                first = start
+                if cursor is not None:
+                    first = cursor[0] if start is None else max(start, cursor[0])
+                if self._cold_end(first, end) is None:
+                    readings = self.cache.page(start, end, operator, after=cursor, limit=limit + 1)
+                if readings is None:
+                    readings = list(islice(self.iter_readings(days, start, end, operator, after=cursor), limit + 1))
+            STORAGE_READINGS.inc(len(readings), operation="page")
+            next_cursor = None
+            if len(readings) > limit:
+                readings = readings[:limit]
+                next_cursor = (reading_epoch(readings[-1]), readings[-1].get('id', 0))
+            return readings, next_cursor
+        except Exception as e:
+            logging.error(f"Error getting historical page: {e}")
+            return [], None
+
+    def _ensure_columns(self):
+        """Load the columnar copy of all readings on first use, then keep it
+        current with writes from other processes"""
+        with self._columns_lock:
+            if self.columns is None:
+                with self._apply_lock:
+                    self.follow()
+                    columns = ReadingColumns()
+                    if hasattr(self.store, "view") and load_numpy() is not None:
+                        # Binary records go in as whole arrays, no per-reading decoding
+                        columns.extend(self.cold.scan())
+                        names = self.store.dictionary()
+                        columns.extend_records(self.store.view(), names["operators"], names["network_types"])
+                    else:
+                        columns.extend(chain(self.cold.scan(), iter(self.store)))
+                    # The files can be ahead of the store's view; skip those rows when they arrive
+                    self._columns_base = columns.max_id
+                    self.columns = columns
+            else:
+                self.follow()
+            return self.columns
+
+    def get_stats(self, days=7, start=None, end=None, operator=None, network_type=None):
+        """Vectorised per-operator/type statistics, percentiles, quality
+        histogram and availability over a time range (requires NumPy)"""
+        end = None if end is None else to_epoch(end)
+        if start is None:
+            start = (time.time() if end is None else end) - days * 86400
+        with STORAGE_SECONDS.time(operation="stats"):
+            return compute_stats(self._ensure_columns(), to_epoch(start), end, operator, network_type)
+
+    def get_rollups(self, days=7, start=None, end=None, operator=None, network_type=None, resolution=None):
+        """Get aggregated signal statistics, picking a resolution for the span"""
+        try:
+            end = time.time() if end is None else to_epoch(end)
+            start = end - days * 86400 if start is None else to_epoch(start)
+            with STORAGE_SECONDS.time(operation="rollups"):
+                return self.rollups.query(start, end, operator, network_type, resolution)
+        except Exception as e:
+            logging.error(f"Error getting rollups: {e}")
+            return []
+
+    def get_coverage(self, min_lat, min_lon, max_lat, max_lon, operator=None, resolution=None):
+        """Per-cell signal aggregates for a latitude/longitude box"""
+        try:
+            with STORAGE_SECONDS.time(operation="coverage"):
+                return self.coverage.query(min_lat, min_lon, max_lat, max_lon, operator, resolution)
+        except Exception as e:
+            logging.error(f"Error getting coverage: {e}")
+            return []
+
+    def get_incidents(self, days=7, start=None, end=None, operator=None, device_id=None, kind=None,
+                      ongoing=False, limit=None):
+        """Degradation and outage incidents overlapping a time range, newest first"""
+        try:
+            end = time.time() if end is None else to_epoch(end)
+            start = end - days * 86400 if start is None else to_epoch(start)
+            with STORAGE_SECONDS.time(operation="incidents"):
+                return self.incidents.query(start, end, operator, device_id, kind, ongoing, limit)
+        except Exception as e:
+            logging.error(f"Error getting incidents: {e}")
+            return []
+
+    def get_readings_in_area(self, min_lat, min_lon, max_lat, max_lon, start=None, end=None, operator=None):
+        """Get readings taken inside a latitude/longitude box"""
+        try:
+            start, end = to_epoch(start), to_epoch(end)
+            if hasattr(self.store, "scan_area"):
+                return list(self.store.scan_area(min_lat, min_lon, max_lat, max_lon, start, end, operator))
+            readings = []
+            for reading in self.cache.range(start, end, operator):
+                try:
+                    latitude, longitude = float(reading['latitude']), float(reading['longitude'])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if min_lat <= latitude <= max_lat and min_lon <= longitude <= max_lon:
+                    readings.append(reading)
+            return readings
+        except Exception as e:
+            logging.error(f"Error getting readings in area: {e}")
+            return []
+
+    def cache_stats(self):
+        """Hit/miss counters and memory use of the readings cache"""
+        return self.cache.stats()
+
+    def writer_stats(self):
+        """Queue depth and commit counters of the write-behind writer"""
+        return self.writer.stats() if self.writer else None
+
     def get_operators(self):
         """Get list of network operators"""
         try:
+            if self.backend == "sqlite":
+                return self.store.get_operators()
             with open(self.operators_file, 'r') as f:
                 return json.load(f)
         except Exception as e:
@@ -109,16 +490,13 @@ class NetworkDataHandler:
             return []
 
 
-import getpass, os, subprocess
+import getpass, os, re, subprocess
 import time
-try:
-    import RPi.GPIO as GPIO
-except:
-    pass
-
-import num2words
 import serial
 
+from .modem import connection_for, close_connection
+from .sms import parse_cmgl, parse_cmgr
+
 
 class portIDAllocation(object):
     def __init__(self, *args):
@@ -129,6 +507,7 @@ class portIDAllocation(object):
         return NumberOfPorts
      
     def liveUSBPorts(self):
+        import num2words  # loaded on first use, not at app import
         matchingPortList 	= []
         portIDList		    = []
         NumUSBPort = self.NumberOfPorts()
@@ -177,15 +556,24 @@ class serialportSetup(object):
         return ser
 
 class SMSCommands(object):
+    """AT helpers for one port, sent through its shared ModemConnection.
+
+    ``ser`` is the port name or, as before, an open serial.Serial for it;
+    either way commands go through ``connection_for(port)`` like SIM800C,
+    so there is a single reader on the port.
+    """
     def __init__(self, ser, *args):
         self.ser        = ser
+        self.port       = getattr(ser, "port", ser)
         super(SMSCommands, self).__init__(*args)
+
+    @property
+    def connection(self):
+        return connection_for(self.port)
     
-    def send_at_command(self, command, timeout=1):
-        ser     = self.ser
-        ser.write((command + "\r\n").encode('utf-8'))
-        time.sleep(timeout)
-        return ser.read_all().decode('utf-8')
+    def send_at_command(self, command, timeout=5):
+        """Send a command and return its reply lines as soon as the final result code arrives"""
+        return self.connection.command(command, timeout=timeout).text
 
     def get_module_info(self):
         return self.send_at_command( 'ATI')
@@ -213,9 +601,8 @@ class SMSCommands(object):
         #response = self.send_at_command('AT+CPSI?')
         # Enable engineering mode
         self.send_at_command('AT+CENG=3')
-        time.sleep(1)  # Wait for response
 
-        # Query detailed cell information
+        # Query detailed cell information (multi-line reply)
         response = self.send_at_command('AT+CENG?')
         return response 
     
@@ -250,42 +637,19 @@ class SMSCommands(object):
     
     def set_sms_mode(self):
         self.send_at_command('AT+CMGF=1')  # Set SMS mode to text mode
-        time.sleep(3)
 
     def list_sms_messages(self):
-        messages = []
-        response = self.send_at_command( 'AT+CMGL="ALL"')
-        time.sleep(3)
-        """buffereing_bytes = ser.read(ser.inWaiting())
-        print("response: ", response)
-        request = buffereing_bytes.decode('utf-8')
-        print("request: ", request)"""
-        lines = response.strip().split('\r\n')
-        #print("lines: ", lines)
-        print(len(lines), type(lines))
-        #for i in range(0, len(lines)):
-        for line in lines:
-            if line.startswith('+CMGL'):
-                messages.append({
-                    'index': int(line.split(',')[0].split(':')[1].strip())})
-                #messages.append(line)
-            #print(lines[i], "\n\n")
-            #if lines[i].start
-            #messages.append({'message': lines[i]})
-        """try:
-            for i in range(0, len(lines), 2):
-                print(lines[i], len(lines))
-                messages.append({
-                    'index': int(lines[i].split(',')[0].split(':')[1].strip()),
-                    'sender': lines[i].split(',')[1].strip(),
-                    'date': lines[i].split(',')[3].strip(),
-                    'message': lines[i+1].strip()
-                })
-                print(lines[i+1].strip())
-        except:
-            pass"""
-        print(messages)
-        return messages
+        """Every message on the SIM (index, status, sender, date, body).
+        New messages are picked up as they arrive by sms.SMSReceiver instead."""
+        response = self.connection.command('AT+CMGL="ALL"', timeout=20)
+        return parse_cmgl(response.lines)
+
+    def read_sms(self, index):
+        """One message by its SIM index, or None"""
+        return parse_cmgr(self.connection.command(f'AT+CMGR={index}').lines)
+
+    def delete_sms(self, index):
+        return self.connection.command(f'AT+CMGD={index}').ok
     
     def check_call_status(self):
         response = self.send_at_command( 'AT+CPAS')
@@ -296,27 +660,46 @@ class gpioDefine(object):
         super(gpioDefine, self).__init__(*args)
     
     def setup(P_BUTTON):
+        import RPi.GPIO as GPIO  # only on the Raspberry Pi, loaded on first use
         GPIO.setmode(GPIO.BOARD)
         GPIO.setup(P_BUTTON, GPIO.IN, GPIO.PUD_UP)
 
 
 
 class SIM800C:
+    """SIM800C module on one serial port.
+
+    The port is owned by a shared ModemConnection (see modem.py), so several
+    SIM800C objects for the same port, and concurrent requests, use one
+    handle and never interleave commands.
+    """
     def __init__(self, port, baudrate=9600, timeout=1):
         self.port = port
         self.baudrate = baudrate
         self.timeout = timeout
-        self.serial = None
+        self.connection = None
+
+    @property
+    def serial(self):
+        return self.connection.serial if self.connection else None
 
     def connect(self):
-        try:
-            self.serial = serial.Serial(self.port, self.baudrate, timeout=self.timeout)
-            time.sleep(1)  # Allow initialization
-            logging.info(f"Connected to SIM800C module on port {self.port}.")
-            return True
-        except Exception as e:
-            logging.error(f"Failed to connect to SIM800C on port {self.port}: {e}")
+        """Attach to the port's connection (opened once, reconnected in the background)"""
+        if not self.port:
             return False
+        if self.connection is None or self.connection.state == "closed":
+            self.connection = connection_for(self.port, baudrate=self.baudrate, timeout=self.timeout)
+        return self.connection.connected
+
+    def close(self):
+        close_connection(self.port)
+        self.connection = None
+
+    def health(self):
+        """Connection state, last error and reconnect counters"""
+        if self.connection is None:
+            return {"port": self.port, "state": "disconnected"}
+        return self.connection.health()
 
     def is_module_detected(self):
         """Check if SIM800C responds to AT command"""
@@ -337,44 +720,60 @@ class SIM800C:
             return False
     
     def send_at_command(self, command, expected_response="OK", timeout=5):
-        if not self.serial:
+        """Send a command and wait for its final result code.
+
+        Returns the first reply line starting with ``expected_response`` when
+        there is one, otherwise the whole reply (information lines and final
+        result code).
+        """
+        if not self.connection:
             raise Exception("SIM800C module is not connected.")
         
-        if self.serial is None:
-            return "Serial port not initialized."
-        
         try:
-            if not self.serial.is_open:
-                self.serial.open()  # Attempt to open the port if closed
-            
-            self.serial.write((command + "\r\n").encode())
-            response = self.serial.readline().decode().strip()
-            return response if response else "No response received."
+            response = self.connection.command(command, timeout=timeout)
+            if response.timed_out and not response.lines:
+                return "No response received."
+            line = response.line(expected_response) if expected_response else None
+            return line if line else response.text
 
-        except serial.serialutil.PortNotOpenError:
-            return "Error: Serial port is not open."
-        
         except serial.SerialException as e:
             return f"Serial communication error: {e}"
         
     
-    def get_signal_strength(self):
-        """Returns signal strength in dBm (Converted from CSQ value)"""
-        response = self.send_at_command("AT+CSQ", "+CSQ:")
+    def get_imei(self):
+        """Module IMEI (AT+GSN), used as a stable device id; None if unknown"""
+        response = self.send_at_command("AT+GSN", None)
+        match = re.search(r"\b\d{14,17}\b", response or "")
+        return match.group(0) if match else None
+
+    # AT query and reply parser per metric, shared by the get_* methods and query()
+    QUERIES = {
+        "sim": "AT+CPIN?",
+        "signal": "AT+CSQ",
+        "operator": "AT+COPS?",
+        "network_type": "AT+CGREG?",
+        "location": "AT+CIPGSMLOC=1,1",
+    }
+
+    @staticmethod
+    def _parse_sim(response):
+        return "+CPIN: READY" in (response or "")
+
+    @staticmethod
+    def _parse_signal(response):
         if response:
             try:
                 csq_value = int(response.split(":")[1].split(",")[0].strip())
                 if csq_value == 99:
                     return -120  # No signal
                 return (2 * csq_value) - 113  # Convert to dBm
-            except ValueError:
+            except (IndexError, ValueError):
                 logging.error("Failed to parse signal strength.")
                 return None
         return None
 
-    def get_operator(self):
-        """Gets the current network operator"""
-        response = self.send_at_command("AT+COPS?", "+COPS:")
+    @staticmethod
+    def _parse_operator(response):
         if response:
             try:
                 return response.split(",")[2].strip('"')
@@ -383,9 +782,8 @@ class SIM800C:
                 return "Unknown"
         return "Unknown"
 
-    def get_network_type(self):
-        """Identifies the network type (e.g., GSM, 3G, 4G, 5G)"""
-        response = self.send_at_command("AT+CGREG?", "+CGREG:")
+    @staticmethod
+    def _parse_network_type(response):
         if response:
             try:
                 status_code = int(response.split(",")[1].strip())
@@ -395,9 +793,8 @@ class SIM800C:
                 return "Unknown"
         return "Unknown"
 
-    def get_location(self):
-        """Gets latitude and longitude if GPS is available"""
-        response = self.send_at_command("AT+CIPGSMLOC=1,1", "+CIPGSMLOC:")
+    @staticmethod
+    def _parse_location(response):
         if response:
             try:
                 parts = response.split(":")[1].split(",")
@@ -408,45 +805,44 @@ class SIM800C:
                 return None, None
         return None, None
 
+    def get_signal_strength(self):
+        """Returns signal strength in dBm (Converted from CSQ value)"""
+        return self._parse_signal(self.send_at_command("AT+CSQ", "+CSQ:"))
 
-def collect_network_data():
-    """Collect actual network readings using SIM800C"""
-    sim800c = SIM800C(port='/dev/ttyUSB0', baudrate=9600)  # Update with your actual port
-    if not sim800c.connect():
-        logging.error("Failed to connect to SIM800C module.")
-        return []
-
-    readings = []
-    
-    for i in range(10):  # Collect multiple samples
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        signal_strength = sim800c.get_signal_strength()
-        network_operator = sim800c.get_operator()
-        network_type = sim800c.get_network_type()
-        latitude, longitude = sim800c.get_location()
-
-        reading = {
-            "id": i + 1,
-            "timestamp": timestamp,
-            "operator": network_operator,
-            "signal_strength": signal_strength if signal_strength is not None else "Unknown",
-            "network_type": network_type,
-            "availability": signal_strength is not None,
-            "latitude": latitude if latitude is not None else "Unknown",
-            "longitude": longitude if longitude is not None else "Unknown"
-        }
-        
-        readings.append(reading)
-        time.sleep(5)  # Delay to prevent rapid querying
-
-    return readings
+    def get_operator(self):
+        """Gets the current network operator"""
+        return self._parse_operator(self.send_at_command("AT+COPS?", "+COPS:"))
 
+    def get_network_type(self):
+        """Identifies the network type (e.g., GSM, 3G, 4G, 5G)"""
+        return self._parse_network_type(self.send_at_command("AT+CGREG?", "+CGREG:"))
 
-if __name__ == "__main__":
-    # Save sample data to file
-    os.makedirs("data", exist_ok=True)
-    
-    with open("data/network_readings.json", "w") as f:
-        json.dump(collect_network_data(), f, indent=4)
-    
-    logging.info("Network readings saved successfully.")
\ No newline at end of file
+    def get_location(self):
+        """Gets latitude and longitude if GPS is available"""
+        return self._parse_location(self.send_at_command("AT+CIPGSMLOC=1,1", "+CIPGSMLOC:"))
+
+    def query(self, metrics=("signal", "operator", "network_type"), timeout=10):
+        """Read several metrics in one round trip (e.g. ``AT+CSQ;+COPS?;+CGREG?``).
+
+        Returns a dict with one parsed value per metric (same values as the
+        get_* methods), ``module_detected`` and ``errors`` mapping a metric
+        to the final result code it failed with ("not executed" when an
+        earlier command in the batch failed).
+        """
+        result = {"module_detected": False, "errors": {}}
+        if not self.connection:
+            raise Exception("SIM800C module is not connected.")
+        try:
+            replies = self.connection.batch([self.QUERIES[name] for name in metrics], timeout=timeout)
+        except serial.SerialException as e:
+            result["errors"] = {name: f"Serial communication error: {e}" for name in metrics}
+            return result
+        result["module_detected"] = any(reply.final for reply in replies)
+        for name, reply in zip(metrics, replies):
+            if not reply.ok:
+                if reply.final:
+                    result["errors"][name] = reply.final
+                else:
+                    result["errors"][name] = "not executed" if result["module_detected"] else "No response received."
+            result[name] = getattr(self, f"_parse_{name}")(reply.line("+") if reply.ok else None)
+        return result
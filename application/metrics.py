@@ -0,0 +1,214 @@
+import time, bisect, threading
+from contextlib import contextmanager
+
+# Latency buckets (seconds) shared by the request, storage and AT histograms
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(object):
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        with self.lock:
+            values = sorted(self.values.items())
+        return self.header() + [f"{self.name}{_labels(self.label_names, key)} {_number(value)}"
+                                for key, value in values]
+
+
+class Gauge(_Metric):
+    """Gauge set directly, or read from ``set_function`` callbacks at scrape time"""
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self.functions = {}
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function, **labels):
+        with self.lock:
+            self.functions[self._key(labels)] = function
+
+    def remove(self, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values.pop(key, None)
+            self.functions.pop(key, None)
+
+    def render(self):
+        with self.lock:
+            values = dict(self.values)
+            functions = dict(self.functions)
+        for key, function in functions.items():
+            try:
+                values[key] = function()
+            except Exception:
+                continue
+        return self.header() + [f"{self.name}{_labels(self.label_names, key)} {_number(value)}"
+                                for key, value in sorted(values.items()) if value is not None]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        with self.lock:
+            values = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self.values.items())
+        lines = self.header()
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, [le])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class Registry(object):
+    """Named metrics rendered together in the Prometheus text format.
+
+    Metrics are created once (asking for an existing name returns it) and
+    updated in place under a per-metric lock, so recording a sample costs a
+    dict lookup and an addition; nothing is formatted until ``render()``.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def _get(self, cls, name, help, labels, **options):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, help, labels, **options)
+            return metric
+
+    def counter(self, name, help, labels=()):
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help, labels=()):
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def render(self):
+        with self.lock:
+            metrics = sorted(self.metrics.items())
+        lines = []
+        for _, metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# HTTP
+REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "Time to build the response (streamed bodies excluded)",
+    ("endpoint", "method", "status"))
+
+# Storage
+STORAGE_SECONDS = REGISTRY.histogram(
+    "storage_operation_duration_seconds", "NetworkDataHandler read/write duration", ("operation",))
+STORAGE_READINGS = REGISTRY.counter(
+    "storage_readings_total", "Readings written to or returned by the store", ("operation",))
+STORAGE_BYTES = REGISTRY.counter(
+    "storage_bytes_total", "Bytes written to / read from reading files", ("backend", "direction"))
+WRITER_QUEUE_DEPTH = REGISTRY.gauge(
+    "writer_queue_depth", "Batches waiting in the write-behind queue")
+WRITER_LOST = REGISTRY.counter(
+    "writer_lost_readings_total", "Accepted readings dropped because their group commit kept failing")
+
+# Serial / AT
+AT_SECONDS = REGISTRY.histogram(
+    "at_command_duration_seconds", "AT command round trip until the final result code", ("command",))
+AT_TIMEOUTS = REGISTRY.counter(
+    "at_command_timeouts_total", "AT commands without a final result code in time", ("command",))
+AT_ERRORS = REGISTRY.counter(
+    "at_command_errors_total", "AT commands answered with ERROR / +CME ERROR / +CMS ERROR", ("command",))
+AT_WAITING = REGISTRY.gauge(
+    "at_commands_waiting", "AT commands queued behind the one in flight", ("port",))
+SERIAL_ERRORS = REGISTRY.counter(
+    "serial_errors_total", "Serial errors that closed a modem connection", ("port",))
+
+# Live stream
+LIVE_SUBSCRIBERS = REGISTRY.gauge(
+    "live_subscribers", "Clients connected to /api/live/stream")
+LIVE_DROPPED = REGISTRY.counter(
+    "live_events_dropped_total", "Live events dropped because a client's queue was full")
+
+# Incidents
+INCIDENTS = REGISTRY.counter(
+    "incidents_total", "Degradation and outage incidents opened and closed", ("kind", "event"))
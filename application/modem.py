@@ -0,0 +1,485 @@
+import time, logging, threading, weakref
+
+import serial
+
+from .metrics import AT_SECONDS, AT_TIMEOUTS, AT_ERRORS, AT_WAITING, SERIAL_ERRORS
+
+# Final result codes that end a command's response
+FINAL_OK = ("OK",)
+FINAL_ERROR = ("ERROR", "+CME ERROR:", "+CMS ERROR:", "NO CARRIER", "NO DIALTONE", "BUSY", "NO ANSWER")
+
+# Lines the module sends on its own, outside any command
+URC_PREFIXES = ("+CMTI:", "+CMT:", "RING", "+CLIP:", "+CUSD:", "+CREG:", "+CGREG:", "+CPIN:", "+CFUN:",
+                "Call Ready", "SMS Ready", "UNDER-VOLTAGE", "OVER-VOLTAGE", "NORMAL POWER DOWN")
+
+
+class ATResponse(object):
+    """Information lines and the final result code of one AT command"""
+    def __init__(self, command, lines, final, elapsed):
+        self.command = command
+        self.lines = lines
+        self.final = final
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return self.final in FINAL_OK
+
+    @property
+    def timed_out(self):
+        return self.final is None
+
+    def line(self, prefix):
+        """First information line starting with ``prefix``, or None"""
+        for line in self.lines:
+            if line.startswith(prefix):
+                return line
+        return None
+
+    @property
+    def text(self):
+        return "\r\n".join(self.lines + ([self.final] if self.final else []))
+
+    def __str__(self):
+        return self.text
+
+
+def split_batch(commands, response):
+    """Per-command results of a concatenated command's reply.
+
+    Information lines go to the command whose prefix they carry (lines
+    without a ``+XXX:`` prefix go to the first command without one). The
+    module stops at the first failing command and reports a single final
+    code, so on error the commands that produced lines count as OK, the
+    first one that did not gets the error, and the rest get ``final=None``
+    (not executed).
+    """
+    prefixes = [_Pending._prefix(command) for command in commands]
+    lines = [[] for _ in commands]
+    for line in response.lines:
+        for i, prefix in enumerate(prefixes):
+            if (prefix and line.startswith(prefix)) or (not prefix and not line.startswith("+")):
+                lines[i].append(line)
+                break
+    results, failed = [], False
+    for command, command_lines in zip(commands, lines):
+        if response.ok or response.timed_out:
+            final = response.final
+        elif failed:
+            final = None
+        elif command_lines:
+            final = FINAL_OK[0]
+        else:
+            final, failed = response.final, True
+        results.append(ATResponse(command, command_lines, final, response.elapsed))
+    return results
+
+
+def command_name(command):
+    """Metric label of a command without its arguments ('AT+CMGR=3' -> 'AT+CMGR')"""
+    names = [part.strip().split("=")[0].split("?")[0].upper() for part in command.split(";")]
+    return ";".join(names[:1] + ["AT" + name if not name.startswith("AT") else name for name in names[1:]])
+
+
+class _Pending(object):
+    def __init__(self, command):
+        self.command = command
+        self.prefixes = tuple(filter(None, (self._prefix(part) for part in command.split(";"))))
+        self.lines = []
+        self.final = None
+        self.echoed = False
+        self.done = threading.Event()
+
+    @staticmethod
+    def _prefix(command):
+        """'AT+CSQ' / 'AT+COPS?' / '+CMGR=1' -> '+CSQ' / '+COPS' / '+CMGR'"""
+        command = command.strip()
+        body = command[2:] if command.upper().startswith("AT") else command
+        if not body.startswith("+"):
+            return None
+        for i, c in enumerate(body[1:], 1):
+            if not c.isalnum():
+                return body[:i]
+        return body
+
+
+class ATChannel(object):
+    """Event-driven AT command channel on one serial port.
+
+    A reader thread owns all reads from the port and splits them into lines.
+    A command's lines are collected until a final result code (``OK``,
+    ``ERROR``, ``+CME ERROR`` ...) arrives, and the waiting caller is woken
+    at once instead of sleeping a fixed time. Commands are serialised with a
+    lock. Unsolicited result codes (``+CMTI``, ``RING`` ...) and anything
+    received while no command is waiting go to registered listeners.
+    ``on_error(exception)`` is called if the reader dies on a serial error.
+
+    The module may still answer a command after it timed out. Until that
+    late reply is over, replies are not credited to the next command: with
+    echo on (ATE1) everything before the next command's echo is dropped;
+    with echo off the next command waits for the late final result code, or
+    ``quiet`` seconds without input, before it is sent.
+    """
+    def __init__(self, ser, on_error=None, quiet=0.5):
+        self.serial = ser
+        self.on_error = on_error
+        self.quiet = quiet
+        self.lock = threading.Lock()
+        self._pending = None
+        self._pending_lock = threading.Lock()
+        self._stale = False             # a timed-out command's reply may still arrive
+        self._drained = threading.Event()
+        self._echo = False              # the module echoed the last completed command
+        self._last_input = time.monotonic()
+        self._listeners = []
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"at-reader-{getattr(ser, 'port', '')}", daemon=True)
+        self._thread.start()
+
+    def add_listener(self, callback, prefix=None):
+        """Call ``callback(line)`` for unsolicited lines (optionally only those starting with ``prefix``)"""
+        self._listeners.append((prefix, callback))
+
+    def remove_listener(self, callback):
+        self._listeners = [(p, cb) for p, cb in self._listeners if cb is not callback]
+
+    @property
+    def alive(self):
+        return not self._closed and self._thread.is_alive()
+
+    def command(self, command, timeout=5):
+        """Send one AT command and wait for its final result code.
+
+        Returns an ATResponse; ``final`` is None if nothing final arrived
+        within ``timeout`` seconds.
+        """
+        if not self.alive:
+            raise serial.SerialException("AT reader is not running")
+        port = getattr(self.serial, 'port', '')
+        AT_WAITING.inc(port=port)
+        self.lock.acquire()
+        AT_WAITING.dec(port=port)
+        try:
+            if self._stale and not self._echo:
+                self._drain(timeout)
+            pending = _Pending(command)
+            with self._pending_lock:
+                self._pending = pending
+            started = time.monotonic()
+            try:
+                self.serial.write((command + "\r\n").encode())
+                pending.done.wait(timeout)
+            finally:
+                with self._pending_lock:
+                    self._pending = None
+                    if pending.final is None:
+                        self._stale = True
+                        self._drained.clear()
+                    else:
+                        self._echo = pending.echoed
+            elapsed = time.monotonic() - started
+        finally:
+            self.lock.release()
+        name = command_name(command)
+        AT_SECONDS.observe(elapsed, command=name)
+        if pending.final is None:
+            AT_TIMEOUTS.inc(command=name)
+            if not self._closed:
+                logging.warning(f"No final result code for {command} within {timeout}s")
+        elif pending.final not in FINAL_OK:
+            AT_ERRORS.inc(command=name)
+        return ATResponse(command, pending.lines, pending.final, elapsed)
+
+    def _drain(self, timeout):
+        """Wait for a timed-out command's late reply to end (echo off only)"""
+        started = time.monotonic()
+        deadline = started + timeout
+        while not self._drained.wait(min(self.quiet, max(deadline - time.monotonic(), 0))):
+            now = time.monotonic()
+            if now - max(self._last_input, started) >= self.quiet or now >= deadline:
+                with self._pending_lock:
+                    self._stale = False
+                return
+
+    def batch(self, commands, timeout=5):
+        """Send several commands in one line (``AT+CSQ;+COPS?;+CGREG?``) and
+        split the reply into one ATResponse per command (see split_batch)"""
+        line = "AT" + ";".join(c.strip()[2:] if c.strip().upper().startswith("AT") else c.strip() for c in commands)
+        return split_batch(commands, self.command(line, timeout=timeout))
+
+    def _run(self):
+        buffer = b""
+        while not self._closed:
+            try:
+                data = self.serial.read(self.serial.in_waiting or 1)
+            except (serial.SerialException, OSError, TypeError, AttributeError) as e:
+                if not self._closed:
+                    logging.error(f"AT reader on {getattr(self.serial, 'port', '?')} stopped: {e}")
+                    if self.on_error:
+                        self.on_error(e)
+                break
+            if not data:
+                continue
+            buffer += data
+            while b"\n" in buffer:
+                raw, buffer = buffer.split(b"\n", 1)
+                line = raw.decode("utf-8", errors="replace").strip()
+                if line:
+                    self._handle(line)
+        self._closed = True
+        with self._pending_lock:
+            if self._pending:
+                self._pending.done.set()
+
+    def _handle(self, line):
+        self._last_input = time.monotonic()
+        with self._pending_lock:
+            pending = self._pending
+            if self._stale:
+                # Late reply of a timed-out command: ends with its final result
+                # code, or before the echo of the command sent after it
+                if line in FINAL_OK or line.startswith(FINAL_ERROR) or \
+                        (pending is not None and line == pending.command):
+                    self._stale = False
+                    self._drained.set()
+                    if pending is not None and line == pending.command:
+                        pending.echoed = True
+                    return
+                if not line.startswith(URC_PREFIXES):
+                    logging.debug(f"Dropping late reply line {line!r}")
+                    return
+            elif pending is not None:
+                if line == pending.command:
+                    pending.echoed = True
+                    return  # command echo (ATE1)
+                if line in FINAL_OK or line.startswith(FINAL_ERROR):
+                    pending.final = line
+                    pending.done.set()
+                    return
+                if not self._unsolicited(line, pending):
+                    pending.lines.append(line)
+                    return
+        self._dispatch(line)
+
+    @staticmethod
+    def _unsolicited(line, pending):
+        """URC prefixes count as replies only for the command that asks for them"""
+        for prefix in URC_PREFIXES:
+            if line.startswith(prefix):
+                return not (pending.prefixes and line.startswith(pending.prefixes))
+        return False
+
+    def _dispatch(self, line):
+        for prefix, callback in list(self._listeners):
+            if prefix is None or line.startswith(prefix):
+                try:
+                    callback(line)
+                except Exception as e:
+                    logging.error(f"Unsolicited line handler failed for {line!r}: {e}")
+
+    def close(self):
+        self._closed = True
+
+
+_channels = weakref.WeakKeyDictionary()
+_channels_lock = threading.Lock()
+
+
+def channel_for(ser):
+    """The ATChannel reading ``ser``, started on first use (one per port)"""
+    with _channels_lock:
+        channel = _channels.get(ser)
+        if channel is None or not channel.alive:
+            channel = _channels[ser] = ATChannel(ser)
+        return channel
+
+
+def close_channel(ser):
+    """Stop the reader of ``ser`` (before the port is closed)"""
+    with _channels_lock:
+        channel = _channels.pop(ser, None)
+    if channel is not None:
+        channel.close()
+
+
+class ModemConnection(object):
+    """Owner of the one open serial handle (and its ATChannel) of a device.
+
+    All commands for the device go through ``command``/``batch``, which are
+    serialised by the channel. A serial error closes the handle and a
+    background thread reopens it with exponential backoff (``backoff``
+    doubling up to ``max_backoff`` seconds), so request threads never open
+    the port themselves; while reconnecting, commands fail fast. ``health()``
+    reports the state for monitoring. Use ``connection_for(port)`` to get
+    the shared instance for a port.
+    """
+    def __init__(self, port, baudrate=9600, timeout=1, settle=1.0, backoff=1.0, max_backoff=60):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.settle = settle
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.serial = None
+        self.channel = None
+        self.state = "disconnected"
+        self.last_error = None
+        self.failures = 0
+        self.reconnects = 0
+        self.connected_since = None
+        self.next_retry = None
+        self._listeners = []
+        self._lock = threading.RLock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    @property
+    def connected(self):
+        return self.state == "connected" and self.channel is not None and self.channel.alive
+
+    def open(self):
+        """Open the port and start its reader; on failure schedule a retry"""
+        with self._lock:
+            if self.state == "closed":
+                return False
+            if self.connected:
+                return True
+            if not self.port:
+                self.last_error = "No serial port configured"
+                return False
+            try:
+                # exclusive: a second process opening the port fails instead of sharing it
+                ser = serial.Serial(self.port, self.baudrate, timeout=self.timeout, exclusive=True)
+            except (serial.SerialException, OSError, ValueError) as e:
+                self._failed(e)
+                return False
+            time.sleep(self.settle)  # Allow initialization
+            self.serial = ser
+            self.channel = ATChannel(ser, on_error=self._failed)
+            for prefix, callback in self._listeners:
+                self.channel.add_listener(callback, prefix)
+            if self.failures:
+                self.reconnects += 1
+                logging.info(f"Reconnected to {self.port} after {self.failures} failure(s)")
+            else:
+                logging.info(f"Connected to SIM800C module on port {self.port}.")
+            self.state = "connected"
+            self.failures = 0
+            self.next_retry = None
+            self.connected_since = time.time()
+            return True
+
+    def _failed(self, error):
+        """Drop the handle and schedule a reconnect with backoff"""
+        with self._lock:
+            if self.state == "closed":
+                return
+            SERIAL_ERRORS.inc(port=self.port)
+            self._close_handle()
+            self.state = "reconnecting"
+            self.last_error = str(error)
+            self.failures += 1
+            delay = min(self.max_backoff, self.backoff * 2 ** (self.failures - 1))
+            self.next_retry = time.monotonic() + delay
+            logging.warning(f"Serial error on {self.port} ({error}); retrying in {delay:.0f}s")
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._reconnect, name=f"reconnect-{self.port}", daemon=True)
+                self._thread.start()
+            self._wake.set()
+
+    def _reconnect(self):
+        while self.state == "reconnecting":
+            self._wake.clear()
+            delay = self.next_retry - time.monotonic() if self.next_retry else 0
+            if delay > 0 and self._wake.wait(delay):
+                continue  # next_retry moved (or closed); re-evaluate
+            self.open()
+
+    def _close_handle(self):
+        if self.channel is not None:
+            self.channel.close()
+            self.channel = None
+        if self.serial is not None:
+            try:
+                self.serial.close()
+            except Exception:
+                pass
+            self.serial = None
+        self.connected_since = None
+
+    def _call(self, method, *args, **kwargs):
+        channel = self.channel
+        if not self.connected:
+            raise serial.SerialException(f"{self.port} is {self.state}")
+        try:
+            return getattr(channel, method)(*args, **kwargs)
+        except (serial.SerialException, OSError) as e:
+            self._failed(e)
+            raise serial.SerialException(str(e))
+
+    def command(self, command, timeout=5):
+        return self._call("command", command, timeout=timeout)
+
+    def batch(self, commands, timeout=5):
+        return self._call("batch", commands, timeout=timeout)
+
+    def add_listener(self, callback, prefix=None):
+        """Unsolicited-line listener that survives reconnects"""
+        with self._lock:
+            self._listeners.append((prefix, callback))
+            if self.channel is not None:
+                self.channel.add_listener(callback, prefix)
+
+    def remove_listener(self, callback):
+        with self._lock:
+            self._listeners = [(p, cb) for p, cb in self._listeners if cb is not callback]
+            if self.channel is not None:
+                self.channel.remove_listener(callback)
+
+    def close(self):
+        with self._lock:
+            self.state = "closed"
+            self._close_handle()
+            self._wake.set()
+
+    def health(self):
+        with self._lock:
+            return {
+                "port": self.port,
+                "state": self.state,
+                "connected_since": self.connected_since,
+                "last_error": self.last_error,
+                "failures": self.failures,
+                "reconnects": self.reconnects,
+                "next_retry_in": round(max(0.0, self.next_retry - time.monotonic()), 1) if self.next_retry else None,
+            }
+
+
+_connections = {}
+
+
+def connection_for(port, **options):
+    """The shared ModemConnection for ``port``, opened on first use"""
+    with _channels_lock:
+        connection = _connections.get(port)
+        if connection is None or connection.state == "closed":
+            connection = _connections[port] = ModemConnection(port, **options)
+            created = True
+        else:
+            created = False
+    if created:
+        connection.open()
+    return connection
+
+
+def close_connection(port):
+    """Close and forget the connection for ``port`` (device unplugged)"""
+    with _channels_lock:
+        connection = _connections.pop(port, None)
+    if connection is not None:
+        connection.close()
+
+
+def connections():
+    with _channels_lock:
+        return list(_connections.values())
@@ -0,0 +1,131 @@
+import io, os, glob, time, logging, threading
+from contextlib import redirect_stdout
+
+from .logic import SIM800C, portIDAllocation
+from .sampler import Sampler
+
+
+def discover_ports(ports=None):
+    """Serial device paths to look for modems on.
+
+    ``ports`` (a list of paths) wins when given. Otherwise the USB serial
+    devices found by portIDAllocation.liveUSBPorts are used, falling back to
+    a /dev/ttyUSB* glob where ``lsusb`` is not available.
+    """
+    if ports:
+        return sorted(port for port in ports if os.path.exists(port))
+    try:
+        with redirect_stdout(io.StringIO()):   # liveUSBPorts prints its progress
+            found = set(portIDAllocation().liveUSBPorts().values())
+    except Exception as e:
+        logging.debug(f"liveUSBPorts failed, globbing instead: {e}")
+        found = set()
+    return sorted(found | set(glob.glob("/dev/ttyUSB*")))
+
+
+class ModemPool(object):
+    """One SIM800C and one Sampler per detected serial device.
+
+    A background thread rescans the ports every ``scan_interval`` seconds:
+    new devices that answer ``AT`` are opened and get their own sampler
+    worker, and devices whose port vanished (unplugged) are stopped and
+    their connection closed, all without restarting the app; transient
+    serial errors are left to the connection's own reconnect. Ports that did not answer are
+    retried after ``retry_interval`` seconds. Readings carry a
+    ``device_id`` (the module IMEI, or the port name when that is unknown) so
+    boards with different SIMs can be compared side by side. Modems used
+    elsewhere in the app can be passed in ``shared`` (port -> SIM800C) so
+    they are reused and left open when the pool stops.
+    """
+    def __init__(self, handler, intervals, jitter=0.1, scan_interval=10, retry_interval=60, ports=None,
+                 shared=None, on_sample=None):
+        self.handler = handler
+        self.intervals = intervals
+        self.jitter = jitter
+        self.scan_interval = scan_interval
+        self.retry_interval = retry_interval
+        self.ports = ports
+        self.shared = dict(shared or {})
+        self.on_sample = on_sample
+        self.lock = threading.Lock()
+        self.devices = {}               # port -> {"device_id", "modem", "sampler"}
+        self.failed = {}                # port -> monotonic time it last failed to answer
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="modem-pool", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            try:
+                self.scan()
+            except Exception as e:
+                logging.error(f"Modem scan failed: {e}")
+            if self._stop.wait(self.scan_interval):
+                return
+
+    def scan(self):
+        """Open newly plugged modems and drop unplugged ones"""
+        ports = set(discover_ports(self.ports)) | {port for port in self.shared if os.path.exists(port)}
+        now = time.monotonic()
+        with self.lock:
+            gone = {port: self.devices.pop(port) for port in list(self.devices) if port not in ports}
+            self.failed = {port: failed for port, failed in self.failed.items()
+                           if port in ports and now - failed < self.retry_interval}
+            new_ports = sorted(ports - set(self.devices) - set(self.failed))
+        # Stopping a sampler and opening a port take a while; do both outside
+        # the lock so stats() stays responsive
+        for port, device in gone.items():
+            logging.info(f"Modem {device['device_id']} on {port} went away")
+            self._remove(port, device)
+        for port in new_ports:
+            device = self._open(port)
+            with self.lock:
+                if device is None:
+                    self.failed[port] = time.monotonic()
+                else:
+                    self.devices[port] = device
+
+    def _open(self, port):
+        modem = self.shared.get(port) or SIM800C(port=port, baudrate=9600)
+        if not modem.connect() or not modem.is_module_detected():
+            logging.info(f"No SIM800C answering on {port}")
+            if port not in self.shared:
+                self._close(modem)
+            return None
+        device_id = modem.get_imei() or os.path.basename(port)
+        on_sample = self.on_sample if port in self.shared else None
+        sampler = Sampler(modem, self.handler, self.intervals, jitter=self.jitter,
+                          device_id=device_id, on_sample=on_sample).start()
+        logging.info(f"Sampling modem {device_id} on {port}")
+        return {"device_id": device_id, "modem": modem, "sampler": sampler}
+
+    def _remove(self, port, device):
+        """Stop a device already taken out of ``devices``; call without holding ``lock``"""
+        device["sampler"].stop()
+        if port not in self.shared:
+            self._close(device["modem"])
+
+    @staticmethod
+    def _close(modem):
+        try:
+            modem.close()
+        except Exception as e:
+            logging.error(f"Error closing modem on {modem.port}: {e}")
+
+    def stop(self):
+        self._stop.set()
+        with self.lock:
+            devices, self.devices = self.devices, {}
+        for port, device in devices.items():
+            self._remove(port, device)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "devices": {device["device_id"]: dict(port=port, **device["sampler"].stats())
+                            for port, device in self.devices.items()},
+                "unresponsive_ports": sorted(self.failed),
+            }
@@ -0,0 +1,226 @@
+import os, gzip, json, struct, logging, threading
+from datetime import datetime
+
+from .storage import reading_epoch
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COLD_MAGIC = b"SNCOLD1\n"
+COLD_PREFIX = "readings-"
+COLD_SUFFIX = ".cold"
+HEADER_LENGTH = struct.Struct("<I")
+
+
+def _day_of(epoch):
+    return datetime.fromtimestamp(epoch).strftime("%Y-%m-%d")
+
+
+class ColdStore(object):
+    """Immutable, compressed, one-file-per-day archive of old readings.
+
+    File layout: magic, a length-prefixed JSON header, then compressed
+    NDJSON blocks of up to ``block_rows`` readings in time order. The header
+    holds the day's epoch range, per-operator counts and each block's offset
+    and epoch range, so queries skip whole files and blocks without
+    decompressing them. Headers of every file are kept in memory.
+    """
+    def __init__(self, directory, codec="gzip", block_rows=1000):
+        if codec == "zstd" and zstandard is None:
+            logging.warning("zstandard is not installed; cold segments fall back to gzip")
+            codec = "gzip"
+        self.directory = directory
+        self.codec = codec
+        self.block_rows = block_rows
+        self.lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+        self.headers = {}
+        self.refresh()
+
+    def refresh(self):
+        """Load headers of segments written (or purged) by another process"""
+        with self.lock:
+            names = {name for name in os.listdir(self.directory)
+                     if name.startswith(COLD_PREFIX) and name.endswith(COLD_SUFFIX)}
+            for name in set(self.headers) - names:
+                del self.headers[name]
+            for name in sorted(names - set(self.headers)):
+                try:
+                    self.headers[name] = self._read_header(self._path(name))[0]
+                except (OSError, ValueError) as e:
+                    logging.error(f"Skipping unreadable cold segment {name}: {e}")
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    @staticmethod
+    def _read_header(path):
+        with open(path, 'rb') as f:
+            if f.read(len(COLD_MAGIC)) != COLD_MAGIC:
+                raise ValueError("not a cold segment")
+            (length,) = HEADER_LENGTH.unpack(f.read(HEADER_LENGTH.size))
+            header = json.loads(f.read(length))
+            return header, len(COLD_MAGIC) + HEADER_LENGTH.size + length
+
+    def _compress(self, data, codec):
+        if codec == "zstd":
+            return zstandard.ZstdCompressor().compress(data)
+        return gzip.compress(data)
+
+    def _decompress(self, data, codec):
+        if codec == "zstd":
+            if zstandard is None:
+                raise RuntimeError("zstandard is required to read this cold segment")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return gzip.decompress(data)
+
+    def _read_blocks(self, name, start=None, end=None):
+        path = self._path(name)
+        header, data_start = self._read_header(path)
+        with open(path, 'rb') as f:
+            for block in header["blocks"]:
+                if start is not None and block["max_epoch"] < start:
+                    continue
+                if end is not None and block["min_epoch"] >= end:
+                    continue
+                f.seek(data_start + block["offset"])
+                raw = self._decompress(f.read(block["length"]), header["codec"])
+                for line in raw.splitlines():
+                    yield json.loads(line)
+
+    def write_day(self, day, readings):
+        """Write (or merge into) the immutable segment for one local day"""
+        with self.lock:
+            name = f"{COLD_PREFIX}{day}{COLD_SUFFIX}"
+            if name in self.headers:
+                # Re-run after an interrupted compaction: merge and de-duplicate
+                readings = list(self._read_blocks(name)) + list(readings)
+            unique = {}
+            for reading in readings:
+                unique[reading.get('id', id(reading))] = reading
+            readings = sorted(unique.values(), key=lambda r: (reading_epoch(r), r.get('id', 0)))
+            if not readings:
+                return 0
+
+            blocks, chunks, offset, operators = [], [], 0, {}
+            for i in range(0, len(readings), self.block_rows):
+                rows = readings[i:i + self.block_rows]
+                data = self._compress(b"".join(
+                    (json.dumps(row, separators=(",", ":")) + "\n").encode("utf-8") for row in rows), self.codec)
+                blocks.append({"offset": offset, "length": len(data), "count": len(rows),
+                               "min_epoch": reading_epoch(rows[0]), "max_epoch": reading_epoch(rows[-1])})
+                chunks.append(data)
+                offset += len(data)
+                for row in rows:
+                    operators[row.get('operator')] = operators.get(row.get('operator'), 0) + 1
+
+            header = {"day": day, "codec": self.codec, "count": len(readings),
+                      "min_epoch": blocks[0]["min_epoch"], "max_epoch": blocks[-1]["max_epoch"],
+                      "operators": {str(k): v for k, v in operators.items()}, "blocks": blocks}
+            encoded = json.dumps(header).encode("utf-8")
+            tmp_path = self._path(name) + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(COLD_MAGIC + HEADER_LENGTH.pack(len(encoded)) + encoded)
+                f.write(b"".join(chunks))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._path(name))
+            self.headers[name] = header
+            return len(readings)
+
+    def scan(self, start=None, end=None, operator=None):
+        """Readings with ``start <= epoch < end``, skipping files and blocks out of range"""
+        with self.lock:
+            headers = sorted(self.headers.items())
+        for name, header in headers:
+            if start is not None and header["max_epoch"] < start:
+                continue
+            if end is not None and header["min_epoch"] >= end:
+                continue
+            if operator is not None and str(operator) not in header["operators"]:
+                continue
+            for reading in self._read_blocks(name, start=start, end=end):
+                epoch = reading_epoch(reading)
+                if start is not None and epoch < start:
+                    continue
+                if end is not None and epoch >= end:
+                    continue
+                if operator is not None and reading.get('operator') != operator:
+                    continue
+                yield reading
+
+    def bounds(self):
+        with self.lock:
+            if not self.headers:
+                return (None, None)
+            return (min(h["min_epoch"] for h in self.headers.values()),
+                    max(h["max_epoch"] for h in self.headers.values()))
+
+    def purge(self, before):
+        """Delete segments whose newest reading is older than ``before``"""
+        removed = 0
+        with self.lock:
+            for name, header in list(self.headers.items()):
+                if header["max_epoch"] < before:
+                    os.remove(self._path(name))
+                    del self.headers[name]
+                    removed += header["count"]
+        return removed
+
+    def stats(self):
+        with self.lock:
+            return {
+                "segments": len(self.headers),
+                "readings": sum(h["count"] for h in self.headers.values()),
+                "bytes": sum(os.path.getsize(self._path(name)) for name in self.headers),
+            }
+
+
+def compact(store, cold, compact_before, purge_before=None):
+    """Move readings older than ``compact_before`` from the hot store into cold
+    day segments, then drop cold data older than ``purge_before``.
+
+    Cold files are written before the hot copies are removed, so an
+    interrupted run is simply repeated (the day merge de-duplicates by id).
+    """
+    plan = store.plan_expiry(compact_before)
+    day, rows, moved = None, [], 0
+    for reading in store.expired_readings(plan):
+        reading_day = _day_of(reading_epoch(reading))
+        if reading_day != day and rows:
+            cold.write_day(day, rows)
+            rows = []
+        day = reading_day
+        rows.append(reading)
+        moved += 1
+    if rows:
+        cold.write_day(day, rows)
+    removed = store.expire(plan)
+    purged = cold.purge(purge_before) if purge_before is not None else 0
+    return {"moved": moved, "removed_hot": removed, "purged": purged}
+
+
+class RetentionWorker(object):
+    """Background thread that runs ``job`` every ``interval`` seconds"""
+    def __init__(self, job, interval=3600, name="retention"):
+        self.job = job
+        self.interval = interval
+        self.name = name
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"{name}-worker", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.job()
+            except Exception as e:
+                logging.error(f"{self.name.capitalize()} run failed: {e}")
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,220 @@
+import os, json, math, time, logging, threading
+from datetime import datetime
+
+from .storage import reading_epoch, TIMESTAMP_FORMAT
+
+RESOLUTIONS = {"minute": 60, "hour": 3600, "day": 86400}
+
+# Aggregate slots
+COUNT, DBM_COUNT, DBM_SUM, DBM_MIN, DBM_MAX, QUALITY_SUM, AVAILABLE, HISTOGRAM = range(8)
+
+
+def _bucket_start(epoch, seconds):
+    """Start of the local-time bucket containing ``epoch``"""
+    offset = time.localtime(epoch).tm_gmtoff
+    return int(epoch - ((epoch + offset) % seconds))
+
+
+def _percentile(histogram, total, q):
+    """Value at quantile ``q`` from a {dBm: count} histogram"""
+    rank = max(1, math.ceil(q * total))
+    seen = 0
+    for value in sorted(histogram):
+        seen += histogram[value]
+        if seen >= rank:
+            return value
+    return None
+
+
+class RollupStore(object):
+    """Pre-aggregated signal statistics per operator and network type.
+
+    Each resolution keeps, per bucket, the reading count, min/avg/max dBm, a
+    1 dB histogram for percentiles, average quality and the availability
+    ratio. Buckets are updated incrementally as readings are saved and can
+    be rebuilt from raw data. Older buckets are pruned per resolution
+    (``retention`` maps resolution name -> seconds, None keeps forever), so
+    they outlive the raw readings they summarise.
+    """
+    def __init__(self, path, quality, retention=None, save_interval=60):
+        self.path = path
+        self.quality = quality
+        self.retention = retention or {}
+        self.save_interval = save_interval
+        self.lock = threading.RLock()
+        self.buckets = {name: {} for name in RESOLUTIONS}
+        self.last_id = 0
+        self.last_epoch = None
+        self._last_save = time.monotonic()
+        self.loaded = self._load()
+
+    # -- persistence ---------------------------------------------------------
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            for name in RESOLUTIONS:
+                for row in data["buckets"].get(name, []):
+                    start, operator, network_type, aggregate = row
+                    aggregate[HISTOGRAM] = {int(k): v for k, v in aggregate[HISTOGRAM].items()}
+                    self.buckets[name][(start, operator, network_type)] = aggregate
+            self.last_id = data.get("last_id", 0)
+            self.last_epoch = data.get("last_epoch")
+            return True
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Discarding unreadable rollups file {self.path}: {e}")
+            self.buckets = {name: {} for name in RESOLUTIONS}
+            return False
+
+    def save(self):
+        with self.lock:
+            data = {
+                "last_id": self.last_id,
+                "last_epoch": self.last_epoch,
+                "buckets": {
+                    name: [[key[0], key[1], key[2], aggregate] for key, aggregate in buckets.items()]
+                    for name, buckets in self.buckets.items()
+                },
+            }
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"   # several worker processes may save
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+            self._last_save = time.monotonic()
+
+    # -- updates -------------------------------------------------------------
+
+    def add(self, reading):
+        epoch = reading_epoch(reading)
+        operator = reading.get('operator')
+        network_type = reading.get('network_type')
+        available = bool(reading.get('availability', True))
+        try:
+            dbm = float(reading['signal_strength'])
+        except (KeyError, TypeError, ValueError):
+            dbm = None
+
+        for name, seconds in RESOLUTIONS.items():
+            key = (_bucket_start(epoch, seconds), operator, network_type)
+            aggregate = self.buckets[name].get(key)
+            if aggregate is None:
+                aggregate = self.buckets[name][key] = [0, 0, 0.0, None, None, 0, 0, {}]
+            aggregate[COUNT] += 1
+            aggregate[AVAILABLE] += available
+            if dbm is not None:
+                aggregate[DBM_COUNT] += 1
+                aggregate[DBM_SUM] += dbm
+                aggregate[DBM_MIN] = dbm if aggregate[DBM_MIN] is None else min(aggregate[DBM_MIN], dbm)
+                aggregate[DBM_MAX] = dbm if aggregate[DBM_MAX] is None else max(aggregate[DBM_MAX], dbm)
+                aggregate[QUALITY_SUM] += self.quality(dbm)
+                histogram = aggregate[HISTOGRAM]
+                histogram[round(dbm)] = histogram.get(round(dbm), 0) + 1
+
+        if isinstance(reading.get('id'), int):
+            self.last_id = max(self.last_id, reading['id'])
+        self.last_epoch = epoch if self.last_epoch is None else max(self.last_epoch, epoch)
+
+    def add_many(self, readings):
+        with self.lock:
+            since = self.last_id
+            for reading in readings:
+                # Already counted (e.g. by catch_up while another process was writing)
+                if isinstance(reading.get('id'), int) and reading['id'] <= since:
+                    continue
+                self.add(reading)
+            if time.monotonic() - self._last_save >= self.save_interval:
+                self.prune()
+                self.save()
+
+    def prune(self, now=None):
+        """Drop buckets older than each resolution's retention"""
+        now = time.time() if now is None else now
+        with self.lock:
+            for name, seconds in self.retention.items():
+                if seconds is None:
+                    continue
+                cutoff = now - seconds
+                buckets = self.buckets[name]
+                for key in [key for key in buckets if key[0] < cutoff]:
+                    del buckets[key]
+
+    def rebuild(self, readings):
+        """Recompute every bucket from raw readings"""
+        with self.lock:
+            self.buckets = {name: {} for name in RESOLUTIONS}
+            self.last_id = 0
+            self.last_epoch = None
+            for reading in readings:
+                self.add(reading)
+            self.prune()
+            self.save()
+            self.loaded = True
+
+    def catch_up(self, readings):
+        """Fold in readings saved after the last persisted rollup"""
+        with self.lock:
+            added = 0
+            # Scans run in time order, and ids from several writers need not be
+            since = self.last_id
+            for reading in readings:
+                if isinstance(reading.get('id'), int) and reading['id'] <= since:
+                    continue
+                self.add(reading)
+                added += 1
+            if added:
+                self.save()
+            return added
+
+    # -- queries -------------------------------------------------------------
+
+    def pick_resolution(self, start, end):
+        """Finest resolution that keeps the bucket count readable and is retained"""
+        span = end - start
+        choice = "minute" if span <= 6 * 3600 else "hour" if span <= 14 * 86400 else "day"
+        order = list(RESOLUTIONS)
+        for name in order[order.index(choice):]:
+            retention = self.retention.get(name)
+            if retention is None or start >= time.time() - retention:
+                return name
+        return "day"
+
+    def query(self, start, end, operator=None, network_type=None, resolution=None):
+        """Rollup rows for ``start <= bucket < end`` ordered by time"""
+        resolution = resolution or self.pick_resolution(start, end)
+        seconds = RESOLUTIONS[resolution]
+        rows = []
+        with self.lock:
+            for (bucket, op, net), aggregate in self.buckets[resolution].items():
+                if bucket + seconds <= start or bucket >= end:
+                    continue
+                if operator is not None and op != operator:
+                    continue
+                if network_type is not None and net != network_type:
+                    continue
+                rows.append(self._row(resolution, bucket, op, net, aggregate))
+        rows.sort(key=lambda row: (row["start"], str(row["operator"]), str(row["network_type"])))
+        return rows
+
+    @staticmethod
+    def _row(resolution, bucket, operator, network_type, aggregate):
+        dbm_count = aggregate[DBM_COUNT]
+        histogram = aggregate[HISTOGRAM]
+        return {
+            "resolution": resolution,
+            "start": bucket,
+            "time": datetime.fromtimestamp(bucket).strftime(TIMESTAMP_FORMAT),
+            "operator": operator,
+            "network_type": network_type,
+            "count": aggregate[COUNT],
+            "min_dbm": aggregate[DBM_MIN],
+            "avg_dbm": round(aggregate[DBM_SUM] / dbm_count, 1) if dbm_count else None,
+            "max_dbm": aggregate[DBM_MAX],
+            "p5_dbm": _percentile(histogram, dbm_count, 0.05) if dbm_count else None,
+            "p50_dbm": _percentile(histogram, dbm_count, 0.50) if dbm_count else None,
+            "p95_dbm": _percentile(histogram, dbm_count, 0.95) if dbm_count else None,
+            "avg_quality": round(aggregate[QUALITY_SUM] / dbm_count, 1) if dbm_count else None,
+            "availability": round(aggregate[AVAILABLE] / aggregate[COUNT], 4),
+        }
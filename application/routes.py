@@ -1,102 +1,86 @@
 
 
+import json, time
 from datetime import datetime
-from flask import render_template, request, jsonify
+from flask import render_template, stream_template, request, jsonify, g, Response, stream_with_context
 from application import app
 from .logic import NetworkDataHandler
-import serial
+from .writer import WriterBusy
+from .rollups import RESOLUTIONS
+from .coverage import GRIDS
+from .incidents import KINDS as INCIDENT_KINDS
+from . import analytics
+from .ingest import validate_reading, iter_json_items
+from .devices import DeviceManager
+from .modem import connections as modem_connections
+from . import metrics
+import config
 
 data_handler = NetworkDataHandler()
 
 
-from .logic import SIM800C
+def wants_durable():
+    """?durable=1 acknowledges only after the reading is committed to disk"""
+    return request.args.get('durable', '').lower() in ('1', 'true', 'yes')
+
+
+def busy_response(body=None):
+    body = body or {"status": "error", "message": "Ingest queue is full, retry later"}
+    response = jsonify(body)
+    response.status_code = 429
+    response.headers['Retry-After'] = '1'
+    return response
 
 
 # SIM800C module configuration
-SIM800C_PORT = '/dev/ttyUSB0'  # Serial port for SIM800C (e.g., '/dev/ttyUSB0' or 'COM3')
 POSSIBLE_PORTS = ['/dev/ttyUSB0', '/dev/ttyUSB1', '/dev/ttyUSB2', '/dev/ttyAMA0', '/dev/ttyS0', '/dev/ttyACM0']
 
-SIM800C_PORT = None
-for port in POSSIBLE_PORTS:
-    try:
-        SIM800C_PORT = serial.Serial(port, 9600, timeout=1)  # Adjust the baud rate as needed
-        print(f"Serial port initialized successfully on {port}.")
-        break  # Stop trying ports once a valid one is found
-    except serial.SerialException as e:
-        print(f"Error initializing serial port on {port}: {e}")
-        SIM800C_PORT = None  # Reset to None if the port is unavailable
+# Port probing, the modem connection and sampling run in the background,
+# started by the first request (sampler.py starts it directly)
+devices = DeviceManager(data_handler, POSSIBLE_PORTS)
+
 
-if SIM800C_PORT is None:
-    print("No valid serial port found. Network Analyser functionality will be disabled.")
+@app.before_request
+def start_devices():
+    devices.start()
 
-# Initialize the SIM800C module
-sim800c = SIM800C(port=SIM800C_PORT, baudrate=9600)
 
-# Connect to the SIM800C module
-sim800c.connect()
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
 
 
+@app.after_request
+def record_request_time(response):
+    started = g.pop('started', None)
+    if config.METRICS_ENABLED and started is not None:
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=request.endpoint or "unmatched",
+                                        method=request.method, status=response.status_code)
+    return response
+
 
 @app.route('/', methods=['GET', 'POST'])
 def home():
     
     """
     Home page route.
-    Displays SIM800C module status.
+    Displays SIM800C module status from the cached snapshot (see ModemStatus).
     """
-    if not sim800c.connect():
-        return render_template('index.html', error="SIM800C module not connected.")
+    status = devices.status.get()
+    if status["error"]:
+        return render_template('index.html', error=status["error"])
 
-    module_detected = sim800c.is_module_detected()
-    sim_inserted = sim800c.is_sim_inserted()
-    signal_strength = sim800c.get_signal_strength()
+    module_detected = status["module_detected"]
+    sim_inserted = status["sim_inserted"]
+    module_status = "Detected" if module_detected else "Not Detected"
+    sim_status = "Inserted" if sim_inserted else "Not Inserted"
+    signal_strength = status["csq"] if status["csq"] is not None else "N/A"
 
-    
-    # Default status values
-    module_status = "Not Detected"
-    sim_status = "Unknown"
-    signal_strength = "N/A"
-
-    # Check for SIM800C module detection
-    try:
-        response = sim800c.send_at_command("AT")
-        if "OK" in response:
-            module_status = "Detected"
-        else:
-            module_status = "Not Detected"
-    except Exception as e:
-        module_status = f"Error: {e}"
-
-    # Check if SIM has been inserted using AT+CPIN?
-    try:
-        sim_response = sim800c.send_at_command("AT+CPIN?")
-        if "READY" in sim_response:
-            sim_status = "Inserted"
-        else:
-            sim_status = "Not Inserted"
-    except Exception as e:
-        sim_status = f"Error: {e}"
-
-    # Get the network signal level using AT+CSQ
-    try:
-        csq_response = sim800c.send_at_command("AT+CSQ")
-        if "+CSQ:" in csq_response:
-            # Example response: "+CSQ: 20,99"
-            csq_parts = csq_response.split(":")[1].split(",")
-            signal_strength = csq_parts[0].strip() if csq_parts else "N/A"
-        else:
-            signal_strength = "N/A"
-    except Exception as e:
-        signal_strength = f"Error: {e}"
-
-    
-    #operators = data_handler.get_operators()
-    network_operator = ""
-    latest_reading = data_handler.get_latest_reading()
-    try:
-        network_operator=latest_reading['operator'],
-    except:
-        pass
+    network_operator = status["operator"] or ""
+    if not network_operator:
+        latest_reading = data_handler.get_latest_reading()
+        if latest_reading:
+            network_operator = latest_reading.get('operator', "")
 
     return render_template('index.html',
         module_status=module_status, 
@@ -130,60 +114,314 @@ def live_data():
     
     return render_template('live_data.html', error="No data available")
 
+@app.route('/api/live/stream', methods=['GET'])
+def live_stream():
+    """
+    Server-Sent Events stream of new readings (with signal_quality) for the
+    live page. The latest reading is sent first; each client has a bounded
+    queue, so a slow one only misses intermediate readings.
+    """
+    subscription = data_handler.live.subscribe()
+    if subscription is None:
+        return jsonify({"status": "error", "message": "Too many live clients"}), 503
+    latest_reading = data_handler.get_latest_reading()
+
+    def events():
+        try:
+            yield "retry: 5000\n\n"
+            if latest_reading:
+                yield f"event: reading\ndata: {json.dumps(data_handler.live_event(latest_reading))}\n\n"
+            while True:
+                data = subscription.get(timeout=config.LIVE_KEEPALIVE)
+                if subscription.closed:
+                    return
+                yield f"event: reading\ndata: {data}\n\n" if data is not None else ": keep-alive\n\n"
+        finally:
+            data_handler.live.unsubscribe(subscription)
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def process_reading(reading):
+    """Shape a stored reading for the historical data table"""
+    return {
+        "date": reading['timestamp'],
+        "network_operator": reading['operator'],
+        "network_type": reading['network_type'],
+        "signal_strength": reading['signal_strength'],
+        "signal_quality": data_handler.get_signal_quality(reading['signal_strength']),
+        "availability": "Available" if reading.get('availability', True) else "Unavailable"
+    }
+
+
+def page_limit():
+    """?limit= clamped to 1..HISTORY_MAX_PAGE_SIZE"""
+    limit = request.args.get('limit', default=config.HISTORY_PAGE_SIZE, type=int)
+    return max(1, min(limit, config.HISTORY_MAX_PAGE_SIZE))
+
+
+def encode_cursor(cursor):
+    return f"{cursor[0]}:{cursor[1]}" if cursor else None
+
+
+def decode_cursor(value):
+    """Parse an 'epoch:id' keyset cursor; None if absent or malformed"""
+    try:
+        epoch, reading_id = value.split(":")
+        return float(epoch), int(reading_id)
+    except (AttributeError, ValueError):
+        return None
+
+
 @app.route('/historical_data', methods=['GET'])
 def historical_data():
-    readings = data_handler.get_historical_data(days=7)
-    
-    processed_data = []
-    for reading in readings:
-        processed_data.append({
-            "date": reading['timestamp'],
-            "network_operator": reading['operator'],
-            "network_type": reading['network_type'],
-            "signal_strength": reading['signal_strength'],
-            "signal_quality": data_handler.get_signal_quality(reading['signal_strength']),
-            "availability": "Available" if reading.get('availability', True) else "Unavailable"
-        })
+    """
+    Historical readings, one keyset-paginated page at a time.
+    ?stream=1 instead streams every row in the range through the template
+    as it is read, so memory stays flat for 30/90-day ranges.
+    """
+    days = request.args.get('days', default=7, type=int)
+    operator = request.args.get('operator') or None
+    limit = page_limit()
+    summary = data_handler.get_rollups(days=days, operator=operator)
+
+    if request.args.get('stream'):
+        rows = (process_reading(reading) for reading in data_handler.iter_readings(days=days, operator=operator))
+        return stream_template('historical_data.html', data=rows, days=days, summary=summary,
+                               operator=operator, streamed=True)
+
+    readings, next_cursor = data_handler.get_historical_page(days=days, operator=operator,
+                                                             cursor=decode_cursor(request.args.get('cursor')),
+                                                             limit=limit)
+    processed_data = [process_reading(reading) for reading in readings]
     
-    return render_template('historical_data.html', data=processed_data)
+    return render_template('historical_data.html', data=processed_data, days=days, summary=summary,
+                           operator=operator, limit=limit, next_cursor=encode_cursor(next_cursor))
+
+
+@app.route('/api/readings', methods=['GET'])
+def readings_page():
+    """Keyset-paginated readings as JSON: ?days=&operator=&cursor=&limit="""
+    limit = page_limit()
+    readings, next_cursor = data_handler.get_historical_page(days=request.args.get('days', default=7, type=float),
+                                                             start=request.args.get('start', type=float),
+                                                             end=request.args.get('end', type=float),
+                                                             operator=request.args.get('operator') or None,
+                                                             cursor=decode_cursor(request.args.get('cursor')),
+                                                             limit=limit)
+    return jsonify({"readings": [dict(reading) for reading in readings], "next_cursor": encode_cursor(next_cursor)})
 
 @app.route('/api/record', methods=['POST'])
 def record_reading():
     """API endpoint to record new network readings"""
     try:
         data = request.json
-        required_fields = ['operator', 'signal_strength', 'network_type', 'latitude', 'longitude']
-        
-        # Check for missing fields
-        if not all(field in data for field in required_fields):
-            return jsonify({"status": "error", "message": "Missing required fields"}), 400
-
-        # Validate signal strength
-        try:
-            signal_strength = float(data['signal_strength'])
-            if signal_strength < -120 or signal_strength > -50:
-                return jsonify({"status": "error", "message": "Invalid signal strength range"}), 400
-        except ValueError:
-            return jsonify({"status": "error", "message": "Signal strength must be a number"}), 400
-
-        # Ensure latitude and longitude are numeric
-        try:
-            latitude = float(data['latitude'])
-            longitude = float(data['longitude'])
-        except ValueError:
-            return jsonify({"status": "error", "message": "Invalid latitude or longitude"}), 400
-
-        # Set availability to True if not provided
-        data['availability'] = data.get('availability', True)
+        error = validate_reading(data)
+        if error:
+            return jsonify({"status": "error", "message": error}), 400
 
         # Save the reading
-        if data_handler.save_reading(data):
+        if data_handler.save_reading(data, durable=wants_durable()):
             return jsonify({"status": "success", "message": "Reading recorded successfully"}), 201
         else:
             return jsonify({"status": "error", "message": "Failed to save reading"}), 500
             
+    except WriterBusy:
+        return busy_response()
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 400
-    
 
-    
\ No newline at end of file
+
+@app.route('/api/record/batch', methods=['POST'])
+def record_readings_batch():
+    """
+    API endpoint to record many readings at once.
+    Accepts a JSON array or NDJSON (one reading per line). The body is parsed
+    incrementally and valid readings are committed every BATCH_COMMIT_SIZE
+    rows; the response lists the index and reason of every rejected item.
+    """
+    received = 0
+    accepted = 0
+    busy = False
+    durable = wants_durable()
+    errors = []
+    pending = []
+    pending_indexes = []
+
+    def commit():
+        nonlocal accepted, busy
+        if not pending:
+            return
+        try:
+            saved = data_handler.save_readings(list(pending), durable=durable)
+            message = "Failed to save reading"
+        except WriterBusy:
+            saved, busy = False, True
+            message = "Ingest queue is full, retry later"
+        if saved:
+            accepted += len(pending)
+        else:
+            errors.extend({"index": i, "message": message} for i in pending_indexes)
+        pending.clear()
+        pending_indexes.clear()
+
+    message = None
+    try:
+        for index, (item, error) in enumerate(iter_json_items(request.stream)):
+            received += 1
+            error = error or validate_reading(item)
+            if error:
+                errors.append({"index": index, "message": error})
+                continue
+            pending.append(item)
+            pending_indexes.append(index)
+            if len(pending) >= config.BATCH_COMMIT_SIZE:
+                commit()
+    except ValueError as e:
+        message = f"Malformed request body after item {received}: {e}"
+    commit()
+    if received == 0 and message is None:
+        message = "No readings in request body"
+
+    status = "success" if not errors and message is None else ("partial" if accepted else "error")
+    body = {"status": status, "received": received, "accepted": accepted,
+            "rejected": len(errors), "errors": errors}
+    if message:
+        body["message"] = message
+    if status == "success":
+        return jsonify(body), 201
+    if busy and not accepted:
+        return busy_response(body)
+    return jsonify(body), 200 if accepted else 400
+
+
+@app.route('/api/rollups', methods=['GET'])
+def rollups():
+    """
+    Aggregated signal statistics per operator and network type.
+    Query: days (default 7) or start/end epoch seconds, operator, network_type,
+    resolution (minute/hour/day, picked from the span when omitted).
+    """
+    resolution = request.args.get('resolution') or None
+    if resolution is not None and resolution not in RESOLUTIONS:
+        return jsonify({"status": "error", "message": f"Unknown resolution: {resolution}"}), 400
+    rows = data_handler.get_rollups(days=request.args.get('days', default=7, type=float),
+                                    start=request.args.get('start', type=float),
+                                    end=request.args.get('end', type=float),
+                                    operator=request.args.get('operator') or None,
+                                    network_type=request.args.get('network_type') or None,
+                                    resolution=resolution)
+    return jsonify(rows)
+
+
+@app.route('/api/coverage', methods=['GET'])
+def coverage():
+    """
+    Coverage map: signal aggregates per grid cell and operator.
+    Query: bbox=min_lat,min_lon,max_lat,max_lon (required), operator,
+    resolution (coarse/medium/fine, picked from the box size when omitted).
+    """
+    try:
+        min_lat, min_lon, max_lat, max_lon = (float(v) for v in request.args.get('bbox', '').split(','))
+    except ValueError:
+        return jsonify({"status": "error", "message": "bbox must be min_lat,min_lon,max_lat,max_lon"}), 400
+    if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= max_lon <= 180):
+        return jsonify({"status": "error", "message": "Invalid bbox"}), 400
+    resolution = request.args.get('resolution') or None
+    if resolution is not None and resolution not in GRIDS:
+        return jsonify({"status": "error", "message": f"Unknown resolution: {resolution}"}), 400
+    cells = data_handler.get_coverage(min_lat, min_lon, max_lat, max_lon,
+                                      operator=request.args.get('operator') or None,
+                                      resolution=resolution)
+    return jsonify(cells)
+
+
+@app.route('/api/incidents', methods=['GET'])
+def incidents():
+    """
+    Signal degradation and outage incidents found as readings were saved, newest first.
+    Query: days (default 7) or start/end epoch seconds, operator, device_id,
+    kind (degradation/outage), ongoing=1 for open incidents only, limit.
+    """
+    kind = request.args.get('kind') or None
+    if kind is not None and kind not in INCIDENT_KINDS:
+        return jsonify({"status": "error", "message": f"Unknown incident kind: {kind}"}), 400
+    rows = data_handler.get_incidents(days=request.args.get('days', default=7, type=float),
+                                      start=request.args.get('start', type=float),
+                                      end=request.args.get('end', type=float),
+                                      operator=request.args.get('operator') or None,
+                                      device_id=request.args.get('device_id') or None,
+                                      kind=kind,
+                                      ongoing=request.args.get('ongoing', '').lower() in ('1', 'true', 'yes'),
+                                      limit=request.args.get('limit', type=int))
+    return jsonify(rows)
+
+
+@app.route('/api/stats', methods=['GET'])
+def stats():
+    """
+    Batch analytics over a time range.
+    Query: days (default 7) or start/end epoch seconds, operator, network_type.
+    """
+    if analytics.load_numpy() is None:
+        return jsonify({"status": "error", "message": "NumPy is not installed"}), 503
+    try:
+        result = data_handler.get_stats(days=request.args.get('days', default=7, type=float),
+                                        start=request.args.get('start', type=float),
+                                        end=request.args.get('end', type=float),
+                                        operator=request.args.get('operator') or None,
+                                        network_type=request.args.get('network_type') or None)
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route('/api/sampler/stats', methods=['GET'])
+def sampler_stats():
+    """Per-metric run counts, durations and missed deadlines of the sampler(s)"""
+    return jsonify(devices.sampler_stats())
+
+
+@app.route('/api/modem/health', methods=['GET'])
+def modem_health():
+    """State, last error and reconnect counters of every open modem connection"""
+    return jsonify([connection.health() for connection in modem_connections()])
+
+
+@app.route('/api/sms', methods=['GET'])
+def sms_messages():
+    """
+    Received SMS (sender, date, body), newest first.
+    Query: sender, limit.
+    """
+    return jsonify(devices.messages.list(sender=request.args.get('sender') or None,
+                                         limit=request.args.get('limit', type=int)))
+
+
+@app.route('/api/sms/stats', methods=['GET'])
+def sms_stats():
+    """Messages saved, skipped as duplicates, deleted from the SIM and failed reads"""
+    if devices.sms is None:
+        return jsonify({"running": False})
+    return jsonify(devices.sms.stats())
+
+
+@app.route('/api/live/stats', methods=['GET'])
+def live_stats():
+    """Connected live stream clients, queued and dropped events"""
+    return jsonify(data_handler.live.stats())
+
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Readings cache hit/miss counters"""
+    return jsonify(data_handler.cache_stats())
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Request, storage and AT command latencies and queue depths in the Prometheus text format"""
+    if not config.METRICS_ENABLED:
+        return jsonify({"status": "error", "message": "Metrics are disabled"}), 404
+    return Response(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
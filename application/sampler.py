@@ -0,0 +1,165 @@
+import time, heapq, random, logging, threading
+
+# Modem queries per metric; "signal" drives readings, the others refresh
+# the values stamped onto them. Batches keep this order: the module skips
+# everything after a failing command, so AT+CSQ goes first and the slow,
+# fallible AT+CIPGSMLOC (ERROR without a GPRS bearer) last.
+METRICS = {
+    "signal": "get_signal_strength",
+    "operator": "get_operator",
+    "network_type": "get_network_type",
+    "location": "get_location",
+}
+
+
+class Sampler(object):
+    """Background scheduler that samples the modem and saves readings.
+
+    Each metric runs on its own interval (``intervals`` maps metric name to
+    seconds) with up to ``jitter`` of it added at random so slow queries
+    such as AT+CIPGSMLOC do not line up with AT+CSQ. Every signal sample is
+    saved through ``handler.save_reading`` with the latest operator, network
+    type and location; a signal missing because of the modem itself (serial
+    link down, no answer) is counted in ``device_faults`` instead of being
+    saved as an outage. A run that starts more than one interval late skips
+    the slots it missed instead of bursting to catch up; the skipped slots
+    are counted as missed deadlines in ``stats()``. ``on_sample(name, value)``
+    is called after every successful sample (e.g. ModemStatus.update), and
+    readings are tagged with ``device_id`` when one is given. Metrics due
+    within ``batch_window`` seconds of each other are read together with one
+    batched AT command (``SIM800C.query``).
+    """
+    def __init__(self, modem, handler, intervals, jitter=0.1, on_sample=None, device_id=None,
+                 batch_window=1.0):
+        self.modem = modem
+        self.handler = handler
+        self.on_sample = on_sample
+        self.device_id = device_id
+        self.intervals = {name: seconds for name, seconds in intervals.items() if name in METRICS and seconds}
+        self.jitter = jitter
+        self.batch_window = batch_window
+        self.values = {"operator": "Unknown", "network_type": "Unknown", "location": (None, None)}
+        self.metrics = {name: {"interval": seconds, "runs": 0, "errors": 0, "missed": 0,
+                               "last_run": None, "last_duration": None, "max_lateness": 0.0}
+                        for name, seconds in self.intervals.items()}
+        self.saved = 0
+        self.device_faults = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            name = f"sampler-{self.device_id}" if self.device_id else "sampler"
+            self._thread = threading.Thread(target=self.run, name=name, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _next_due(self, due, name, now):
+        """Schedule the next run after ``due``, skipping slots already missed"""
+        interval = self.intervals[name]
+        missed = int((now - due) // interval) if now > due else 0
+        self.metrics[name]["missed"] += missed
+        return due + interval * (missed + 1) + random.uniform(0, self.jitter * interval)
+
+    def run(self):
+        """Sample until ``stop()``; metrics other than signal run first so the
+        first reading carries real values"""
+        now = time.monotonic()
+        queue = [(now if name != "signal" else now + 0.001, name) for name in self.intervals]
+        heapq.heapify(queue)
+        while queue and not self._stop.is_set():
+            due, name = queue[0]
+            if self._stop.wait(max(0.0, due - time.monotonic())):
+                break
+            # Everything due within batch_window shares one round trip
+            started = time.monotonic()
+            batch = []
+            while queue and queue[0][0] <= started + self.batch_window:
+                batch.append(heapq.heappop(queue))
+            for due, name in batch:
+                self.metrics[name]["max_lateness"] = max(self.metrics[name]["max_lateness"], started - due)
+            self._sample([name for _, name in batch])
+            for due, name in batch:
+                heapq.heappush(queue, (self._next_due(due, name, time.monotonic()), name))
+
+    def _read(self, names):
+        """Metric values and per-metric errors, batched when the modem supports it"""
+        if len(names) > 1 and hasattr(self.modem, "query"):
+            result = self.modem.query(names)
+            return {name: result.get(name) for name in names}, result["errors"]
+        return {name: getattr(self.modem, METRICS[name])() for name in names}, {}
+
+    def _sample(self, names):
+        started = time.monotonic()
+        names = [name for name in METRICS if name in names]
+        try:
+            values, errors = self._read(names)
+        except Exception as e:
+            values, errors = {}, {name: str(e) for name in names}
+        # Save the signal last, with the values read alongside it
+        for name in sorted(names, key=lambda name: name == "signal"):
+            metric = self.metrics[name]
+            if name in errors:
+                metric["errors"] += 1
+                logging.error(f"Sampling {name} failed: {errors[name]}")
+                # Keep the last good value
+                if name != "signal":
+                    values.pop(name, None)
+            if name == "signal" and values.get(name) is None and self._device_fault(errors.get(name)):
+                # No signal is an outage only when the module answered for it
+                values.pop(name, None)
+                self.device_faults += 1
+            if name in values:
+                try:
+                    if name == "signal":
+                        self._save(values[name])
+                    else:
+                        self.values[name] = values[name]
+                    if self.on_sample and name not in errors:
+                        self.on_sample(name, values[name])
+                except Exception as e:
+                    metric["errors"] += 1
+                    logging.error(f"Saving {name} sample failed: {e}")
+            metric["runs"] += 1
+            metric["last_run"] = time.time()
+            metric["last_duration"] = round(time.monotonic() - started, 4)
+
+    def _device_fault(self, error):
+        """True when a missing signal is down to the modem, not the network:
+        the batch never ran AT+CSQ, the module is silent or the serial link is down"""
+        if error in ("not executed", "No response received.") or str(error).startswith("Serial communication error"):
+            return True
+        if not hasattr(self.modem, "connection"):
+            return False
+        connection = self.modem.connection
+        return connection is None or not connection.connected
+
+    def _save(self, signal_strength):
+        latitude, longitude = self.values["location"] or (None, None)
+        reading = {
+            "operator": self.values["operator"],
+            "signal_strength": signal_strength if signal_strength is not None else "Unknown",
+            "network_type": self.values["network_type"],
+            "availability": signal_strength is not None,
+            "latitude": latitude if latitude is not None else "Unknown",
+            "longitude": longitude if longitude is not None else "Unknown",
+        }
+        if self.device_id is not None:
+            reading["device_id"] = self.device_id
+        if self.handler.save_reading(reading):
+            self.saved += 1
+
+    def stats(self):
+        return {"device_id": self.device_id, "running": self.running, "saved": self.saved,
+                "device_faults": self.device_faults,
+                "metrics": {name: dict(metric) for name, metric in self.metrics.items()}}
@@ -0,0 +1,220 @@
+import os, csv, json, queue, logging, threading
+from datetime import datetime, timedelta, timezone
+
+from .storage import TIMESTAMP_FORMAT
+
+
+def parse_cmti(line):
+    """'+CMTI: "SM",3' -> ("SM", 3), or None"""
+    try:
+        storage, index = next(csv.reader([line.split(":", 1)[1].strip()]))
+        return storage, int(index)
+    except (IndexError, ValueError, StopIteration):
+        return None
+
+
+def parse_sms_date(value):
+    """SIM800C service-centre time 'yy/MM/dd,hh:mm:ss±zz' (zz in quarter hours) -> epoch seconds"""
+    try:
+        sign = -1 if value[17] == "-" else 1
+        tz = timezone(timedelta(minutes=sign * 15 * int(value[18:20])))
+        return datetime.strptime(value[:17], "%y/%m/%d,%H:%M:%S").replace(tzinfo=tz).timestamp()
+    except (IndexError, ValueError):
+        return None
+
+
+def _fields(line):
+    return next(csv.reader([line.split(":", 1)[1].strip()]))
+
+
+def _message(status, sender, date, body):
+    epoch = parse_sms_date(date)
+    return {
+        "sender": sender,
+        "status": status,
+        "date": datetime.fromtimestamp(epoch).strftime(TIMESTAMP_FORMAT) if epoch is not None else date,
+        "epoch": epoch,
+        "body": body,
+    }
+
+
+def parse_cmgr(lines):
+    """Text-mode AT+CMGR reply lines -> message dict, or None if there is no message"""
+    for i, line in enumerate(lines):
+        if line.startswith("+CMGR:"):
+            fields = _fields(line)
+            if len(fields) < 4:
+                return None
+            return _message(fields[0], fields[1], fields[3], "\n".join(lines[i + 1:]))
+    return None
+
+
+def parse_cmgl(lines):
+    """Text-mode AT+CMGL reply lines -> list of message dicts with their SIM ``index``"""
+    messages = []
+    for line in lines:
+        if line.startswith("+CMGL:"):
+            fields = _fields(line)
+            if len(fields) < 5:
+                messages.append(None)
+                continue
+            message = _message(fields[1], fields[2], fields[4], "")
+            message["index"] = int(fields[0])
+            messages.append(message)
+        elif messages and messages[-1] is not None:
+            body = messages[-1]["body"]
+            messages[-1]["body"] = f"{body}\n{line}" if body else line
+    return [message for message in messages if message is not None]
+
+
+class MessageStore(object):
+    """Received SMS, one JSON object per line in ``path``.
+
+    A message already stored (same sender, date and body) is not stored
+    again, so re-reading one that could not be deleted from the SIM is safe.
+    Only the process that owns the modem appends; any process can list.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.next_id = 1
+        self._keys = set()
+        for message in self._read():
+            self.next_id = max(self.next_id, message["id"] + 1)
+            self._keys.add(self._key(message))
+
+    @staticmethod
+    def _key(message):
+        return (message.get("sender"), message.get("date"), message.get("body"))
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return []
+        messages = []
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    messages.append(json.loads(line))
+                except ValueError:
+                    pass    # torn last line after a crash
+        return messages
+
+    def append(self, message):
+        """Store a message and return it with its ``id``, or None if it is already stored"""
+        with self.lock:
+            key = self._key(message)
+            if key in self._keys:
+                return None
+            message = dict(message, id=self.next_id, received=datetime.now().strftime(TIMESTAMP_FORMAT))
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(message) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.next_id += 1
+            self._keys.add(key)
+            return message
+
+    def list(self, sender=None, limit=None):
+        """Stored messages, newest first"""
+        messages = [m for m in self._read() if sender is None or m.get("sender") == sender]
+        messages.reverse()
+        return messages[:limit] if limit else messages
+
+
+class SMSReceiver(object):
+    """Saves incoming SMS as the module announces them.
+
+    ``AT+CNMI=2,1`` makes the module send ``+CMTI: "SM",<index>`` for every
+    new message. The listener only queues the index (it runs on the serial
+    reader thread, which must not wait for a reply); a worker thread reads
+    that one message with ``AT+CMGR``, saves it and, with ``delete``,
+    removes it from the SIM with ``AT+CMGD`` so the inbox stays small.
+    After every (re)connect or module restart the settings are sent again
+    and unread messages that arrived meanwhile are picked up once.
+    """
+    SETUP = ("AT+CMGF=1", "AT+CNMI=2,1,0,0,0")
+
+    def __init__(self, connection, store, delete=False):
+        self.connection = connection
+        self.store = store
+        self.delete = delete
+        self.saved = 0
+        self.duplicates = 0
+        self.deleted = 0
+        self.failed = 0
+        self._queue = queue.Queue()
+        self._configured = None         # connection.reconnects when the settings were last sent
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"sms-{connection.port}", daemon=True)
+
+    def start(self):
+        self.connection.add_listener(self._on_cmti, "+CMTI:")
+        self.connection.add_listener(self._on_restart, "SMS Ready")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.connection.remove_listener(self._on_cmti)
+        self.connection.remove_listener(self._on_restart)
+
+    def _on_cmti(self, line):
+        parsed = parse_cmti(line)
+        if parsed:
+            self._queue.put(parsed[1])
+
+    def _on_restart(self, line):
+        self._configured = None
+        self._queue.put(None)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self._configured != self.connection.reconnects and self.connection.connected:
+                    self._setup()
+                try:
+                    index = self._queue.get(timeout=1)
+                except queue.Empty:
+                    continue
+                if index is not None:
+                    self._fetch(index)
+            except Exception as e:
+                self.failed += 1
+                logging.error(f"SMS receiver on {self.connection.port} failed: {e}")
+                self._stop.wait(1)
+
+    def _setup(self):
+        reconnects = self.connection.reconnects
+        for command in self.SETUP:
+            response = self.connection.command(command)
+            if not response.ok:
+                raise RuntimeError(f"{command} answered {response.final}")
+        self._configured = reconnects
+        # Messages that arrived while we were not listening
+        response = self.connection.command('AT+CMGL="REC UNREAD"', timeout=20)
+        for message in parse_cmgl(response.lines):
+            self._save(message.pop("index"), message)
+
+    def _fetch(self, index):
+        response = self.connection.command(f"AT+CMGR={index}")
+        message = parse_cmgr(response.lines) if response.ok else None
+        if message is None:
+            self.failed += 1
+            logging.warning(f"Could not read SMS {index} on {self.connection.port}: {response.final}")
+            return
+        self._save(index, message)
+
+    def _save(self, index, message):
+        message["port"] = self.connection.port
+        if self.store.append(message) is None:
+            self.duplicates += 1
+        else:
+            self.saved += 1
+            logging.info(f"Saved SMS from {message['sender']}")
+        if self.delete and self.connection.command(f"AT+CMGD={index}").ok:
+            self.deleted += 1
+
+    def stats(self):
+        return {"port": self.connection.port, "running": self._thread.is_alive() and not self._stop.is_set(),
+                "saved": self.saved, "duplicates": self.duplicates, "deleted": self.deleted,
+                "failed": self.failed, "queued": self._queue.qsize()}
@@ -0,0 +1,189 @@
+import os, json, time, logging, threading
+
+
+class ModemStatus(object):
+    """In-memory snapshot of the modem's state for the home page.
+
+    ``get()`` returns the cached snapshot while it is younger than ``ttl``
+    seconds. When it is stale, the first caller refreshes it from the modem
+    and concurrent callers wait for that same refresh instead of issuing
+    their own AT commands (single-flight). The background sampler can push
+    fresh values with ``update()`` so the page rarely has to wait at all;
+    a full refresh (SIM state included) still happens every ``max_age``.
+    With ``path`` set, every new snapshot is also written there for the
+    worker processes that do not own the modem (see SharedStatus). Without
+    a modem the snapshot says it is still being looked for until
+    ``discovery_finished()`` is called.
+    """
+    def __init__(self, modem, ttl=30, max_age=300, wait_timeout=15, path=None):
+        self.modem = modem
+        self.discovering = modem is None
+        self.ttl = ttl
+        self.max_age = max_age
+        self.wait_timeout = wait_timeout
+        self.path = path
+        self.lock = threading.Lock()
+        self.snapshot = {
+            "module_detected": False,
+            "sim_inserted": False,
+            "csq": None,
+            "signal_strength": None,
+            "operator": None,
+            "error": None,
+            "refreshed_at": None,
+        }
+        self._refreshed = None          # monotonic time of the last refresh or sampler update
+        self._full_refresh = None       # monotonic time of the last full refresh
+        self._inflight = None           # Event set when the running refresh ends
+        self.refreshes = 0
+        self.waits = 0
+
+    def _fresh(self):
+        if self._full_refresh is None:
+            return False
+        now = time.monotonic()
+        return now - self._refreshed < self.ttl and now - self._full_refresh < self.max_age
+
+    def get(self):
+        """Current snapshot, refreshing it (once, for all callers) when stale"""
+        with self.lock:
+            if self._fresh():
+                return dict(self.snapshot)
+            inflight = self._inflight
+            leader = inflight is None
+            if leader:
+                inflight = self._inflight = threading.Event()
+            else:
+                self.waits += 1
+        if leader:
+            try:
+                self._refresh()
+            finally:
+                with self.lock:
+                    self._inflight = None
+                inflight.set()
+        else:
+            inflight.wait(self.wait_timeout)
+        with self.lock:
+            return dict(self.snapshot)
+
+    def _refresh(self):
+        values = {"error": None}
+        try:
+            if self.modem is None and self.discovering:
+                values.update(module_detected=False, error="Looking for the SIM800C module, try again shortly.")
+            elif self.modem is None or not self.modem.connect():
+                values.update(module_detected=False, error="SIM800C module not connected.")
+            else:
+                # One round trip: AT+CPIN?;+CSQ;+COPS?
+                result = self.modem.query(("sim", "signal", "operator"))
+                dbm = result["signal"]
+                values["module_detected"] = result["module_detected"]
+                values["sim_inserted"] = result["sim"]
+                values["signal_strength"] = dbm
+                values["csq"] = None if dbm is None else (99 if dbm == -120 else (dbm + 113) // 2)
+                values["operator"] = result["operator"]
+        except Exception as e:
+            logging.error(f"Error refreshing modem status: {e}")
+            values["error"] = str(e)
+        with self.lock:
+            self.snapshot.update(values)
+            self.snapshot["refreshed_at"] = time.time()
+            self._refreshed = self._full_refresh = time.monotonic()
+            self.refreshes += 1
+            self._save()
+
+    def _save(self):
+        """Publish the snapshot for other processes (called with the lock held)"""
+        if not self.path:
+            return
+        try:
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.snapshot, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.error(f"Error saving modem status to {self.path}: {e}")
+
+    def discovery_finished(self, modem):
+        """Device discovery is over: report on ``modem``, or that none was found"""
+        with self.lock:
+            self.modem = modem
+            self.discovering = False
+            self._full_refresh = None
+
+    def invalidate(self):
+        """Force the next ``get()`` to refresh (e.g. once the modem is found)"""
+        with self.lock:
+            self._full_refresh = None
+
+    def update(self, name, value):
+        """Fold a value sampled elsewhere (see Sampler ``on_sample``) into the snapshot"""
+        with self.lock:
+            if name == "signal":
+                if value is None:
+                    return
+                self.snapshot["signal_strength"] = value
+                self.snapshot["csq"] = 99 if value == -120 else (value + 113) // 2
+                self.snapshot["module_detected"] = True
+                self._refreshed = time.monotonic()
+            elif name == "operator":
+                self.snapshot["operator"] = value
+            else:
+                return
+            self.snapshot["refreshed_at"] = time.time()
+            self._save()
+
+    def stats(self):
+        with self.lock:
+            return {"refreshes": self.refreshes, "waits": self.waits, "fresh": self._fresh(),
+                    "refreshed_at": self.snapshot["refreshed_at"]}
+
+
+class SharedStatus(object):
+    """Read-only view of the snapshot the modem-owning process publishes.
+
+    Worker processes that do not own the modem serve the home page from
+    the file ModemStatus writes, re-reading it only when it changes.
+    Snapshots older than ``max_age`` seconds are reported as unavailable.
+    """
+    def __init__(self, path, max_age=300):
+        self.path = path
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.snapshot = None
+        self._mtime = None
+        self.loads = 0
+
+    def get(self):
+        with self.lock:
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+                if mtime != self._mtime:
+                    with open(self.path, 'r') as f:
+                        self.snapshot = json.load(f)
+                    self._mtime = mtime
+                    self.loads += 1
+            except (OSError, ValueError):
+                pass
+            snapshot = dict(self.snapshot or {})
+        refreshed_at = snapshot.get("refreshed_at")
+        if refreshed_at is None or time.time() - refreshed_at > self.max_age:
+            return {"module_detected": False, "sim_inserted": False, "csq": None, "signal_strength": None,
+                    "operator": None, "refreshed_at": refreshed_at,
+                    "error": "Waiting for the worker that owns the SIM800C module, try again shortly."}
+        return snapshot
+
+    def discovery_finished(self, modem):
+        pass
+
+    def invalidate(self):
+        pass
+
+    def update(self, name, value):
+        pass
+
+    def stats(self):
+        with self.lock:
+            return {"shared": True, "loads": self.loads,
+                    "refreshed_at": (self.snapshot or {}).get("refreshed_at")}
@@ -0,0 +1,1500 @@
+import os, json, math, mmap, time, struct, sqlite3, logging, threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping
+from datetime import datetime
+
+from .metrics import STORAGE_BYTES
+from .locks import FileLock
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".ndjson"
+TIME_INDEX_SUFFIX = ".tix"
+INDEX_FILE = "index.json"
+OPERATORS_FILE = "operators.txt"
+LOCK_FILE = "write.lock"
+FSYNC_POLICIES = ("always", "interval", "never")
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Time index entry: epoch seconds, byte offset in the segment, operator code
+TIX_ENTRY = struct.Struct("<dqH")
+NO_OPERATOR = 0xFFFF
+# Locators pack the segment number above the byte offset
+OFFSET_BITS = 40
+
+# Binary store: file header (magic, record size, format version) then fixed-width
+# records of id, epoch, signal strength in tenths of a dBm, operator code,
+# network type code, flags, latitude and longitude
+BINARY_MAGIC = b"SNBIN\x00\r\n"
+BINARY_HEADER = struct.Struct("<8sHH4x")
+BINARY_RECORD = struct.Struct("<IdhHBBff")
+BINARY_VERSION = 1
+NO_DBM = -0x8000
+FLAG_AVAILABLE, FLAG_AVAILABILITY_SET, FLAG_EXTRA = 1, 2, 4
+
+
+def _dumps(record):
+    """Serialise a reading as one compact NDJSON line"""
+    return (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def reading_epoch(reading):
+    """Epoch seconds of a reading, parsing the timestamp only for legacy rows"""
+    epoch = reading.get('epoch')
+    if epoch is None:
+        try:
+            epoch = datetime.strptime(reading['timestamp'], TIMESTAMP_FORMAT).timestamp()
+        except (KeyError, TypeError, ValueError):
+            return 0.0
+    return epoch
+
+
+def to_epoch(value):
+    """Accept a datetime or a number of epoch seconds"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return value.timestamp()
+
+
+class TimeIndex(object):
+    """Sorted epoch -> locator index with a secondary index per operator.
+
+    Locators are opaque integers owned by the store (a list position, or a
+    segment number and byte offset). Range queries bisect the epoch arrays, so
+    they only touch the rows that match.
+    """
+    def __init__(self):
+        self.epochs = array('d')
+        self.locators = array('q')
+        self.by_operator = {}
+
+    def __len__(self):
+        return len(self.epochs)
+
+    @staticmethod
+    def _insert(epochs, locators, epoch, locator):
+        if not epochs or epoch >= epochs[-1]:
+            epochs.append(epoch)
+            locators.append(locator)
+        else:
+            # Clock went backwards; keep the arrays in time order
+            i = bisect_right(epochs, epoch)
+            epochs.insert(i, epoch)
+            locators.insert(i, locator)
+
+    def add(self, epoch, locator, operator=None):
+        self._insert(self.epochs, self.locators, epoch, locator)
+        if operator is not None:
+            if operator not in self.by_operator:
+                self.by_operator[operator] = (array('d'), array('q'))
+            self._insert(*self.by_operator[operator], epoch, locator)
+
+    def range(self, start=None, end=None, operator=None):
+        """Locators with ``start <= epoch < end`` in time order"""
+        if operator is None:
+            epochs, locators = self.epochs, self.locators
+        elif operator in self.by_operator:
+            epochs, locators = self.by_operator[operator]
+        else:
+            return array('q')
+        lo = 0 if start is None else bisect_left(epochs, start)
+        hi = len(epochs) if end is None else bisect_left(epochs, end)
+        return locators[lo:hi]
+
+    def first_epoch(self):
+        return self.epochs[0] if self.epochs else None
+
+    def last_epoch(self):
+        return self.epochs[-1] if self.epochs else None
+
+
+class JsonArrayStore(object):
+    """Legacy store: the whole history kept as one JSON array.
+
+    Every append reads and rewrites the full file, so it is only kept for
+    compatibility with existing deployments and for small test setups.
+    Appends hold ``write_lock`` (a file lock) across the read-modify-write,
+    so several processes can share the file.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.write_lock = FileLock(path + ".lock")
+        self._foreign = []
+        with self.write_lock:
+            if not os.path.exists(self.path):
+                with open(self.path, 'w') as f:
+                    json.dump([], f)
+        self._max_id = max((r['id'] for r in self._load() if isinstance(r.get('id'), int)), default=0)
+
+    def _load(self):
+        with open(self.path, 'r') as f:
+            readings = json.load(f)
+            STORAGE_BYTES.inc(f.tell(), backend="json", direction="read")
+            return readings
+
+    def _write(self, readings):
+        # Replace the file atomically so other processes never read half of it
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(readings, f, indent=4)
+            STORAGE_BYTES.inc(f.tell(), backend="json", direction="write")
+        os.replace(tmp_path, self.path)
+
+    def append(self, reading):
+        return self.append_many([reading])[0]
+
+    def _note_foreign(self, readings):
+        """Remember readings other processes appended since we last looked"""
+        for reading in readings:
+            if isinstance(reading.get('id'), int) and reading['id'] > self._max_id:
+                self._foreign.append(reading)
+                self._max_id = reading['id']
+
+    def append_many(self, readings):
+        with self.write_lock, self.lock:
+            existing = self._load()
+            self._note_foreign(existing)
+            next_id = existing[-1].get('id', len(existing)) + 1 if existing else 1
+            for reading in readings:
+                reading['id'] = next_id
+                next_id += 1
+            existing.extend(readings)
+            self._write(existing)
+            self._max_id = next_id - 1
+        return readings
+
+    def latest(self):
+        readings = self._load()
+        return readings[-1] if readings else None
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def scan(self, start=None, end=None, operator=None):
+        """Readings with ``start <= epoch < end`` in time order"""
+        readings = self._load()
+        index = TimeIndex()
+        for position, reading in enumerate(readings):
+            index.add(reading_epoch(reading), position, reading.get('operator'))
+        for position in index.range(start, end, operator):
+            yield readings[position]
+
+    def count(self):
+        return len(self._load())
+
+    def bounds(self):
+        """(first, last) epoch in the store, or (None, None) when empty"""
+        epochs = [reading_epoch(reading) for reading in self._load()]
+        return (min(epochs), max(epochs)) if epochs else (None, None)
+
+    def signature(self):
+        try:
+            stat = os.stat(self.path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def refresh(self):
+        with self.lock:
+            self._note_foreign(self._load())
+
+    def take_foreign(self):
+        """Readings appended by other processes, noticed since the last call"""
+        with self.lock:
+            foreign, self._foreign = self._foreign, []
+            return foreign
+
+    def plan_expiry(self, cutoff):
+        return {"cutoff": cutoff}
+
+    def expired_readings(self, plan):
+        return self.scan(None, plan["cutoff"])
+
+    def expire(self, plan):
+        """Remove readings older than the plan's cutoff"""
+        with self.write_lock, self.lock:
+            readings = self._load()
+            kept = [reading for reading in readings if reading_epoch(reading) >= plan["cutoff"]]
+            self._write(kept)
+            return len(readings) - len(kept)
+
+    def sync(self):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SegmentLogStore(object):
+    """Append-only, newline-delimited JSON log split into size-capped segments.
+
+    An append only writes the new line at the end of the active segment, so
+    ingest cost no longer grows with the history on disk. ``index.json`` is a
+    small checkpoint of the next id, the segment table and the byte offset of
+    the latest record. Anything appended after the last checkpoint is
+    recovered by scanning the tail of the segments when the store is opened.
+
+    Each segment has a ``.tix`` sidecar of fixed-width (epoch, offset,
+    operator code) entries. They are loaded into a ``TimeIndex`` on open, so
+    range queries seek straight to the matching lines without parsing the
+    rest of the history. Operator codes are kept in ``operators.txt``.
+
+    Several processes can share the directory: appends, recovery and
+    expiry hold ``write_lock`` (a file lock), first pick up whatever other
+    processes appended so ids stay unique and increasing, and those foreign
+    records are handed out by ``take_foreign()``.
+
+    fsync policies:
+        always   - fsync after every append (safest, slowest)
+        interval - fsync at most once every ``fsync_interval`` seconds
+        never    - leave flushing to the operating system
+    """
+    def __init__(self, directory, segment_bytes=8 * 1024 * 1024, fsync="interval",
+                 fsync_interval=1.0, checkpoint_every=100, legacy_file=None):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.checkpoint_every = checkpoint_every
+        self.index_path = os.path.join(directory, INDEX_FILE)
+        self.lock = threading.RLock()
+
+        self._active = None
+        self._active_tix = None
+        self._last_sync = time.monotonic()
+        self._dirty = 0
+        self._foreign = []
+
+        os.makedirs(directory, exist_ok=True)
+        self.write_lock = FileLock(os.path.join(directory, LOCK_FILE))
+        with self.write_lock:
+            self._load_index()
+            self._recover()
+            self._load_operators()
+            self._load_time_index()
+            self._open_active()
+
+            if legacy_file and not self.index.get("migrated_from"):
+                self.migrate_json_array(legacy_file)
+
+    # -- index ---------------------------------------------------------------
+
+    def _load_index(self):
+        self.index = {"version": 1, "next_id": 1, "segments": [],
+                      "latest": None, "migrated_from": None}
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r') as f:
+                    self.index.update(json.load(f))
+            except (OSError, ValueError) as e:
+                # The index is only a checkpoint; rebuild it from the segments
+                logging.warning(f"Discarding unreadable readings index {self.index_path}: {e}")
+                self.index["segments"] = []
+
+        known = {segment["name"] for segment in self.index["segments"]}
+        for name in sorted(os.listdir(self.directory)):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX) and name not in known:
+                self.index["segments"].append(self._new_segment_entry(name))
+        self.index["segments"].sort(key=lambda segment: segment["name"])
+
+    def _new_segment_entry(self, name):
+        return {"name": name, "first_id": None, "last_id": None, "count": 0, "size": 0}
+
+    def checkpoint(self):
+        """Persist the side index atomically"""
+        with self.lock:
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.index, f)
+            os.replace(tmp_path, self.index_path)
+            self._dirty = 0
+
+    def _recover(self):
+        """Replay records written after the last checkpoint and drop torn tails"""
+        for segment in self.index["segments"]:
+            path = self._segment_path(segment["name"])
+            if not os.path.exists(path):
+                logging.warning(f"Readings segment {path} is missing; dropping it from the index")
+                segment["missing"] = True
+                continue
+            disk_size = os.path.getsize(path)
+            if disk_size == segment["size"]:
+                continue
+            if disk_size < segment["size"]:
+                # Checkpoint is ahead of the file (e.g. restored backup); rescan fully
+                segment.update(self._new_segment_entry(segment["name"]))
+
+            self._catch_up(segment, truncate=True)
+        self.index["segments"] = [s for s in self.index["segments"] if not s.pop("missing", False)]
+
+    def _catch_up(self, segment, truncate=False, index_time=False):
+        """Index complete records past the segment's known size; returns them"""
+        path = self._segment_path(segment["name"])
+        records = []
+        with open(path, 'r+b' if truncate else 'rb') as f:
+            f.seek(segment["size"])
+            offset = segment["size"]
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                self._note_record(segment, record, offset, len(line))
+                records.append(record)
+                if index_time:
+                    locator = (self._segment_number(segment["name"]) << OFFSET_BITS) | offset
+                    self.time_index.add(reading_epoch(record), locator, record.get('operator'))
+                offset += len(line)
+            if truncate and offset != os.path.getsize(path):
+                logging.warning(f"Truncating torn record at {path}:{offset}")
+                f.truncate(offset)
+            segment["size"] = offset
+        return records
+
+    def _note_record(self, segment, record, offset, length):
+        record_id = record.get("id", self.index["next_id"])
+        epoch = reading_epoch(record)
+        if segment["first_id"] is None:
+            segment["first_id"] = record_id
+            segment["min_epoch"] = segment["max_epoch"] = epoch
+        segment["min_epoch"] = min(segment["min_epoch"], epoch)
+        segment["max_epoch"] = max(segment["max_epoch"], epoch)
+        segment["last_id"] = record_id
+        segment["count"] += 1
+        segment["size"] = offset + length
+        self.index["next_id"] = max(self.index["next_id"], record_id + 1)
+        self.index["latest"] = {"segment": segment["name"], "offset": offset}
+
+    # -- time index ----------------------------------------------------------
+
+    def _load_operators(self):
+        self._operators = []
+        path = os.path.join(self.directory, OPERATORS_FILE)
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    if line.endswith("\n"):
+                        self._operators.append(json.loads(line))
+        self._operator_codes = {name: code for code, name in enumerate(self._operators)}
+
+    def _operator_code(self, name):
+        if name is None:
+            return NO_OPERATOR
+        code = self._operator_codes.get(name)
+        if code is None:
+            # Another process may have registered it already
+            self._load_operators()
+            code = self._operator_codes.get(name)
+        if code is None:
+            code = len(self._operators)
+            with open(os.path.join(self.directory, OPERATORS_FILE), 'a') as f:
+                f.write(json.dumps(name) + "\n")
+            self._operators.append(name)
+            self._operator_codes[name] = code
+        return code
+
+    def _load_time_index(self, repair=True):
+        """Load every segment's .tix sidecar, rebuilding any missing tail.
+
+        Only a holder of ``write_lock`` may ``repair`` (rewrite) sidecars;
+        others index the missing tail in memory.
+        """
+        self.time_index = TimeIndex()
+        if not repair:
+            self._load_operators()
+        for segment in self.index["segments"]:
+            self._load_segment_time_index(segment, repair)
+
+    def _load_segment_time_index(self, segment, repair=True):
+        number = self._segment_number(segment["name"])
+        tix_path = self._tix_path(segment["name"])
+        entries = []
+        tix_size = os.path.getsize(tix_path) if os.path.exists(tix_path) else 0
+        if tix_size:
+            with open(tix_path, 'rb') as f:
+                data = f.read()
+            usable = len(data) - len(data) % TIX_ENTRY.size
+            entries = [entry for entry in TIX_ENTRY.iter_unpack(data[:usable])
+                       if entry[1] < segment["size"]
+                       and (entry[2] == NO_OPERATOR or entry[2] < len(self._operators))]
+
+        # Index records the sidecar is missing (crash between the two writes)
+        stale = len(entries) * TIX_ENTRY.size != tix_size
+        offset = entries[-1][1] if entries else 0
+        if offset < segment["size"]:
+            with open(self._segment_path(segment["name"]), 'rb') as f:
+                f.seek(offset)
+                if entries:
+                    offset += len(f.readline())
+                for line in f:
+                    if offset >= segment["size"]:
+                        break
+                    record = json.loads(line)
+                    if repair:
+                        entries.append((reading_epoch(record), offset,
+                                        self._operator_code(record.get('operator'))))
+                    else:
+                        self.time_index.add(reading_epoch(record), (number << OFFSET_BITS) | offset,
+                                            record.get('operator'))
+                    offset += len(line)
+                    stale = True
+        if stale and repair:
+            with open(tix_path, 'wb') as f:
+                f.write(b"".join(TIX_ENTRY.pack(*entry) for entry in entries))
+
+        for epoch, offset, code in entries:
+            operator = None if code == NO_OPERATOR else self._operators[code]
+            self.time_index.add(epoch, (number << OFFSET_BITS) | offset, operator)
+
+    # -- segments ------------------------------------------------------------
+
+    def _segment_number(self, name):
+        return int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+
+    def _tix_path(self, name):
+        return self._segment_path(name[:-len(SEGMENT_SUFFIX)] + TIME_INDEX_SUFFIX)
+
+    def _segment_path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _open_active(self):
+        if not self.index["segments"]:
+            self.index["segments"].append(self._new_segment_entry(self._segment_name(1)))
+        segment = self.index["segments"][-1]
+        self._active = open(self._segment_path(segment["name"]), 'ab')
+        self._active_tix = open(self._tix_path(segment["name"]), 'ab')
+
+    def _segment_name(self, number):
+        return f"{SEGMENT_PREFIX}{number:06d}{SEGMENT_SUFFIX}"
+
+    def _roll(self):
+        """Seal the active segment and start a new one"""
+        self._sync(force=True)
+        self._active.close()
+        self._active_tix.close()
+        number = self._segment_number(self.index["segments"][-1]["name"]) + 1
+        self.index["segments"].append(self._new_segment_entry(self._segment_name(number)))
+        self._open_active()
+        self.checkpoint()
+
+    def _sync(self, force=False):
+        if self.fsync == "never" and not force:
+            return
+        now = time.monotonic()
+        if force or self.fsync == "always" or now - self._last_sync >= self.fsync_interval:
+            os.fsync(self._active.fileno())
+            self._last_sync = now
+
+    # -- public API ----------------------------------------------------------
+
+    def append(self, reading):
+        return self.append_many([reading])[0]
+
+    def _stale(self):
+        """Whether another process appended or rolled since we last looked"""
+        segment = self.index["segments"][-1]
+        try:
+            if os.path.getsize(self._segment_path(segment["name"])) != segment["size"]:
+                return True
+        except OSError:
+            return True
+        following = self._segment_name(self._segment_number(segment["name"]) + 1)
+        return os.path.exists(self._segment_path(following))
+
+    def append_many(self, readings, keep_ids=False):
+        """Append readings in one write, assigning consecutive ids"""
+        if not readings:
+            return readings
+        with self.write_lock, self.lock:
+            if self._stale():
+                self.refresh()
+            segment = self.index["segments"][-1]
+            if segment["count"] and segment["size"] >= self.segment_bytes:
+                self._roll()
+                segment = self.index["segments"][-1]
+
+            lines = []
+            next_id = self.index["next_id"]
+            for reading in readings:
+                if not (keep_ids and isinstance(reading.get('id'), int)):
+                    reading['id'] = next_id
+                next_id = max(next_id, reading['id'] + 1)
+                lines.append(_dumps(reading))
+
+            data = b"".join(lines)
+            self._active.write(data)
+            self._active.flush()
+            STORAGE_BYTES.inc(len(data), backend="log", direction="write")
+            self._sync()
+
+            number = self._segment_number(segment["name"])
+            offset = segment["size"]
+            entries = []
+            for reading, line in zip(readings, lines):
+                epoch = reading_epoch(reading)
+                code = self._operator_code(reading.get('operator'))
+                entries.append(TIX_ENTRY.pack(epoch, offset, code))
+                self.time_index.add(epoch, (number << OFFSET_BITS) | offset, reading.get('operator'))
+                self._note_record(segment, reading, offset, len(line))
+                offset += len(line)
+            self._active_tix.write(b"".join(entries))
+            self._active_tix.flush()
+
+            self._dirty += len(readings)
+            if self._dirty >= self.checkpoint_every:
+                self.checkpoint()
+        return readings
+
+    def latest(self):
+        """Return the most recent record by seeking straight to its offset"""
+        with self.lock:
+            latest = self.index["latest"]
+            if not latest:
+                return None
+            with open(self._segment_path(latest["segment"]), 'rb') as f:
+                f.seek(latest["offset"])
+                line = f.readline()
+        STORAGE_BYTES.inc(len(line), backend="log", direction="read")
+        return json.loads(line)
+
+    def __iter__(self):
+        with self.lock:
+            names = [segment["name"] for segment in self.index["segments"]]
+        read = 0
+        try:
+            for name in names:
+                with open(self._segment_path(name), 'rb') as f:
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break  # record still being written
+                        read += len(line)
+                        yield json.loads(line)
+        finally:
+            STORAGE_BYTES.inc(read, backend="log", direction="read")
+
+    def scan(self, start=None, end=None, operator=None):
+        """Readings with ``start <= epoch < end`` in time order, read by offset"""
+        with self.lock:
+            locators = self.time_index.range(start, end, operator)
+        mask = (1 << OFFSET_BITS) - 1
+        handle, handle_number = None, None
+        read = 0
+        try:
+            for locator in locators:
+                number, offset = locator >> OFFSET_BITS, locator & mask
+                if number != handle_number:
+                    if handle:
+                        handle.close()
+                    handle = open(self._segment_path(self._segment_name(number)), 'rb')
+                    handle_number = number
+                handle.seek(offset)
+                line = handle.readline()
+                read += len(line)
+                yield json.loads(line)
+        finally:
+            STORAGE_BYTES.inc(read, backend="log", direction="read")
+            if handle:
+                handle.close()
+
+    def count(self):
+        with self.lock:
+            return sum(segment["count"] for segment in self.index["segments"])
+
+    def bounds(self):
+        """(first, last) epoch in the store, or (None, None) when empty"""
+        with self.lock:
+            return (self.time_index.first_epoch(), self.time_index.last_epoch())
+
+    def signature(self):
+        """Cheap change detector: directory and active segment stat"""
+        try:
+            directory = os.stat(self.directory)
+            active = os.stat(self._segment_path(self.index["segments"][-1]["name"]))
+            return (directory.st_mtime_ns, active.st_size, active.st_mtime_ns)
+        except OSError:
+            return None
+
+    def refresh(self):
+        """Pick up segments and records appended (or expired) by other processes"""
+        with self.lock:
+            if any(not os.path.exists(self._segment_path(s["name"])) for s in self.index["segments"][:-1]):
+                self.index["segments"] = [s for s in self.index["segments"]
+                                          if os.path.exists(self._segment_path(s["name"]))]
+                self._load_time_index(repair=False)
+            known = {segment["name"] for segment in self.index["segments"]}
+            last_known = self.index["segments"][-1]["name"]
+            for name in sorted(os.listdir(self.directory)):
+                if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX) and name not in known:
+                    self.index["segments"].append(self._new_segment_entry(name))
+            self.index["segments"].sort(key=lambda segment: segment["name"])
+            for segment in self.index["segments"]:
+                if segment["name"] >= last_known:
+                    self._foreign.extend(self._catch_up(segment, index_time=True))
+            if self.index["segments"][-1]["name"] != last_known:
+                self._active.close()
+                self._active_tix.close()
+                self._open_active()
+
+    def take_foreign(self):
+        """Records appended by other processes, picked up since the last call"""
+        with self.lock:
+            foreign, self._foreign = self._foreign, []
+            return foreign
+
+    def plan_expiry(self, cutoff):
+        """Sealed segments whose readings are all older than ``cutoff``.
+
+        Expiry works on whole segments, so the active segment and any segment
+        holding a newer reading stay hot.
+        """
+        with self.lock:
+            names = [segment["name"] for segment in self.index["segments"][:-1]
+                     if not segment["count"] or segment["max_epoch"] < cutoff]
+            return {"cutoff": cutoff, "segments": names}
+
+    def expired_readings(self, plan):
+        for name in plan["segments"]:
+            with open(self._segment_path(name), 'rb') as f:
+                for line in f:
+                    yield json.loads(line)
+
+    def expire(self, plan):
+        """Delete the planned segments and their time indexes"""
+        with self.write_lock, self.lock:
+            if self._stale():
+                self.refresh()
+            names = set(plan["segments"])
+            removed = 0
+            for segment in self.index["segments"][:-1]:
+                if segment["name"] in names:
+                    removed += segment["count"]
+                    for path in (self._segment_path(segment["name"]), self._tix_path(segment["name"])):
+                        if os.path.exists(path):
+                            os.remove(path)
+            self.index["segments"] = [s for s in self.index["segments"][:-1] if s["name"] not in names] \
+                + self.index["segments"][-1:]
+            if self.index["latest"] and self.index["latest"]["segment"] in names:
+                self.index["latest"] = None
+            self._load_time_index()
+            self.checkpoint()
+            return removed
+
+    def migrate_json_array(self, legacy_file):
+        """One-time import of the old ``network_readings.json`` array"""
+        with self.lock:
+            readings = []
+            if os.path.exists(legacy_file) and self.count() == 0:
+                with open(legacy_file, 'r') as f:
+                    readings = json.load(f)
+                for reading in readings:
+                    reading.setdefault('epoch', reading_epoch(reading))
+                # Keep the ids the old file handed out
+                self.append_many(readings, keep_ids=True)
+                logging.info(f"Migrated {len(readings)} readings from {legacy_file} to {self.directory}")
+            self.index["migrated_from"] = legacy_file
+            self.checkpoint()
+            return len(readings)
+
+    def sync(self):
+        """Force appended records to disk regardless of the fsync policy"""
+        with self.lock:
+            if self._active and not self._active.closed:
+                self._active_tix.flush()
+                self._sync(force=True)
+
+    def flush(self):
+        with self.write_lock, self.lock:
+            if self._active and not self._active.closed:
+                self._active.flush()
+                self._active_tix.flush()
+                self._sync(force=True)
+            if self._stale():
+                self.refresh()
+            self.checkpoint()
+
+    def close(self):
+        with self.write_lock, self.lock:
+            if self._active and not self._active.closed:
+                self.flush()
+                self._active.close()
+                self._active_tix.close()
+        self.write_lock.close()
+
+
+# Columns with their own storage in SQLite; any other keys go to ``extra``
+READING_COLUMNS = ("id", "epoch", "timestamp", "operator", "network_type", "signal_strength",
+                   "latitude", "longitude", "availability")
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS readings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    epoch REAL NOT NULL,
+    timestamp TEXT NOT NULL,
+    operator TEXT,
+    network_type TEXT,
+    signal_strength NUMERIC,
+    latitude NUMERIC,
+    longitude NUMERIC,
+    availability INTEGER,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_readings_epoch ON readings (epoch);
+CREATE INDEX IF NOT EXISTS idx_readings_operator_epoch ON readings (operator, epoch);
+CREATE INDEX IF NOT EXISTS idx_readings_location ON readings (latitude, longitude);
+CREATE TABLE IF NOT EXISTS operators (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    country_code TEXT,
+    network_code TEXT
+);
+"""
+
+# Statements are module constants so sqlite3's per-connection statement
+# cache always hands back the same prepared statement.
+SQL_INSERT = ("INSERT INTO readings (id, epoch, timestamp, operator, network_type, signal_strength, "
+              "latitude, longitude, availability, extra) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+SQL_SELECT = "SELECT " + ", ".join(READING_COLUMNS) + ", extra FROM readings"
+SQL_LATEST = SQL_SELECT + " ORDER BY id DESC LIMIT 1"
+SQL_ALL = SQL_SELECT + " ORDER BY id"
+SQL_RANGE = SQL_SELECT + " WHERE epoch >= ? AND epoch < ? ORDER BY epoch, id"
+SQL_RANGE_OPERATOR = SQL_SELECT + " WHERE operator = ? AND epoch >= ? AND epoch < ? ORDER BY epoch, id"
+SQL_AREA = (SQL_SELECT + " WHERE latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?"
+            " AND epoch >= ? AND epoch < ? ORDER BY epoch, id")
+SQL_AREA_OPERATOR = (SQL_SELECT + " WHERE latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?"
+                     " AND epoch >= ? AND epoch < ? AND operator = ? ORDER BY epoch, id")
+SQL_EXPIRY_MAX_ID = "SELECT MAX(id) FROM readings WHERE epoch < ?"
+SQL_EXPIRED = SQL_SELECT + " WHERE epoch < ? AND id <= ? ORDER BY epoch, id"
+SQL_EXPIRE = "DELETE FROM readings WHERE epoch < ? AND id <= ?"
+SQL_SINCE = SQL_SELECT + " WHERE id > ? ORDER BY id"
+SQL_MAX_ID = "SELECT MAX(id) FROM readings"
+SQL_COUNT = "SELECT COUNT(*) FROM readings"
+SQL_BOUNDS = "SELECT MIN(epoch), MAX(epoch) FROM readings"
+SQL_OPERATORS = "SELECT id, name, country_code, network_code FROM operators ORDER BY id"
+SQL_INSERT_OPERATOR = ("INSERT OR REPLACE INTO operators (id, name, country_code, network_code) "
+                       "VALUES (?, ?, ?, ?)")
+
+
+class SQLiteStore(object):
+    """Readings and operators in one SQLite database.
+
+    The database runs in WAL mode so page renders can read while the ingest
+    path writes. Range queries go through the ``(epoch)`` and
+    ``(operator, epoch)`` indexes and area queries through
+    ``(latitude, longitude)``. Each thread gets its own connection.
+    SQLite already serialises writers across processes; appends also hold
+    ``write_lock`` so rows other processes inserted are picked up (see
+    ``take_foreign()``) before ours.
+    """
+    def __init__(self, path, synchronous="NORMAL", operators_file=None):
+        self.path = path
+        self.synchronous = synchronous
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.write_lock = FileLock(path + ".lock")
+        self._foreign = []
+
+        conn = self._conn()
+        with self.write_lock, conn:
+            conn.executescript(SQLITE_SCHEMA)
+        if operators_file and not self.get_operators() and os.path.exists(operators_file):
+            with open(operators_file, 'r') as f:
+                self.import_operators(json.load(f))
+        self._max_id = conn.execute(SQL_MAX_ID).fetchone()[0] or 0
+
+    def _conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, cached_statements=64)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            self.local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row_params(reading, keep_id=False):
+        extra = {key: value for key, value in reading.items() if key not in READING_COLUMNS}
+        availability = reading.get('availability')
+        return (
+            reading.get('id') if keep_id else None,
+            reading_epoch(reading),
+            reading.get('timestamp', ""),
+            reading.get('operator'),
+            reading.get('network_type'),
+            reading.get('signal_strength'),
+            reading.get('latitude'),
+            reading.get('longitude'),
+            None if availability is None else int(bool(availability)),
+            json.dumps(extra) if extra else None,
+        )
+
+    @staticmethod
+    def _row_to_reading(row):
+        reading = {key: value for key, value in zip(READING_COLUMNS, row) if value is not None}
+        if 'availability' in reading:
+            reading['availability'] = bool(reading['availability'])
+        if row[-1]:
+            reading.update(json.loads(row[-1]))
+        return reading
+
+    def append(self, reading):
+        return self.append_many([reading])[0]
+
+    def append_many(self, readings, keep_ids=False):
+        """Insert readings in a single transaction"""
+        conn = self._conn()
+        with self.write_lock:
+            self.refresh()
+            with conn:
+                for reading in readings:
+                    keep = keep_ids and isinstance(reading.get('id'), int)
+                    cursor = conn.execute(SQL_INSERT, self._row_params(reading, keep))
+                    reading['id'] = cursor.lastrowid
+            with self.lock:
+                self._max_id = max([self._max_id] + [reading['id'] for reading in readings])
+        return readings
+
+    def import_readings(self, readings, batch_size=5000):
+        """Bulk load readings, keeping their ids; returns the number imported"""
+        conn = self._conn()
+        total = 0
+        batch = []
+        with conn:
+            for reading in readings:
+                batch.append(self._row_params(reading, keep_id=isinstance(reading.get('id'), int)))
+                if len(batch) >= batch_size:
+                    conn.executemany(SQL_INSERT, batch)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                conn.executemany(SQL_INSERT, batch)
+                total += len(batch)
+        return total
+
+    def import_operators(self, operators):
+        conn = self._conn()
+        with conn:
+            conn.executemany(SQL_INSERT_OPERATOR, [
+                (op.get('id'), op['name'], op.get('country_code'), op.get('network_code'))
+                for op in operators
+            ])
+
+    def get_operators(self):
+        rows = self._conn().execute(SQL_OPERATORS).fetchall()
+        return [dict(zip(("id", "name", "country_code", "network_code"), row)) for row in rows]
+
+    def latest(self):
+        row = self._conn().execute(SQL_LATEST).fetchone()
+        return self._row_to_reading(row) if row else None
+
+    def __iter__(self):
+        for row in self._conn().execute(SQL_ALL):
+            yield self._row_to_reading(row)
+
+    def scan(self, start=None, end=None, operator=None):
+        """Readings with ``start <= epoch < end`` in time order"""
+        start = float("-inf") if start is None else start
+        end = float("inf") if end is None else end
+        if operator is None:
+            cursor = self._conn().execute(SQL_RANGE, (start, end))
+        else:
+            cursor = self._conn().execute(SQL_RANGE_OPERATOR, (operator, start, end))
+        for row in cursor:
+            yield self._row_to_reading(row)
+
+    def scan_area(self, min_lat, min_lon, max_lat, max_lon, start=None, end=None, operator=None):
+        """Readings inside a lat/long box, using the location index"""
+        start = float("-inf") if start is None else start
+        end = float("inf") if end is None else end
+        params = (min_lat, max_lat, min_lon, max_lon, start, end)
+        if operator is None:
+            cursor = self._conn().execute(SQL_AREA, params)
+        else:
+            cursor = self._conn().execute(SQL_AREA_OPERATOR, params + (operator,))
+        for row in cursor:
+            yield self._row_to_reading(row)
+
+    def count(self):
+        return self._conn().execute(SQL_COUNT).fetchone()[0]
+
+    def bounds(self):
+        """(first, last) epoch in the store, or (None, None) when empty"""
+        return tuple(self._conn().execute(SQL_BOUNDS).fetchone())
+
+    def signature(self):
+        """Database and WAL file stat; changes on every commit"""
+        parts = []
+        for path in (self.path, self.path + "-wal"):
+            try:
+                stat = os.stat(path)
+                parts.extend((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                parts.extend((None, None))
+        return tuple(parts)
+
+    def refresh(self):
+        """Collect rows other processes inserted since we last looked"""
+        with self.lock:
+            rows = self._conn().execute(SQL_SINCE, (self._max_id,)).fetchall()
+            if rows:
+                self._foreign.extend(self._row_to_reading(row) for row in rows)
+                self._max_id = self._foreign[-1]['id']
+
+    def take_foreign(self):
+        """Rows inserted by other processes, picked up since the last call"""
+        with self.lock:
+            foreign, self._foreign = self._foreign, []
+            return foreign
+
+    def plan_expiry(self, cutoff):
+        """Pin the newest id now so rows inserted meanwhile are never removed unseen"""
+        max_id = self._conn().execute(SQL_EXPIRY_MAX_ID, (cutoff,)).fetchone()[0]
+        return {"cutoff": cutoff, "max_id": max_id or 0}
+
+    def expired_readings(self, plan):
+        for row in self._conn().execute(SQL_EXPIRED, (plan["cutoff"], plan["max_id"])):
+            yield self._row_to_reading(row)
+
+    def expire(self, plan):
+        conn = self._conn()
+        with conn:
+            return conn.execute(SQL_EXPIRE, (plan["cutoff"], plan["max_id"])).rowcount
+
+    def sync(self):
+        # Commits are already durable per PRAGMA synchronous
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+
+def binary_dtype(np):
+    """NumPy dtype laid out like BINARY_RECORD, for views over the mapped file"""
+    return np.dtype([("id", "<u4"), ("epoch", "<f8"), ("dbm", "<i2"), ("operator", "<u2"),
+                     ("network_type", "u1"), ("flags", "u1"), ("latitude", "<f4"), ("longitude", "<f4")])
+
+
+class CompactReading(Mapping):
+    """A stored reading held in slots instead of a dict.
+
+    It reads like the dict it was saved from (``reading['operator']``,
+    ``reading.get('latitude')``, ``dict(reading)``); the timestamp is
+    formatted from the epoch when asked for, and operator and network type
+    strings are shared with the store's dictionary. Values the binary record
+    cannot hold are kept in ``extra`` and take precedence.
+    """
+    __slots__ = ("id", "epoch", "operator", "network_type", "signal_strength",
+                 "latitude", "longitude", "availability", "extra")
+
+    def __init__(self, id, epoch, operator=None, network_type=None, signal_strength=None,
+                 latitude=None, longitude=None, availability=None, extra=None):
+        self.id = id
+        self.epoch = epoch
+        self.operator = operator
+        self.network_type = network_type
+        self.signal_strength = signal_strength
+        self.latitude = latitude
+        self.longitude = longitude
+        self.availability = availability
+        self.extra = extra
+
+    @property
+    def timestamp(self):
+        if self.extra and 'timestamp' in self.extra:
+            return self.extra['timestamp']
+        return datetime.fromtimestamp(self.epoch).strftime(TIMESTAMP_FORMAT)
+
+    def __getitem__(self, key):
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        if key in READING_COLUMNS:
+            value = getattr(self, key)
+            if value is not None:
+                return value
+        raise KeyError(key)
+
+    def __iter__(self):
+        extra = self.extra or {}
+        for key in READING_COLUMNS:
+            if key in extra or getattr(self, key) is not None:
+                yield key
+        for key in extra:
+            if key not in READING_COLUMNS:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def to_dict(self):
+        return dict(self)
+
+    def __repr__(self):
+        return f"CompactReading({self.to_dict()!r})"
+
+
+class BinaryStore(object):
+    """Readings as fixed-width binary records, read through ``mmap``.
+
+    Every record is BINARY_RECORD.size (26) bytes: id, epoch, signal strength
+    in tenths of a dBm, operator and network type codes, availability flags
+    and float32 latitude/longitude. Operator codes start from the ids in
+    ``network_operators.json``; names seen later get the next free code in
+    the ``.dict`` sidecar. Values a record cannot hold (``device_id``,
+    "Unknown" coordinates, ...) go to the ``.extra`` NDJSON sidecar by id.
+
+    Nothing is parsed on read: range scans bisect a TimeIndex of record
+    numbers and unpack only those records from the mapping into
+    CompactReading objects, and ``view()`` hands out NumPy structured arrays
+    over the mapped bytes. Appends are one write at the end of the file under
+    ``write_lock``, so several processes can share the store.
+    """
+    def __init__(self, path, operators_file=None, legacy_file=None):
+        self.path = path
+        self.dictionary_path = path + ".dict"
+        self.extra_path = path + ".extra"
+        self.lock = threading.RLock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.write_lock = FileLock(path + ".lock")
+        self._fd = None
+        self._mmap = None
+        with self.write_lock, self.lock:
+            created = not os.path.exists(path)
+            if created:
+                with open(path, 'wb') as f:
+                    f.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_RECORD.size, BINARY_VERSION))
+            if not os.path.exists(self.dictionary_path):
+                self._seed_dictionary(operators_file)
+            # Drop a record torn by a crash in the middle of a write
+            size = os.path.getsize(path)
+            whole = BINARY_HEADER.size + max(size - BINARY_HEADER.size, 0) // BINARY_RECORD.size * BINARY_RECORD.size
+            if size != whole:
+                logging.warning(f"Truncating {size - whole} bytes of a torn record in {path}")
+                os.truncate(path, whole)
+            self._open()
+            if created and legacy_file:
+                self.migrate_json_array(legacy_file)
+
+    # -- files ---------------------------------------------------------------
+
+    def _open(self):
+        """(Re)open the records file and index everything in it"""
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_APPEND | getattr(os, "O_BINARY", 0))
+        magic, record_size, version = BINARY_HEADER.unpack(os.pread(self._fd, BINARY_HEADER.size, 0))
+        if magic != BINARY_MAGIC or record_size != BINARY_RECORD.size:
+            raise ValueError(f"{self.path} is not a version {BINARY_VERSION} binary readings file")
+        self._inode = os.fstat(self._fd).st_ino
+        # Old mappings are left to the garbage collector: views may still use them
+        self._mmap = None
+        self._count = 0
+        self._max_id = 0
+        self._foreign = []
+        self.time_index = TimeIndex()
+        self._extras = {}
+        self._extras_size = 0
+        self._dictionary_signature = None
+        self._load_dictionary()
+        self._index(collect=False)
+
+    def _map(self, size):
+        if self._mmap is None or len(self._mmap) < size:
+            self._mmap = mmap.mmap(self._fd, size, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def _index(self, collect=True):
+        """Index records appended since we last looked; ``collect`` keeps other processes' ones"""
+        size = os.fstat(self._fd).st_size
+        total = (size - BINARY_HEADER.size) // BINARY_RECORD.size
+        if total <= self._count:
+            return
+        self._load_extras()
+        mm = self._map(BINARY_HEADER.size + total * BINARY_RECORD.size)
+        start = BINARY_HEADER.size + self._count * BINARY_RECORD.size
+        with memoryview(mm) as view:
+            records = view[start:BINARY_HEADER.size + total * BINARY_RECORD.size]
+            for number, fields in enumerate(BINARY_RECORD.iter_unpack(records), self._count):
+                self.time_index.add(fields[1], number, self._name("operators", fields[3]))
+                if fields[0] > self._max_id:
+                    if collect:
+                        self._foreign.append(self._decode(fields))
+                    self._max_id = fields[0]
+            records.release()
+        STORAGE_BYTES.inc((total - self._count) * BINARY_RECORD.size, backend="binary", direction="read")
+        self._count = total
+
+    def _replaced(self):
+        """True once expire() in some process swapped in a new file"""
+        try:
+            return os.stat(self.path).st_ino != self._inode
+        except OSError:
+            return False
+
+    # -- operator and network type dictionary --------------------------------
+
+    def _seed_dictionary(self, operators_file):
+        operators = [None]
+        if operators_file and os.path.exists(operators_file):
+            with open(operators_file, 'r') as f:
+                for operator in json.load(f):
+                    if 0 < operator["id"] <= 0xFFFF:
+                        operators.extend([None] * (operator["id"] + 1 - len(operators)))
+                        operators[operator["id"]] = operator["name"]
+        self._write_dictionary({"operators": operators, "network_types": [None]})
+
+    def _write_dictionary(self, dictionary):
+        tmp_path = f"{self.dictionary_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(dictionary, f)
+        os.replace(tmp_path, self.dictionary_path)
+
+    def _load_dictionary(self):
+        stat = os.stat(self.dictionary_path)
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if signature == self._dictionary_signature:
+            return False
+        with open(self.dictionary_path, 'r') as f:
+            self._names = json.load(f)
+        self._codes = {kind: {name: code for code, name in enumerate(names) if name is not None}
+                       for kind, names in self._names.items()}
+        self._dictionary_signature = signature
+        return True
+
+    def _name(self, kind, code):
+        names = self._names[kind]
+        if code >= len(names) and self._load_dictionary():
+            names = self._names[kind]
+        return names[code] if code < len(names) else None
+
+    def _code(self, kind, key, limit, reading, extra):
+        """Code for ``reading[key]``, adding new names to the dictionary"""
+        name = reading.get(key)
+        if name is None:
+            return 0
+        code = self._codes[kind].get(name)
+        if code is None:
+            names = self._names[kind]
+            if not isinstance(name, str) or len(names) > limit:
+                extra[key] = name
+                return 0
+            code = len(names)
+            names.append(name)
+            self._codes[kind][name] = code
+            self._dictionary_changed = True
+        return code
+
+    def dictionary(self):
+        """Names by code: ``{"operators": [...], "network_types": [...]}``, code 0 is None"""
+        with self.lock:
+            return {kind: list(names) for kind, names in self._names.items()}
+
+    # -- extras sidecar ------------------------------------------------------
+
+    def _load_extras(self):
+        try:
+            size = os.path.getsize(self.extra_path)
+        except OSError:
+            return
+        if size <= self._extras_size:
+            return
+        with open(self.extra_path, 'rb') as f:
+            f.seek(self._extras_size)
+            data = f.read(size - self._extras_size)
+        # Only whole lines; a writer may be mid-way through the last one
+        data = data[:data.rfind(b"\n") + 1]
+        for line in data.splitlines():
+            entry = json.loads(line)
+            self._extras[entry["id"]] = entry["extra"]
+        self._extras_size += len(data)
+
+    # -- records -------------------------------------------------------------
+
+    def _encode(self, reading):
+        """(record bytes, extra dict or None) for one reading"""
+        extra = {key: value for key, value in reading.items() if key not in READING_COLUMNS}
+        epoch = float(reading_epoch(reading))
+        timestamp = reading.get('timestamp')
+        if timestamp is not None and timestamp != datetime.fromtimestamp(epoch).strftime(TIMESTAMP_FORMAT):
+            extra['timestamp'] = timestamp
+
+        dbm = NO_DBM
+        if reading.get('signal_strength') is not None:
+            try:
+                dbm = round(float(reading['signal_strength']) * 10)
+                if not NO_DBM < dbm <= 0x7FFF:
+                    raise ValueError
+            except (TypeError, ValueError, OverflowError):
+                dbm = NO_DBM
+                extra['signal_strength'] = reading['signal_strength']
+
+        coordinates = []
+        for key in ('latitude', 'longitude'):
+            value = reading.get(key)
+            coordinate = math.nan
+            if value is not None:
+                try:
+                    coordinate = float(value)
+                    if not abs(coordinate) <= 1e38:
+                        raise ValueError
+                except (TypeError, ValueError):
+                    coordinate = math.nan
+                    extra[key] = value
+            coordinates.append(coordinate)
+
+        flags = 0
+        if reading.get('availability') is not None:
+            flags |= FLAG_AVAILABILITY_SET | (FLAG_AVAILABLE if reading['availability'] else 0)
+        operator = self._code("operators", 'operator', 0xFFFF, reading, extra)
+        network_type = self._code("network_types", 'network_type', 0xFF, reading, extra)
+        if extra:
+            flags |= FLAG_EXTRA
+        record = BINARY_RECORD.pack(reading['id'], epoch, dbm, operator, network_type, flags, *coordinates)
+        return record, extra or None
+
+    def _decode(self, fields):
+        id, epoch, dbm, operator, network_type, flags, latitude, longitude = fields
+        return CompactReading(
+            id, epoch,
+            operator=self._name("operators", operator) if operator else None,
+            network_type=self._name("network_types", network_type) if network_type else None,
+            signal_strength=None if dbm == NO_DBM else (dbm // 10 if dbm % 10 == 0 else dbm / 10),
+            latitude=None if latitude != latitude else round(latitude, 6),
+            longitude=None if longitude != longitude else round(longitude, 6),
+            availability=bool(flags & FLAG_AVAILABLE) if flags & FLAG_AVAILABILITY_SET else None,
+            extra=self._extras.get(id) if flags & FLAG_EXTRA else None)
+
+    def _record(self, mm, number):
+        return self._decode(BINARY_RECORD.unpack_from(mm, BINARY_HEADER.size + number * BINARY_RECORD.size))
+
+    # -- store interface -----------------------------------------------------
+
+    def append(self, reading):
+        return self.append_many([reading])[0]
+
+    def append_many(self, readings, keep_ids=False):
+        if not readings:
+            return readings
+        with self.write_lock, self.lock:
+            self._refresh()
+            self._load_dictionary()     # names other processes added
+            self._dictionary_changed = False
+            next_id = self._max_id + 1
+            records, extras = [], []
+            for reading in readings:
+                if not (keep_ids and isinstance(reading.get('id'), int)):
+                    reading['id'] = next_id
+                next_id = max(next_id, reading['id'] + 1)
+                record, extra = self._encode(reading)
+                records.append(record)
+                if extra:
+                    extras.append((reading['id'], extra))
+            # Sidecars first: a record must never point at a name or extra that is not on disk
+            if self._dictionary_changed:
+                self._write_dictionary(self._names)
+                self._load_dictionary()
+            if extras:
+                data = b"".join(_dumps({"id": id, "extra": extra}) for id, extra in extras)
+                with open(self.extra_path, 'ab') as f:
+                    f.write(data)
+                self._load_extras()
+            data = b"".join(records)
+            written = 0
+            while written < len(data):
+                written += os.write(self._fd, data[written:])
+            STORAGE_BYTES.inc(len(data), backend="binary", direction="write")
+            for number, reading in enumerate(readings, self._count):
+                self.time_index.add(reading_epoch(reading), number, reading.get('operator'))
+            self._count += len(readings)
+            self._max_id = next_id - 1
+        return readings
+
+    def migrate_json_array(self, legacy_file):
+        """One-time import of the old ``network_readings.json`` array"""
+        if not os.path.exists(legacy_file):
+            return 0
+        with open(legacy_file, 'r') as f:
+            readings = json.load(f)
+        # Keep the ids the old file handed out
+        self.append_many(readings, keep_ids=True)
+        self._foreign = []
+        logging.info(f"Migrated {len(readings)} readings from {legacy_file} to {self.path}")
+        return len(readings)
+
+    def latest(self):
+        with self.lock:
+            if not self._count:
+                return None
+            return self._record(self._map(BINARY_HEADER.size + self._count * BINARY_RECORD.size),
+                                self._count - 1)
+
+    def __iter__(self):
+        """Every reading in file (id) order"""
+        with self.lock:
+            count = self._count
+            mm = self._map(BINARY_HEADER.size + count * BINARY_RECORD.size) if count else None
+        for number in range(count):
+            yield self._record(mm, number)
+
+    def scan(self, start=None, end=None, operator=None):
+        """Readings with ``start <= epoch < end`` in time order"""
+        with self.lock:
+            numbers = self.time_index.range(start, end, operator)
+            mm = self._map(BINARY_HEADER.size + self._count * BINARY_RECORD.size) if numbers else None
+        for number in numbers:
+            yield self._record(mm, number)
+
+    def view(self, start=None, end=None):
+        """Records with ``start <= epoch < end`` as a NumPy structured array (see binary_dtype()).
+
+        Without bounds, or when the range is one contiguous run of records,
+        the array is a view of the mapped file; otherwise the rows are
+        gathered into a copy in time order.
+        """
+        from .analytics import load_numpy
+        np = load_numpy()
+        if np is None:
+            raise RuntimeError("BinaryStore.view() needs NumPy")
+        dtype = binary_dtype(np)
+        with self.lock:
+            if not self._count:
+                return np.zeros(0, dtype=dtype)
+            mm = self._map(BINARY_HEADER.size + self._count * BINARY_RECORD.size)
+            records = np.frombuffer(mm, dtype=dtype, count=self._count, offset=BINARY_HEADER.size)
+            if start is None and end is None:
+                return records
+            numbers = self.time_index.range(start, end)
+        if not numbers:
+            return records[:0]
+        numbers = np.frombuffer(numbers, dtype=np.int64)
+        if numbers[-1] - numbers[0] == len(numbers) - 1 and bool(np.all(np.diff(numbers) == 1)):
+            return records[numbers[0]:numbers[-1] + 1]
+        return records[numbers]
+
+    def count(self):
+        with self.lock:
+            return self._count
+
+    def bounds(self):
+        """(first, last) epoch in the store, or (None, None) when empty"""
+        with self.lock:
+            return self.time_index.first_epoch(), self.time_index.last_epoch()
+
+    def signature(self):
+        try:
+            stat = os.stat(self.path)
+            return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def _refresh(self):
+        if self._replaced():
+            foreign, max_id = self._foreign, self._max_id
+            self._open()
+            # Rebuilding the index is not news: only ids we had not seen yet are
+            self._foreign = foreign + [reading for reading in self
+                                       if reading['id'] > max_id]
+            self._max_id = max(self._max_id, max_id)
+        else:
+            self._index()
+
+    def refresh(self):
+        with self.lock:
+            self._refresh()
+
+    def take_foreign(self):
+        """Readings appended by other processes, noticed since the last call"""
+        with self.lock:
+            foreign, self._foreign = self._foreign, []
+            return foreign
+
+    def plan_expiry(self, cutoff):
+        return {"cutoff": cutoff}
+
+    def expired_readings(self, plan):
+        for reading in self.scan(None, plan["cutoff"]):
+            yield reading.to_dict()
+
+    def expire(self, plan):
+        """Rewrite the file without readings older than the plan's cutoff"""
+        cutoff = plan["cutoff"]
+        with self.write_lock, self.lock:
+            self._refresh()
+            if not self._count or self.time_index.first_epoch() >= cutoff:
+                return 0
+            mm = self._map(BINARY_HEADER.size + self._count * BINARY_RECORD.size)
+            kept, kept_ids = [], []
+            with memoryview(mm) as view:
+                for number in range(self._count):
+                    offset = BINARY_HEADER.size + number * BINARY_RECORD.size
+                    id, epoch = struct.unpack_from("<Id", view, offset)
+                    if epoch >= cutoff:
+                        kept.append(bytes(view[offset:offset + BINARY_RECORD.size]))
+                        kept_ids.append(id)
+            removed = self._count - len(kept)
+            # Extras first: until the records file is replaced it only loses entries of expired readings
+            tmp_path = f"{self.extra_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(b"".join(_dumps({"id": id, "extra": self._extras[id]})
+                                 for id in kept_ids if id in self._extras))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.extra_path)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_RECORD.size, BINARY_VERSION))
+                f.write(b"".join(kept))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            max_id = self._max_id
+            self._open()
+            self._max_id = max(self._max_id, max_id)
+            return removed
+
+    def sync(self):
+        with self.lock:
+            os.fsync(self._fd)
+
+    def flush(self):
+        # Appends go straight to the file with os.write
+        pass
+
+    def close(self):
+        with self.lock:
+            if self._fd is not None:
+                os.fsync(self._fd)
+                os.close(self._fd)
+                self._fd = None
+        self.write_lock.close()
+
+
+def open_store(backend, readings_file, **options):
+    """Build the readings store configured by ``config.STORAGE_BACKEND``"""
+    if backend == "json":
+        return JsonArrayStore(readings_file)
+    if backend == "sqlite":
+        return SQLiteStore(options.pop("path"), **options)
+    if backend == "log":
+        directory = options.pop("directory", None) or os.path.splitext(readings_file)[0]
+        return SegmentLogStore(directory, legacy_file=readings_file, **options)
+    if backend == "binary":
+        return BinaryStore(options.pop("path"), legacy_file=readings_file, **options)
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -0,0 +1,146 @@
+import time, queue, logging, threading
+
+from .metrics import WRITER_LOST
+
+
+class WriterBusy(Exception):
+    """Raised when the write-behind queue is full; the caller should retry later"""
+
+
+class _Ticket(object):
+    """Completion handle for callers that wait for their group to commit"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.error = None
+
+
+class GroupCommitWriter(object):
+    """Write-behind queue drained by a background thread in group commits.
+
+    ``submit`` only enqueues, so request threads never touch the disk. The
+    writer thread takes everything queued within ``max_delay`` seconds (up to
+    ``max_batch`` readings) and hands it to ``commit`` as one list, turning
+    many small appends into one write/transaction. ``durable=True`` callers
+    block until their group is committed and synced. A group whose commit
+    fails is retried up to ``retries`` times, ``retry_delay`` seconds apart;
+    after that its readings are counted as ``lost``.
+    """
+    def __init__(self, commit, sync=None, max_queue=10000, max_batch=500, max_delay=0.05,
+                 retries=2, retry_delay=0.5):
+        self.commit = commit
+        self.sync = sync
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.queue = queue.Queue(maxsize=max_queue)
+
+        self.committed = 0
+        self.batches = 0
+        self.failures = 0
+        self.rejected = 0
+        self.lost = 0
+
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="group-commit-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, readings, durable=False, timeout=30):
+        """Queue a list of readings; raises WriterBusy when the queue is full"""
+        if self._stopping:
+            raise WriterBusy("Writer is shutting down")
+        ticket = _Ticket() if durable else None
+        try:
+            self.queue.put_nowait((readings, ticket))
+        except queue.Full:
+            self.rejected += 1
+            raise WriterBusy("Write queue is full")
+        if ticket:
+            if not ticket.done.wait(timeout):
+                raise TimeoutError("Timed out waiting for group commit")
+            if ticket.error:
+                raise ticket.error
+        return readings
+
+    def depth(self):
+        return self.queue.qsize()
+
+    def _take_group(self):
+        """Block for the first entry, then gather more until size or delay limit"""
+        entries = [self.queue.get()]
+        count = len(entries[0][0]) if entries[0] is not None else 0
+        deadline = time.monotonic() + self.max_delay
+        while entries[-1] is not None and count < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            entries.append(entry)
+            if entry is not None:
+                count += len(entry[0])
+        return entries
+
+    def _run(self):
+        while True:
+            entries = self._take_group()
+            stop = entries[-1] is None
+            entries = [entry for entry in entries if entry is not None]
+            if entries:
+                self._commit_group(entries)
+            if stop:
+                return
+
+    def _commit_group(self, entries):
+        readings = [reading for batch, _ in entries for reading in batch]
+        tickets = [ticket for _, ticket in entries if ticket]
+        error = None
+        for attempt in range(self.retries + 1):
+            try:
+                self.commit(readings)
+                if tickets and self.sync:
+                    self.sync()
+                self.committed += len(readings)
+                self.batches += 1
+                error = None
+                break
+            except Exception as e:
+                self.failures += 1
+                error = e
+                logging.error(f"Group commit of {len(readings)} readings failed (attempt {attempt + 1}): {e}")
+                if attempt < self.retries:
+                    time.sleep(self.retry_delay)
+        if error is not None:
+            # Non-durable callers were already told the reading was accepted
+            self.lost += len(readings)
+            WRITER_LOST.inc(len(readings))
+        for ticket in tickets:
+            ticket.error = error
+            ticket.done.set()
+
+    def close(self, timeout=30):
+        """Stop accepting writes and flush everything still queued"""
+        if self._stopping:
+            return
+        self._stopping = True
+        deadline = time.monotonic() + timeout
+        try:
+            # The writer thread is still draining, so a full queue frees up unless it is stuck
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            logging.error(f"Write-behind queue still full after {timeout}s; not waiting for it to drain")
+            return
+        self._thread.join(max(0.0, deadline - time.monotonic()))
+        if self._thread.is_alive():
+            logging.error(f"Write-behind queue not drained on shutdown ({self.depth()} entries left)")
+
+    def stats(self):
+        return {
+            "queue_depth": self.depth(),
+            "queue_capacity": self.queue.maxsize,
+            "committed": self.committed,
+            "batches": self.batches,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "lost": self.lost,
+        }
@@ -0,0 +1,152 @@
+"""Ingest throughput of the app under gunicorn with 1, 2 and 4 worker processes.
+
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --workers 1 4 --clients 16 --duration 20 --durable
+
+Each run starts gunicorn (wsgi:app) on a fresh scratch data directory with
+no modem probing, then ``--clients`` processes POST /api/record over
+keep-alive connections for ``--duration`` seconds. After gunicorn exits the
+store is reopened and checked: every accepted reading is there, with unique,
+consecutive ids.
+"""
+import os, sys, json, time, socket, argparse, tempfile, subprocess, http.client
+import multiprocessing as mp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from run import reading
+
+GUNICORN_CONF = """\
+import sys
+sys.path.insert(0, {root!r})
+bind = "127.0.0.1:{port}"
+workers = {workers}
+worker_class = "gthread"
+threads = {threads}
+preload_app = False
+loglevel = "warning"
+
+def post_fork(server, worker):
+    import config
+    config.RETENTION_ENABLED = False
+    config.SAMPLER_ENABLED = False
+    config.MODEM_POOL_ENABLED = False
+    config.STORAGE_BACKEND = {backend!r}
+
+def post_worker_init(worker):
+    # No hardware probing: an empty port list still claims the primary role
+    from application import routes
+    from application.devices import DeviceManager
+    routes.devices = DeviceManager(routes.data_handler, [])
+"""
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def client(port, path, duration, start, results):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    headers = {"Content-Type": "application/json"}
+    start.wait()
+    deadline = time.monotonic() + duration
+    accepted = rejected = i = 0
+    while time.monotonic() < deadline:
+        try:
+            connection.request("POST", path, body=json.dumps(reading(i)), headers=headers)
+            response = connection.getresponse()
+            response.read()
+            if response.status == 201:
+                accepted += 1
+            else:
+                rejected += 1
+        except (OSError, http.client.HTTPException):
+            rejected += 1
+            connection.close()
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        i += 1
+    connection.close()
+    results.put((accepted, rejected))
+
+
+def check_store(workdir, backend):
+    """Reopen the store the workers wrote and check its ids"""
+    script = ("import config; config.RETENTION_ENABLED = False; config.FOLLOW_INTERVAL = 0\n"
+              f"config.STORAGE_BACKEND = {backend!r}\n"
+              "from application.logic import NetworkDataHandler\n"
+              "ids = sorted(r['id'] for r in NetworkDataHandler().store)\n"
+              "print(len(ids), len(set(ids)), ids == list(range(1, len(ids) + 1)))\n")
+    output = subprocess.run([sys.executable, "-c", script], cwd=workdir, capture_output=True, text=True,
+                            env=dict(os.environ, PYTHONPATH=ROOT), check=True).stdout.split()
+    return {"stored": int(output[0]), "unique": int(output[1]), "consecutive": output[2] == "True"}
+
+
+def run(workers, args):
+    workdir = tempfile.mkdtemp(prefix="load-")
+    port = free_port()
+    conf = os.path.join(workdir, "gunicorn.conf.py")
+    with open(conf, "w") as f:
+        f.write(GUNICORN_CONF.format(root=ROOT, port=port, workers=workers, threads=args.threads,
+                                     backend=args.backend))
+    server = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", conf, "wsgi:app"], cwd=workdir,
+                              env=dict(os.environ, PYTHONPATH=ROOT))
+    try:
+        if not wait_for(port):
+            raise RuntimeError("gunicorn did not start")
+        path = "/api/record?durable=1" if args.durable else "/api/record"
+        start, results = mp.Event(), mp.Queue()
+        clients = [mp.Process(target=client, args=(port, path, args.duration, start, results))
+                   for _ in range(args.clients)]
+        for process in clients:
+            process.start()
+        time.sleep(1)   # let every client connect
+        start.set()
+        totals = [results.get() for _ in clients]
+        for process in clients:
+            process.join()
+    finally:
+        server.terminate()  # graceful: workers flush their write-behind queues
+        server.wait(60)
+    accepted = sum(a for a, _ in totals)
+    result = {"workers": workers, "accepted": accepted, "rejected": sum(r for _, r in totals),
+              "req_per_s": round(accepted / args.duration, 1)}
+    result.update(check_store(workdir, args.backend))
+    result["ok"] = result["stored"] == result["unique"] == accepted and result["consecutive"]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure /api/record throughput across gunicorn workers")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="worker counts to compare")
+    parser.add_argument("--threads", type=int, default=8, help="threads per worker")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent client processes")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load per run")
+    parser.add_argument("--backend", default="log", choices=("log", "sqlite", "binary", "json"))
+    parser.add_argument("--durable", action="store_true", help="wait for each reading to be committed")
+    args = parser.parse_args()
+
+    failed = False
+    for workers in args.workers:
+        result = run(workers, args)
+        print(json.dumps(result), flush=True)
+        failed = failed or not result["ok"]
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
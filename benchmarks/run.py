@@ -0,0 +1,212 @@
+"""End-to-end performance benchmarks on the SIM800C simulator.
+
+    python benchmarks/run.py                                  # every suite
+    python benchmarks/run.py --suite at --suite pages --sizes 1000 10000
+    python benchmarks/run.py --compare benchmarks/results/20261017-120000.json
+
+Suites: ``at`` (AT round trips through SIM800C and SMSCommands), ``sampler``
+(readings per second), ``ingest`` (/api/record and /api/record/batch) and
+``pages`` (/, /live_data and /historical_data at growing dataset sizes).
+The app runs in a scratch data directory. Results are saved as JSON under
+benchmarks/results/; ``--compare`` flags metrics that got worse by more
+than ``--threshold`` and exits non-zero if any did.
+"""
+import os, sys, json, time, argparse, platform, tempfile, statistics, subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from simulator import SIM800CSimulator
+
+SUITES = ("at", "sampler", "ingest", "pages")
+
+
+def timings(fn, repeat):
+    values = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        values.append(time.perf_counter() - started)
+    return values
+
+
+def latency(values):
+    """Median / p95 in milliseconds"""
+    values = sorted(values)
+    return {"median_ms": round(statistics.median(values) * 1000, 3),
+            "p95_ms": round(values[min(len(values) - 1, int(len(values) * 0.95))] * 1000, 3)}
+
+
+def reading(i):
+    return {"operator": ("MTN", "Glo", "Airtel")[i % 3], "signal_strength": -50 - (i % 70),
+            "network_type": ("2G", "3G", "4G")[i % 3], "latitude": 6.5 + (i % 100) * 0.001,
+            "longitude": 3.3 + (i % 97) * 0.001}
+
+
+# -- suites --------------------------------------------------------------------
+
+def bench_at(args, app):
+    from application.logic import SIM800C, SMSCommands
+    from application.modem import close_connection, connection_for
+    results = {}
+    with SIM800CSimulator(latency=args.latency, baudrate=args.baudrate) as simulator:
+        modem = SIM800C(simulator.port)
+        modem.connect()
+        results["at.sim800c.csq"] = latency(timings(modem.get_signal_strength, args.repeat))
+        results["at.sim800c.four_queries"] = latency(timings(
+            lambda: (modem.get_signal_strength(), modem.get_operator(), modem.get_network_type(),
+                     modem.is_sim_inserted()), args.repeat))
+        results["at.sim800c.batched_query"] = latency(timings(
+            lambda: modem.query(("sim", "signal", "operator", "network_type")), args.repeat))
+        modem.close()
+    with SIM800CSimulator(latency=args.latency, baudrate=args.baudrate) as simulator:
+        connection_for(simulator.port)      # open the port (and let it settle) before timing
+        sms = SMSCommands(simulator.port)
+        results["at.sms.csq"] = latency(timings(sms.get_signal_info, args.repeat))
+        results["at.sms.ceng"] = latency(timings(sms.get_network_info, args.repeat))
+        close_connection(simulator.port)
+    return results
+
+
+def bench_sampler(args, app):
+    from application import routes
+    from application.logic import SIM800C
+    from application.sampler import Sampler
+    with SIM800CSimulator(latency=args.latency, baudrate=args.baudrate) as simulator:
+        modem = SIM800C(simulator.port)
+        modem.connect()
+        sampler = Sampler(modem, routes.data_handler, {"signal": 0.001, "operator": 0.001, "network_type": 0.001},
+                          jitter=0).start()
+        time.sleep(args.duration)
+        sampler.stop()
+        modem.close()
+    stats = sampler.stats()
+    return {"sampler.readings_per_s": {"value": round(stats["saved"] / args.duration, 2), "better": "higher"}}
+
+
+def bench_ingest(args, app):
+    client = app.test_client()
+    count = args.repeat * 10
+    started = time.perf_counter()
+    for i in range(count):
+        client.post("/api/record", json=reading(i))
+    single = count / (time.perf_counter() - started)
+
+    body = "\n".join(json.dumps(reading(i)) for i in range(args.batch)).encode()
+    started = time.perf_counter()
+    response = client.post("/api/record/batch", data=body, content_type="application/x-ndjson")
+    batch = args.batch / (time.perf_counter() - started)
+    assert response.status_code in (200, 201), response.status_code
+    return {"ingest.record_per_s": {"value": round(single, 1), "better": "higher"},
+            "ingest.batch_readings_per_s": {"value": round(batch, 1), "better": "higher"}}
+
+
+def bench_pages(args, app):
+    from application import routes
+    from application.devices import DeviceManager
+    client = app.test_client()
+    results = {}
+    with SIM800CSimulator(latency=args.latency, baudrate=args.baudrate) as simulator:
+        routes.devices = DeviceManager(routes.data_handler, [simulator.port]).start(sampling=False)
+        routes.devices.ready.wait(30)
+        handler = routes.data_handler
+        stored = handler.store.count()
+        for size in sorted(args.sizes):
+            while stored < size:
+                batch = [reading(stored + i) for i in range(min(5000, size - stored))]
+                handler.save_readings(batch)
+                stored += len(batch)
+            for path in ("/", "/live_data", "/historical_data"):
+                client.get(path)  # warm
+                results[f"pages.{path.strip('/') or 'home'}.{size}"] = latency(
+                    timings(lambda: client.get(path).data, args.repeat))
+        routes.devices.sim800c.close()
+    return results
+
+
+# -- results -------------------------------------------------------------------
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, previous, threshold):
+    """Print changes against an earlier run; returns the regressed metrics"""
+    regressions = []
+    for name, metric in sorted(results.items()):
+        before = previous.get("results", {}).get(name)
+        if not before:
+            continue
+        key = "value" if "value" in metric else "median_ms"
+        old, new = before.get(key), metric.get(key)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = change < -threshold if metric.get("better") == "higher" else change > threshold
+        print(f"{name:<40} {old:>12} -> {new:<12} {change * 100:+7.1f}%{'  REGRESSION' if worse else ''}")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the end-to-end benchmarks")
+    parser.add_argument("--suite", action="append", choices=SUITES, help="suite to run (repeatable; default all)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000], help="dataset sizes for pages")
+    parser.add_argument("--repeat", type=int, default=30, help="samples per latency metric")
+    parser.add_argument("--batch", type=int, default=5000, help="readings in the batch upload")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds to run the sampler")
+    parser.add_argument("--latency", type=float, default=0.01, help="simulated modem reply latency (s)")
+    parser.add_argument("--baudrate", type=int, default=115200, help="simulated serial line speed")
+    parser.add_argument("--output", help="results file (default benchmarks/results/<time>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative change that counts as regression")
+    args = parser.parse_args()
+
+    # The app keeps its data under ./data; run it in a scratch directory
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    os.chdir(workdir)
+    import config
+    config.RETENTION_ENABLED = False
+    config.SAMPLER_ENABLED = False
+    config.MODEM_POOL_ENABLED = False
+    from application import app, routes
+    from application.devices import DeviceManager
+    # No hardware probing outside the pages suite (which points it at a simulator)
+    routes.devices = DeviceManager(routes.data_handler, [])
+
+    results = {}
+    for suite in args.suite or SUITES:
+        print(f"-- {suite}", flush=True)
+        suite_results = globals()[f"bench_{suite}"](args, app)
+        for name, metric in sorted(suite_results.items()):
+            print(f"{name:<40} {metric}")
+        results.update(suite_results)
+
+    run = {
+        "meta": {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "commit": git_commit(),
+                 "python": platform.python_version(), "platform": platform.platform(),
+                 "args": {k: v for k, v in vars(args).items() if k not in ("output", "compare")}},
+        "results": results,
+    }
+    output = args.output or os.path.join(ROOT, "benchmarks", "results", time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(run, f, indent=2)
+    print(f"Saved {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s)")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""SIM800C simulator on a Linux pseudo-terminal.
+
+    python benchmarks/simulator.py --latency 0.05 --baudrate 9600
+    python benchmarks/simulator.py --error-rate 0.05 --drop-rate 0.01 --urc-rate 0.1
+
+Prints the pty path to point the app (or MODEM_POOL_PORTS) at, then answers
+AT commands until interrupted. Used by benchmarks/run.py.
+"""
+import os, pty, tty, time, random, select, argparse, threading
+
+
+class SIM800CSimulator(object):
+    """Answers the AT commands this project uses on the slave end of a pty.
+
+    ``latency`` is added before every reply (``latencies`` overrides it per
+    command, e.g. AT+CIPGSMLOC is slow on real modules) and output is paced
+    at ``baudrate`` (10 bits per byte; 0 disables pacing). Fault injection:
+    ``error_rate`` answers ERROR, ``drop_rate`` answers nothing,
+    ``garbage_rate`` prepends a line of noise, ``urc_rate`` emits an
+    unsolicited +CMTI before the reply, ``failing`` lists commands that
+    always answer ERROR (e.g. AT+CIPGSMLOC without a GPRS bearer) and
+    ``disconnect_after`` hangs up after that many commands. Concatenated commands (``AT+CSQ;+COPS?``)
+    stop at the first failing one like the real module.
+    """
+    def __init__(self, latency=0.0, latencies=None, baudrate=9600, error_rate=0.0, drop_rate=0.0,
+                 garbage_rate=0.0, urc_rate=0.0, failing=(), disconnect_after=None, operator="MTN NG",
+                 imei="861234567890123", seed=None):
+        self.latency = latency
+        self.latencies = {"AT+CIPGSMLOC": 2.0 * latency + 0.5, **(latencies or {})}
+        self.baudrate = baudrate
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.garbage_rate = garbage_rate
+        self.urc_rate = urc_rate
+        self.failing = {command.upper() for command in failing}
+        self.disconnect_after = disconnect_after
+        self.operator = operator
+        self.imei = imei
+        self.random = random.Random(seed)
+        self.csq = 20
+        self.echo = True
+        self.text_mode = False
+        self.messages = {
+            1: ("REC READ", "+2348030000001", "26/10/17,09:15:02+04", "Your data balance is 1.2GB"),
+            2: ("REC UNREAD", "+2348030000002", "26/10/17,10:01:44+04", "Recharge successful"),
+        }
+        self.commands = 0
+        self.master = None
+        self.slave = None
+        self.port = None
+        self._stop = threading.Event()
+        self._write_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self._thread = threading.Thread(target=self._run, name="sim800c-simulator", daemon=True)
+        self._thread.start()
+        return self.port
+
+    def stop(self):
+        self._stop.set()
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except (OSError, TypeError):
+                pass
+        self.master = self.slave = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # -- I/O -----------------------------------------------------------------
+
+    def _write(self, text):
+        data = text.encode()
+        with self._write_lock:
+            if self.baudrate:
+                time.sleep(len(data) * 10 / self.baudrate)
+            os.write(self.master, data)
+
+    def _run(self):
+        buffer = b""
+        while not self._stop.is_set():
+            try:
+                ready, _, _ = select.select([self.master], [], [], 0.2)
+                if not ready:
+                    continue
+                buffer += os.read(self.master, 1024)
+            except (OSError, TypeError, ValueError):
+                return
+            while b"\r" in buffer:
+                line, buffer = buffer.split(b"\r", 1)
+                buffer = buffer.lstrip(b"\n")
+                command = line.decode(errors="replace").strip()
+                if command:
+                    try:
+                        self._answer(command)
+                    except (OSError, TypeError):
+                        return
+                if self.disconnect_after and self.commands >= self.disconnect_after:
+                    self.stop()
+                    return
+
+    def _answer(self, command):
+        self.commands += 1
+        base = command.split(";")[0].split("=")[0].split("?")[0].upper()
+        time.sleep(self.latencies.get(base, self.latency))
+        if self.echo:
+            self._write(command + "\r\n")
+        if self.random.random() < self.drop_rate:
+            return
+        if self.random.random() < self.garbage_rate:
+            self._write("\r\n\x00#~garbage~#\r\n")
+        if self.random.random() < self.urc_rate:
+            self._write(f"\r\n+CMTI: \"SM\",{self.random.randint(1, 30)}\r\n")
+        if self.random.random() < self.error_rate:
+            self._write("\r\nERROR\r\n")
+            return
+
+        parts = command.split(";")
+        parts = [parts[0]] + ["AT" + part for part in parts[1:]]
+        lines, final = [], "OK"
+        for part in parts:
+            reply = self._reply(part)
+            if reply is None:
+                final = "ERROR"
+                break
+            if isinstance(reply, str) and reply.startswith("+CME ERROR"):
+                final = reply
+                break
+            lines.extend(reply)
+        self._write("".join(f"\r\n{line}\r\n" for line in lines) + f"\r\n{final}\r\n")
+
+    # -- commands ------------------------------------------------------------
+
+    def _reply(self, command):
+        """Information lines for one command, None for ERROR"""
+        upper = command.upper()
+        if upper.split("=")[0].split("?")[0] in self.failing:
+            return None
+        if upper in ("AT", "ATE1", "ATE0"):
+            if upper != "AT":
+                self.echo = upper == "ATE1"
+            return []
+        if upper == "ATI":
+            return ["SIM800 R14.18"]
+        if upper == "AT+GSN":
+            return [self.imei]
+        if upper == "AT+CCID":
+            return ["89234010000000000001"]
+        if upper == "AT+CPIN?":
+            return ["+CPIN: READY"]
+        if upper == "AT+CSQ":
+            self.csq = max(0, min(31, self.csq + self.random.choice((-1, 0, 0, 1))))
+            return [f"+CSQ: {self.csq},0"]
+        if upper == "AT+COPS?":
+            return [f'+COPS: 0,0,"{self.operator}"']
+        if upper == "AT+CREG?":
+            return ["+CREG: 0,1"]
+        if upper == "AT+CGREG?":
+            return ["+CGREG: 0,1"]
+        if upper == "AT+CPAS":
+            return ["+CPAS: 0"]
+        if upper == "AT+CCLK?":
+            return [time.strftime('+CCLK: "%y/%m/%d,%H:%M:%S+04"')]
+        if upper.startswith("AT+CIPGSMLOC"):
+            latitude = 6.5244 + self.random.uniform(-0.01, 0.01)
+            longitude = 3.3792 + self.random.uniform(-0.01, 0.01)
+            return [f"+CIPGSMLOC: 0,{latitude:.6f},{longitude:.6f},{time.strftime('%Y/%m/%d,%H:%M:%S')}"]
+        if upper.startswith("AT+CENG="):
+            return []
+        if upper == "AT+CENG?":
+            return ['+CENG: 3,0',
+                    f'+CENG: 0,"0621,{self.csq * 2},00,621,30,36,1234,00,05,abcd,255"',
+                    '+CENG: 1,"0055,29,33,621,30,1235"',
+                    '+CENG: 2,"0062,21,12,621,30,1236"']
+        if upper.startswith("AT+CMGF="):
+            self.text_mode = upper.endswith("1")
+            return []
+        if upper.startswith("AT+CNMI="):
+            return []
+        if upper.startswith("AT+CMGL"):
+            lines = []
+            for index, (status, sender, date, text) in sorted(self.messages.items()):
+                lines += [f'+CMGL: {index},"{status}","{sender}","","{date}"', text]
+            return lines
+        if upper.startswith("AT+CMGR="):
+            message = self.messages.get(int(upper.split("=")[1] or 0))
+            if message is None:
+                return "+CME ERROR: 321"
+            status, sender, date, text = message
+            return [f'+CMGR: "{status}","{sender}","","{date}"', text]
+        if upper.startswith("AT+CMGD="):
+            self.messages.pop(int(upper.split("=")[1].split(",")[0] or 0), None)
+            return []
+        return None
+
+    def receive_sms(self, sender, text):
+        """Store an incoming message and announce it with +CMTI"""
+        index = max(self.messages, default=0) + 1
+        self.messages[index] = ("REC UNREAD", sender, time.strftime("%y/%m/%d,%H:%M:%S+04"), text)
+        self._write(f'\r\n+CMTI: "SM",{index}\r\n')
+        return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SIM800C simulator on a pseudo-terminal")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds before each reply")
+    parser.add_argument("--baudrate", type=int, default=9600, help="output pacing (0 = unpaced)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--garbage-rate", type=float, default=0.0)
+    parser.add_argument("--urc-rate", type=float, default=0.0)
+    parser.add_argument("--fail", action="append", default=[], metavar="COMMAND",
+                        help="answer ERROR to this command (e.g. AT+CIPGSMLOC), repeatable")
+    parser.add_argument("--disconnect-after", type=int)
+    parser.add_argument("--operator", default="MTN NG")
+    args = parser.parse_args()
+
+    simulator = SIM800CSimulator(latency=args.latency, baudrate=args.baudrate, error_rate=args.error_rate,
+                                 drop_rate=args.drop_rate, garbage_rate=args.garbage_rate,
+                                 urc_rate=args.urc_rate, failing=args.fail, disconnect_after=args.disconnect_after,
+                                 operator=args.operator)
+    print(simulator.start(), flush=True)
+    try:
+        while simulator.master is not None:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Startup benchmark: time from process start to the first served request.
+
+    python benchmarks/startup.py              # 5 cold starts in a scratch data dir
+    python benchmarks/startup.py --runs 10 --path /api/readings
+
+Each run starts a fresh interpreter, imports the app and serves one request
+through Flask's test client, so it measures what every worker boot (and
+every test that imports the app) pays.
+"""
+import os, sys, json, time, argparse, tempfile, statistics, subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import time, json
+started = time.perf_counter()
+from application import app
+imported = time.perf_counter()
+response = app.test_client().get({path!r})
+served = time.perf_counter()
+print(json.dumps({{"import": imported - started, "first_request": served - imported, "status": response.status_code}}))
+"""
+
+
+def run_once(path, workdir):
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", CHILD.format(path=path)], cwd=workdir, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    total = time.perf_counter() - started
+    result = json.loads(output.strip().splitlines()[-1])
+    result["total"] = total
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure time to first request")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/", help="URL of the first request")
+    parser.add_argument("--workdir", help="directory holding data/ (default: a fresh temporary one)")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="startup-bench-")
+    results = [run_once(args.path, workdir) for _ in range(args.runs)]
+    for name in ("import", "first_request", "total"):
+        values = [r[name] for r in results]
+        print(f"{name:>14}: median {statistics.median(values) * 1000:8.1f} ms   "
+              f"min {min(values) * 1000:8.1f} ms   max {max(values) * 1000:8.1f} ms")
+    print(f"{'status':>14}: {sorted({r['status'] for r in results})}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,110 @@
 import os
 
 HOST="0.0.0.0"
-PORT=5801
\ No newline at end of file
+PORT=5801
+DEBUG = False                      # Flask debugger/reloader for main.py (never in production)
+
+# Production serving (gunicorn -c gunicorn.conf.py wsgi:app). Workers share the
+# data directory; the first to claim PRIMARY_LOCK_FILE owns the modem and runs
+# retention, the others show its status from STATUS_FILE and take over if it exits
+WORKERS = 4
+WORKER_THREADS = 8                 # threads per worker (live streams hold one each)
+PRIMARY_LOCK_FILE = "data/primary.lock"
+PRIMARY_RETRY_INTERVAL = 30        # seconds between takeover attempts by other workers
+STATUS_FILE = "data/modem_status.json"
+FOLLOW_INTERVAL = 1.0              # seconds between checks for readings saved by other processes (0 = off)
+
+# Readings storage
+#   "log"    - append-only segment log under data/network_readings/ (default)
+#   "sqlite" - SQLite database at SQLITE_PATH (readings and operators)
+#   "binary" - fixed-width binary records at BINARY_PATH, read through mmap
+#   "json"   - legacy single JSON array file, rewritten on every save
+STORAGE_BACKEND = "log"
+# fsync policy for the segment log: "always", "interval" or "never"
+LOG_FSYNC = "interval"
+LOG_FSYNC_INTERVAL = 1.0           # seconds between fsyncs with "interval"
+LOG_SEGMENT_BYTES = 8 * 1024 * 1024
+LOG_CHECKPOINT_EVERY = 100         # appends between side-index checkpoints
+SQLITE_PATH = "data/network.db"
+SQLITE_SYNCHRONOUS = "NORMAL"      # "FULL" fsyncs every commit even in WAL mode
+BINARY_PATH = "data/network_readings.bin"
+
+# Rows per append/transaction for /api/record/batch
+BATCH_COMMIT_SIZE = 1000
+
+# Write-behind: queue readings and commit them in groups from a background thread
+WRITE_BEHIND = False
+WRITE_BEHIND_QUEUE = 10000         # queued readings before /api/record answers 429
+WRITE_BEHIND_BATCH = 500           # max readings per group commit
+WRITE_BEHIND_MAX_DELAY = 0.05      # seconds to wait for a group to fill
+WRITE_BEHIND_RETRIES = 2           # retries of a failed group commit before its readings are lost
+
+# Pre-aggregated minute/hour/day statistics
+ROLLUPS_FILE = "data/rollups.json"
+ROLLUP_RETENTION = {"minute": 2 * 86400, "hour": 90 * 86400, "day": None}   # seconds, None = forever
+ROLLUP_SAVE_INTERVAL = 60          # seconds between rollup checkpoints
+
+# Coverage grid (per-cell signal aggregates for /api/coverage)
+COVERAGE_FILE = "data/coverage.json"
+COVERAGE_MAX_CELLS = 10000         # cells per query before falling back to a coarser grid
+COVERAGE_SAVE_INTERVAL = 60        # seconds between coverage checkpoints
+
+# Degradation / outage detection per operator and device (/api/incidents)
+INCIDENTS_FILE = "data/incidents.json"
+INCIDENT_FAST_ALPHA = 0.3          # EWMA weight of a new reading in the current signal level
+INCIDENT_BASELINE_ALPHA = 0.02     # EWMA weight in the long-run baseline (frozen while degraded)
+INCIDENT_WARMUP = 10               # readings before the baseline is trusted
+INCIDENT_DROP_DB = 15              # current level this far below the baseline opens a degradation
+INCIDENT_FLOOR_DBM = -105          # as does a current level at or below this
+INCIDENT_HYSTERESIS_DB = 3         # recovery margin, so incidents do not flap
+INCIDENT_OUTAGE_AFTER = 3          # consecutive unavailable readings that open an outage
+INCIDENT_RETENTION_DAYS = 365      # closed incidents kept this long
+INCIDENT_SAVE_INTERVAL = 60        # seconds between incident checkpoints
+
+# /historical_data and /api/readings pagination
+HISTORY_PAGE_SIZE = 200
+HISTORY_MAX_PAGE_SIZE = 5000
+
+# Retention: readings older than COMPACT_AFTER_DAYS move to compressed, per-day
+# cold segments; raw readings older than RAW_RETENTION_DAYS are deleted
+# (rollups are kept)
+RETENTION_ENABLED = True
+RETENTION_INTERVAL = 3600          # seconds between compaction runs
+COMPACT_AFTER_DAYS = 14
+RAW_RETENTION_DAYS = 365
+COLD_DIRECTORY = "data/cold"
+COLD_CODEC = "gzip"                # "zstd" if the zstandard package is installed
+
+# Background sampler: AT queries per metric on their own intervals (seconds,
+# 0 disables a metric); each "signal" sample is saved as a reading
+SAMPLER_ENABLED = False
+SAMPLER_PORT = None                # None = the port found by routes.py probing
+SAMPLER_INTERVALS = {"signal": 10, "operator": 60, "network_type": 60, "location": 600}
+SAMPLER_JITTER = 0.1               # up to this fraction of the interval added at random
+
+# Modem pool: one sampler per detected SIM800C (replaces the single sampler)
+MODEM_POOL_ENABLED = False
+MODEM_POOL_PORTS = None            # None = discover /dev/ttyUSB* devices
+MODEM_POOL_SCAN_INTERVAL = 10      # seconds between hot-plug scans
+
+# Incoming SMS: the module announces each one (+CMTI) and it is read with AT+CMGR
+SMS_ENABLED = True
+SMS_FILE = "data/sms.jsonl"
+SMS_DELETE_AFTER_SAVE = False      # delete messages from the SIM once saved, keeping its inbox small
+
+# Home page module status snapshot
+STATUS_TTL = 30                    # seconds before the snapshot is refreshed
+STATUS_MAX_AGE = 300               # full refresh (SIM state) at least this often
+
+# Live readings pushed to /live_data over Server-Sent Events (/api/live/stream)
+LIVE_QUEUE_SIZE = 100              # events buffered per client; the oldest are dropped beyond this
+LIVE_MAX_SUBSCRIBERS = 100         # concurrent stream clients before answering 503
+LIVE_KEEPALIVE = 15                # seconds between keep-alive comments on an idle stream
+
+# Prometheus /metrics (request, storage and AT command latencies, queue depths)
+METRICS_ENABLED = True
+
+# In-process readings cache
+CACHE_MAX_BYTES = 32 * 1024 * 1024
+CACHE_BUCKET_SECONDS = 3600        # width of one cached time window
+CACHE_PINNED_BUCKETS = 2           # newest windows that are never evicted
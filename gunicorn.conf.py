@@ -0,0 +1,12 @@
+"""gunicorn settings for wsgi.py (see the WORKERS settings in config.py)"""
+from config import HOST, PORT, WORKERS, WORKER_THREADS   # not `import config`: gunicorn has a setting by that name
+
+bind = f"{HOST}:{PORT}"
+workers = WORKERS
+# Threads let one worker hold live streams (/api/live/stream) while serving pages
+worker_class = "gthread"
+threads = WORKER_THREADS
+# Each worker must open the store and claim the modem after forking, so the
+# app is not preloaded in the master
+preload_app = False
+timeout = 60
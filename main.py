@@ -3,5 +3,5 @@ import config
 from application import app
 
 if __name__ == '__main__':
-    #DEBUG is SET to TRUE. CHANGE FOR PROD
-    app.run(host=config.HOST,port=config.PORT,debug=True)
\ No newline at end of file
+    # Development server; for production use: gunicorn -c gunicorn.conf.py wsgi:app
+    app.run(host=config.HOST,port=config.PORT,debug=config.DEBUG,threaded=True)
\ No newline at end of file
@@ -0,0 +1,43 @@
+"""Bulk-copy readings and operators from the file stores into SQLite.
+
+    python migrate.py                      # auto-detect the source store
+    python migrate.py --from json --db data/network.db
+
+Set STORAGE_BACKEND = "sqlite" in config.py afterwards.
+"""
+import os, argparse, logging
+import config
+from application.storage import JsonArrayStore, SegmentLogStore, SQLiteStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate network readings into SQLite")
+    parser.add_argument("--from", dest="source", choices=("json", "log"),
+                        help="source store (default: log if data/network_readings/ exists, else json)")
+    parser.add_argument("--readings", default="data/network_readings.json", help="legacy readings file")
+    parser.add_argument("--operators", default="data/network_operators.json", help="operators file")
+    parser.add_argument("--db", default=config.SQLITE_PATH, help="target SQLite database")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--force", action="store_true", help="import even if the database has readings")
+    args = parser.parse_args()
+
+    log_directory = os.path.splitext(args.readings)[0]
+    source = args.source or ("log" if os.path.isdir(log_directory) else "json")
+    if source == "log":
+        store = SegmentLogStore(log_directory, legacy_file=args.readings)
+    else:
+        store = JsonArrayStore(args.readings)
+
+    target = SQLiteStore(args.db, synchronous=config.SQLITE_SYNCHRONOUS, operators_file=args.operators)
+    if target.count() and not args.force:
+        parser.error(f"{args.db} already has {target.count()} readings; use --force to import anyway")
+
+    imported = target.import_readings(iter(store), batch_size=args.batch_size)
+    logging.info(f"Imported {imported} readings and {len(target.get_operators())} operators into {args.db}")
+    store.close()
+    target.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    main()
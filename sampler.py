@@ -0,0 +1,52 @@
+"""Run the background sampler in the foreground, without the web UI.
+
+    python sampler.py                       # port found by the app's probing
+    python sampler.py --port /dev/ttyUSB0 --signal 5 --location 900
+
+Readings are saved through the same NetworkDataHandler as the web app.
+"""
+import time, argparse, logging
+import config
+from application import routes
+from application.logic import SIM800C
+from application.sampler import Sampler, METRICS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sample SIM800C network readings on a schedule")
+    parser.add_argument("--port", default=config.SAMPLER_PORT, help="serial port of the SIM800C module")
+    parser.add_argument("--jitter", type=float, default=config.SAMPLER_JITTER)
+    for name in METRICS:
+        parser.add_argument(f"--{name.replace('_', '-')}", dest=name, type=float,
+                            default=config.SAMPLER_INTERVALS.get(name, 0),
+                            help=f"seconds between {name} samples (0 disables)")
+    parser.add_argument("--stats-every", type=float, default=60, help="seconds between stats log lines")
+    args = parser.parse_args()
+
+    if args.port:
+        modem = SIM800C(port=args.port, baudrate=9600)
+    else:
+        devices = routes.devices.start(sampling=False)
+        devices.ready.wait()
+        if devices.state == "secondary":
+            parser.error("the SIM800C module is owned by another process (is the web app running?)")
+        modem = devices.sim800c
+    if modem is None or not modem.connect():
+        parser.error("SIM800C module not connected")
+
+    sampler = Sampler(modem, routes.data_handler, {name: getattr(args, name) for name in METRICS},
+                      jitter=args.jitter).start()
+    try:
+        while sampler.running:
+            time.sleep(args.stats_every)
+            logging.info(f"Sampler: {sampler.stats()}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sampler.stop()
+        routes.data_handler.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    main()
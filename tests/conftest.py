@@ -0,0 +1,60 @@
+import os, sys, atexit, shutil, tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+# Importing the application package builds the data handler on the relative
+# paths in config.py, so the suite runs in a scratch directory with the
+# background workers off
+SCRATCH = tempfile.mkdtemp(prefix="network-tests-")
+os.makedirs(os.path.join(SCRATCH, "data"))
+shutil.copy(os.path.join(ROOT, "data", "network_operators.json"), os.path.join(SCRATCH, "data"))
+os.chdir(SCRATCH)
+
+import config
+config.RETENTION_ENABLED = False
+config.SAMPLER_ENABLED = False
+config.MODEM_POOL_ENABLED = False
+
+
+@pytest.fixture(scope="session")
+def client():
+    """Test client of the app, with device discovery pointed at no ports"""
+    from application import routes
+    from application.devices import DeviceManager
+    routes.devices = DeviceManager(routes.data_handler, [])
+    return routes.app.test_client()
+
+
+@pytest.fixture
+def open_handler(tmp_path, monkeypatch):
+    """Opens NetworkDataHandlers on one scratch data directory; closes them afterwards"""
+    from application.logic import NetworkDataHandler
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data")
+    shutil.copy(os.path.join(ROOT, "data", "network_operators.json"), "data")
+    opened = []
+
+    def open_handler(**options):
+        handler = NetworkDataHandler(**options)
+        atexit.unregister(handler.close)
+        opened.append(handler)
+        return handler
+    yield open_handler
+    for handler in opened:
+        handler.close()
+
+
+def pytest_unconfigure(config):
+    routes = sys.modules.get("application.routes")
+    if routes is not None:
+        # Close the app's handler now, inside the scratch directory, not at exit
+        cwd = os.getcwd()
+        os.chdir(SCRATCH)
+        atexit.unregister(routes.data_handler.close)
+        routes.data_handler.close()
+        os.chdir(cwd)
+    shutil.rmtree(SCRATCH, ignore_errors=True)
@@ -0,0 +1,104 @@
+import math, random
+
+import pytest
+
+from application import analytics
+from application.analytics import ReadingColumns, compute_stats
+
+START = 1_790_000_000
+
+
+def readings(count=3000, seed=3):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        row = {"id": i + 1, "epoch": START + rng.uniform(0, 86400), "operator": rng.choice(["MTN", "Glo", "Airtel"]),
+               "network_type": rng.choice(["2G", "4G"]), "signal_strength": rng.randint(-120, -50),
+               "availability": rng.random() > 0.2}
+        if i % 50 == 0:
+            row["signal_strength"] = "Unknown"
+        rows.append(row)
+    return rows
+
+
+def quality(dbm):
+    return min(100, max(0, int((dbm + 120) / 70 * 100)))
+
+
+def reference(rows):
+    """The summary compute_stats should give for ``rows``, in plain Python"""
+    values = sorted(row["signal_strength"] for row in rows if isinstance(row["signal_strength"], int))
+    up = sum(row["availability"] for row in rows)
+    summary = {"count": len(rows), "availability": round(up / len(rows), 4), "unavailable": len(rows) - up,
+               "mean_dbm": round(sum(values) / len(values), 2) if values else None}
+    for q in (5, 50, 95):
+        summary[f"p{q}_dbm"] = float(values[max(1, math.ceil(q / 100 * len(values))) - 1]) if values else None
+    summary["mean_quality"] = round(sum(quality(v) for v in values) / len(values), 2) if values else None
+    return summary
+
+
+def grouped(rows, *keys):
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(row[key] for key in keys), []).append(row)
+    return groups
+
+
+@pytest.fixture
+def columns():
+    columns = ReadingColumns()
+    columns.extend(readings())      # out of time order: sorted on first query
+    return columns
+
+
+def test_stats_match_a_python_reference(columns):
+    rows = readings()
+    result = compute_stats(columns)
+    assert result["overall"] == reference(rows)
+    assert result["by_operator"] == {key[0]: reference(group) for key, group in grouped(rows, "operator").items()}
+    assert result["by_network_type"] == {key[0]: reference(group)
+                                         for key, group in grouped(rows, "network_type").items()}
+    pairs = {(row["operator"], row["network_type"]): {k: v for k, v in row.items()
+                                                      if k not in ("operator", "network_type")}
+             for row in result["by_operator_type"]}
+    assert pairs == {key: reference(group) for key, group in grouped(rows, "operator", "network_type").items()}
+    histogram = [0] * 10
+    for row in rows:
+        if isinstance(row["signal_strength"], int):
+            histogram[min(quality(row["signal_strength"]) // 10, 9)] += 1
+    assert [bucket["count"] for bucket in result["quality_histogram"]] == histogram
+
+
+def test_time_range_and_filters(columns):
+    rows = readings()
+    start, end = START + 3600, START + 7200
+    expected = [row for row in rows if start <= row["epoch"] < end and row["operator"] == "Glo"
+                and row["network_type"] == "4G"]
+    result = compute_stats(columns, start, end, operator="Glo", network_type="4G")
+    assert result["overall"] == reference(expected)
+    assert list(result["by_operator"]) == ["Glo"]
+    assert compute_stats(columns, operator="Nobody")["overall"]["count"] == 0
+    assert compute_stats(columns, START - 10, START - 5)["overall"]["availability"] is None
+
+
+def test_drop_before_forgets_old_rows(columns):
+    columns.drop_before(START + 43200)
+    expected = [row for row in readings() if row["epoch"] >= START + 43200]
+    assert len(columns) == len(expected)
+    assert compute_stats(columns)["overall"] == reference(expected)
+
+
+def test_stats_route(client):
+    response = client.get("/api/stats?days=1")
+    assert response.status_code == 200
+    assert {"overall", "by_operator", "by_network_type", "quality_histogram"} <= set(response.get_json())
+
+
+def test_stats_route_without_numpy(client, monkeypatch):
+    monkeypatch.setattr(analytics, "np", None)
+    monkeypatch.setattr(analytics, "_numpy_missing", True)
+    response = client.get("/api/stats")
+    assert response.status_code == 503
+    assert response.get_json()["message"] == "NumPy is not installed"
+    with pytest.raises(RuntimeError):
+        compute_stats(ReadingColumns())
@@ -0,0 +1,96 @@
+import time
+
+import pytest
+
+from application.cache import ReadingCache
+from application.storage import SegmentLogStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SegmentLogStore(str(tmp_path / "readings"), fsync="never")
+    now = time.time()
+    store.append_many([{"operator": ("MTN", "Glo")[i % 2], "signal_strength": -70, "epoch": now - 3000 + i * 10}
+                       for i in range(300)])
+    yield store
+    store.close()
+
+
+def test_range_matches_store_scan(store):
+    cache = ReadingCache(store, bucket_seconds=600)
+    now = time.time()
+    for start, end, operator in [(None, None, None), (now - 2000, now - 1000, None), (now - 2000, None, "Glo"),
+                                 (now - 1234.5, now - 1234.4, None), (now + 10, None, None)]:
+        expected = [r["id"] for r in store.scan(start, end, operator)]
+        assert [r["id"] for r in cache.range(start, end, operator)] == expected
+    assert cache.latest()["id"] == 300
+
+
+def test_second_lookup_is_served_from_memory(store):
+    cache = ReadingCache(store, bucket_seconds=600)
+    cache.range(time.time() - 1200)
+    misses = cache.stats()["misses"]
+    cache.range(time.time() - 1200)
+    stats = cache.stats()
+    assert stats["misses"] == misses and stats["hits"] > 0
+
+
+def test_own_appends_update_cached_buckets(store):
+    cache = ReadingCache(store, bucket_seconds=600)
+    start = time.time() - 1200
+    cache.range(start)
+    reading = store.append({"operator": "MTN", "signal_strength": -80, "epoch": time.time() - 5})
+    cache.on_append([reading])
+    misses = cache.stats()["misses"]
+    assert cache.range(start)[-1]["id"] == 301
+    assert cache.latest()["id"] == 301
+    assert cache.stats()["misses"] == misses
+
+
+def test_store_changed_elsewhere_invalidates_the_cache(store):
+    cache = ReadingCache(store, bucket_seconds=600)
+    start = time.time() - 1200
+    cache.range(start)
+    cache.latest()
+    store.append({"operator": "MTN", "signal_strength": -80, "epoch": time.time() - 5})
+    assert cache.range(start)[-1]["id"] == 301
+    assert cache.latest()["id"] == 301
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_eviction_keeps_the_newest_buckets(store):
+    cache = ReadingCache(store, max_bytes=1, bucket_seconds=600, pinned_buckets=2)
+    cache.range()
+    stats = cache.stats()
+    assert stats["evictions"] > 0 and stats["buckets"] == 2
+    assert set(cache.buckets) == {cache._bucket_of(store.bounds()[1]) - 1, cache._bucket_of(store.bounds()[1])}
+    assert [r["id"] for r in cache.range()] == list(range(1, 301))
+
+
+def pages(fetch, limit):
+    cursor, rows = None, []
+    while True:
+        page = fetch(cursor, limit + 1)
+        rows.extend(page[:limit])
+        if len(page) <= limit:
+            return rows
+        cursor = (page[limit - 1]["epoch"], page[limit - 1]["id"])
+
+
+def test_page_matches_store_scan(store):
+    cache = ReadingCache(store, bucket_seconds=600)
+    start = time.time() - 3600
+    assert cache.page(start) is None        # nothing cached yet: caller reads the store
+    cache.range(start)
+    for operator in (None, "Glo"):
+        expected = [r["id"] for r in store.scan(start, None, operator)]
+        rows = pages(lambda cursor, limit: cache.page(start, None, operator, after=cursor, limit=limit), 7)
+        assert [r["id"] for r in rows] == expected
+
+
+def test_page_falls_back_when_a_bucket_is_missing(store):
+    cache = ReadingCache(store, bucket_seconds=600)
+    now = time.time()
+    cache.range(now - 1200)
+    assert cache.page(now - 1200, limit=5) is not None
+    assert cache.page(now - 3600, limit=5) is None
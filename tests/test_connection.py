@@ -0,0 +1,92 @@
+import time
+
+import pytest
+import serial
+
+from application.modem import ModemConnection, connection_for, close_connection
+from simulator import SIM800CSimulator
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def simulator():
+    simulator = SIM800CSimulator(latency=0, baudrate=0, seed=1, disconnect_after=2)
+    simulator.start()
+    yield simulator
+    simulator.stop()
+
+
+def test_hang_up_schedules_reconnect_and_fails_fast(simulator):
+    connection = ModemConnection(simulator.port, settle=0, backoff=0.2, max_backoff=0.8)
+    try:
+        assert connection.open() and connection.command("AT").ok
+        connection.command("AT+CSQ")
+        assert wait_for(lambda: connection.state == "reconnecting")
+        health = connection.health()
+        assert health["failures"] >= 1 and health["connected_since"] is None
+        assert health["next_retry_in"] is not None and health["next_retry_in"] <= 0.8
+        started = time.monotonic()
+        with pytest.raises(serial.SerialException):
+            connection.command("AT", timeout=5)
+        assert time.monotonic() - started < 0.5
+    finally:
+        connection.close()
+
+
+def test_backoff_doubles_up_to_max_backoff():
+    connection = ModemConnection("/dev/nonexistent-sim800c", settle=0, backoff=0.2, max_backoff=0.4)
+    try:
+        assert not connection.open()
+        assert connection.state == "reconnecting" and connection.failures == 1
+        assert 0 < connection.health()["next_retry_in"] <= 0.2
+        # Retries after 0.2, 0.4, 0.4... seconds
+        assert wait_for(lambda: connection.failures >= 4, timeout=3)
+        assert connection.health()["next_retry_in"] <= 0.4
+        assert connection.reconnects == 0 and "nonexistent" in connection.last_error
+    finally:
+        connection.close()
+    assert connection.state == "closed" and not connection.open()
+
+
+def test_reconnect_restores_commands_and_listeners(simulator):
+    connection = ModemConnection(simulator.port, settle=0, backoff=0.1, max_backoff=0.1)
+    received = []
+    try:
+        assert connection.open()
+        connection.add_listener(received.append, "+CMTI:")
+        connection.command("AT")
+        connection.command("AT")
+        assert wait_for(lambda: connection.state == "reconnecting")
+        # The module comes back (re-enumerated on another pty)
+        with SIM800CSimulator(latency=0, baudrate=0, seed=1) as replacement:
+            connection.port = replacement.port
+            assert wait_for(lambda: connection.connected)
+            assert connection.reconnects == 1 and connection.failures == 0
+            assert connection.command("AT+CSQ").line("+CSQ:").startswith("+CSQ: ")
+            replacement.receive_sms("+2348030000003", "hello")
+            assert wait_for(lambda: received)
+            assert received[0].startswith('+CMTI: "SM"')
+    finally:
+        connection.close()
+
+
+def test_modem_health_route(client):
+    with SIM800CSimulator(latency=0, baudrate=0, seed=1) as simulator:
+        connection = connection_for(simulator.port, settle=0)
+        try:
+            health = {entry["port"]: entry for entry in client.get("/api/modem/health").get_json()}
+            assert health[simulator.port]["state"] == "connected"
+            assert health[simulator.port]["failures"] == 0
+        finally:
+            close_connection(simulator.port)
+    assert connection.state == "closed"
+    ports = [entry["port"] for entry in client.get("/api/modem/health").get_json()]
+    assert simulator.port not in ports
@@ -0,0 +1,102 @@
+import random
+
+import pytest
+
+from application.coverage import CoverageIndex, GRIDS
+
+
+def quality(dbm):
+    return max(0, min(100, int((dbm + 120) / 70 * 100)))
+
+
+def readings(count=2000, seed=11):
+    """Readings scattered around 0°N 0°E, so cells on all four sides of both zero lines"""
+    rng = random.Random(seed)
+    return [{"id": i + 1, "epoch": 1_790_000_000 + i, "operator": rng.choice(["MTN", "Glo"]),
+             "latitude": rng.uniform(-0.05, 0.05), "longitude": rng.uniform(-0.05, 0.05),
+             "signal_strength": rng.randint(-110, -60), "availability": rng.random() > 0.1}
+            for i in range(count)]
+
+
+@pytest.fixture
+def coverage(tmp_path):
+    coverage = CoverageIndex(str(tmp_path / "coverage.json"), quality)
+    coverage.add_many(readings())
+    return coverage
+
+
+def inside(row, reading):
+    min_lat, min_lon, max_lat, max_lon = row["bbox"]
+    return (row["operator"] == reading["operator"] and min_lat <= reading["latitude"] < max_lat
+            and min_lon <= reading["longitude"] < max_lon)
+
+
+@pytest.mark.parametrize("resolution", sorted(GRIDS))
+def test_cells_hold_the_readings_inside_them(coverage, resolution):
+    rows = coverage.query(-0.05, -0.05, 0.05, 0.05, resolution=resolution)
+    assert sum(row["count"] for row in rows) == 2000
+    for row in rows:
+        members = [reading for reading in readings() if inside(row, reading)]
+        values = [reading["signal_strength"] for reading in members]
+        assert row["count"] == len(members)
+        assert (row["min_dbm"], row["max_dbm"]) == (min(values), max(values))
+        assert row["avg_dbm"] == round(sum(values) / len(values), 1)
+        assert row["availability"] == round(sum(r["availability"] for r in members) / len(members), 4)
+
+
+def test_negative_coordinates_land_in_the_right_cell(tmp_path):
+    coverage = CoverageIndex(str(tmp_path / "coverage.json"), quality)
+    points = {"Cape Town": (-33.9249, 18.4241), "Rio": (-22.9068, -43.1729), "Lagos": (6.5244, 3.3792)}
+    coverage.add_many([{"id": i, "operator": name, "latitude": lat, "longitude": lon, "signal_strength": -70}
+                       for i, (name, (lat, lon)) in enumerate(points.items(), 1)])
+    for name, (lat, lon) in points.items():
+        row, = coverage.query(lat - 0.0001, lon - 0.0001, lat + 0.0001, lon + 0.0001, resolution="fine",
+                              operator=name)
+        min_lat, min_lon, max_lat, max_lon = row["bbox"]
+        assert min_lat <= lat < max_lat and min_lon <= lon < max_lon
+        assert max_lat - min_lat == pytest.approx(0.001)
+
+
+def test_bbox_query_only_returns_cells_in_the_box(coverage):
+    rows = coverage.query(-0.05, 0.0, -0.0001, 0.05, resolution="medium", operator="MTN")
+    assert rows and all(row["operator"] == "MTN" for row in rows)
+    assert all(row["bbox"][2] <= 0 and row["bbox"][1] >= 0 for row in rows)
+    expected = [r for r in readings() if r["operator"] == "MTN" and r["latitude"] < 0 <= r["longitude"]]
+    assert sum(row["count"] for row in rows) == len(expected)
+    assert coverage.query(10, 10, 11, 11) == []
+
+
+def test_resolution_is_picked_under_max_cells(tmp_path):
+    coverage = CoverageIndex(str(tmp_path / "coverage.json"), quality, max_cells=10000)
+    assert coverage.pick_resolution(0, 0, 0.05, 0.05) == "fine"
+    assert coverage.pick_resolution(0, 0, 0.5, 0.5) == "medium"
+    assert coverage.pick_resolution(-2, -2, 2, 2) == "coarse"
+    assert coverage.pick_resolution(-90, -180, 90, 180) == "coarse"
+    small = CoverageIndex(str(tmp_path / "small.json"), quality, max_cells=4)
+    assert small.pick_resolution(-0.05, -0.05, 0.05, 0.05) == "coarse"
+
+
+def test_unpositioned_readings_are_skipped(tmp_path):
+    coverage = CoverageIndex(str(tmp_path / "coverage.json"), quality)
+    coverage.add_many([{"id": 1, "operator": "MTN", "latitude": "Unknown", "longitude": "Unknown",
+                        "signal_strength": -70},
+                       {"id": 2, "operator": "MTN", "latitude": 95, "longitude": 0, "signal_strength": -70}])
+    assert coverage.query(-90, -180, 90, 180) == [] and coverage.last_id == 2
+
+
+def test_checkpoint_and_catch_up(tmp_path, coverage):
+    coverage.save()
+    reloaded = CoverageIndex(coverage.path, quality)
+    assert reloaded.loaded and reloaded.last_id == 2000
+    more = [dict(reading, id=reading["id"] + 2000) for reading in readings(100, seed=12)]
+    # The catch-up scan overlaps readings the checkpoint already holds
+    assert reloaded.catch_up(iter(readings()[-50:] + more)) == 100
+    coverage.add_many(more)
+    box = (-0.05, -0.05, 0.05, 0.05)
+    assert reloaded.query(*box, resolution="fine") == coverage.query(*box, resolution="fine")
+
+
+@pytest.mark.parametrize("query", ["", "bbox=1,2,3", "bbox=a,b,c,d", "bbox=10,0,5,1", "bbox=0,0,1,1&resolution=huge"])
+def test_coverage_route_rejects_bad_queries(client, query):
+    assert client.get(f"/api/coverage?{query}").status_code == 400
+    assert client.get("/api/coverage?bbox=-1,-1,1,1").status_code == 200
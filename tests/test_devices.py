@@ -0,0 +1,41 @@
+import pytest
+
+from application.devices import DeviceManager
+from application.modem import close_connection
+from simulator import SIM800CSimulator
+
+
+class Handler(object):
+    def claim_primary(self):
+        return True
+
+
+@pytest.fixture
+def simulator():
+    with SIM800CSimulator(latency=0, baudrate=0, seed=1) as simulator:
+        yield simulator
+
+
+def test_discovery_runs_in_the_background(simulator):
+    devices = DeviceManager(Handler(), ["/dev/nonexistent-modem", simulator.port])
+    assert devices.status.get()["error"] == "Looking for the SIM800C module, try again shortly."
+    devices.start(sampling=False)
+    assert devices.ready.wait(10)
+    try:
+        assert (devices.state, devices.port) == ("ready", simulator.port)
+        status = devices.status.get()
+        assert status["module_detected"] and status["sim_inserted"] and status["error"] is None
+    finally:
+        devices.stop()
+        close_connection(simulator.port)
+
+
+def test_no_device_is_reported_once_discovery_is_over():
+    devices = DeviceManager(Handler(), ["/dev/nonexistent-modem"])
+    devices.start(sampling=False)
+    assert devices.ready.wait(10)
+    assert devices.state == "no_device"
+    status = devices.status.get()
+    assert not status["module_detected"]
+    assert status["error"] == "SIM800C module not connected."
+    devices.stop()
@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+READINGS = [{"operator": "MTN", "signal_strength": -70 - i, "network_type": "4G", "latitude": 6.5, "longitude": 3.3}
+            for i in range(5)]
+
+
+@pytest.fixture(scope="module")
+def saved(client):
+    response = client.post("/api/record/batch", data=json.dumps(READINGS), content_type="application/json")
+    assert response.status_code == 201
+
+
+def page(client, **args):
+    response = client.get("/api/readings", query_string=dict(days=1, **args))
+    assert response.status_code == 200
+    return response.get_json()
+
+
+@pytest.mark.parametrize("limit", [0, -1, -100])
+def test_limit_below_one_returns_one_reading(client, saved, limit):
+    result = page(client, limit=limit)
+    assert len(result["readings"]) == 1 and result["next_cursor"]
+    assert client.get(f"/historical_data?limit={limit}").status_code == 200
+
+
+def test_cursor_walks_every_reading_once(client, saved):
+    everything = page(client, limit=100000)["readings"]
+    assert len(everything) >= len(READINGS)
+    ids, cursor = [], None
+    while True:
+        result = page(client, limit=2, **({"cursor": cursor} if cursor else {}))
+        ids.extend(reading["id"] for reading in result["readings"])
+        cursor = result["next_cursor"]
+        if cursor is None:
+            break
+    assert ids == [reading["id"] for reading in everything]
+
+
+@pytest.mark.parametrize("cursor", ["", "garbage", "1:2:3", "abc:1"])
+def test_malformed_cursor_starts_from_the_beginning(client, saved, cursor):
+    assert page(client, limit=2, cursor=cursor) == page(client, limit=2)
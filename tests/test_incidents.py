@@ -0,0 +1,56 @@
+from application.incidents import IncidentDetector
+
+START = 1790000000.0
+
+
+def feed(detector, levels, first_id=1):
+    """One reading per minute; None is an unavailable reading"""
+    readings = []
+    for i, dbm in enumerate(levels):
+        reading = {"id": first_id + i, "operator": "MTN", "epoch": START + (first_id + i) * 60,
+                   "availability": dbm is not None}
+        if dbm is not None:
+            reading["signal_strength"] = dbm
+        readings.append(reading)
+    detector.add_many(readings)
+    return readings
+
+
+def test_degradation_opens_and_closes_with_hysteresis(tmp_path):
+    detector = IncidentDetector(str(tmp_path / "incidents.json"))
+    feed(detector, [-70] * 20 + [-95] * 10)
+    (incident,) = detector.query(0, float("inf"))
+    assert incident["kind"] == "degradation" and incident["ongoing"]
+    assert incident["worst_dbm"] == -95 and incident["baseline_dbm"] > -75
+    feed(detector, [-72] * 10, first_id=31)
+    (incident,) = detector.query(0, float("inf"))
+    assert not incident["ongoing"] and incident["end"] > incident["start"]
+
+
+def test_short_dip_is_not_an_incident(tmp_path):
+    detector = IncidentDetector(str(tmp_path / "incidents.json"))
+    feed(detector, [-70] * 20 + [-95] + [-70] * 10)
+    assert detector.query(0, float("inf")) == []
+
+
+def test_outage_starts_at_first_unavailable_reading(tmp_path):
+    detector = IncidentDetector(str(tmp_path / "incidents.json"), outage_after=3)
+    feed(detector, [-70] * 5 + [None] * 2 + [-70] + [None] * 4 + [-70])
+    (outage,) = detector.query(0, float("inf"), kind="outage")
+    assert outage["start"] == START + 9 * 60 and outage["end"] == START + 13 * 60
+    assert outage["readings"] == 4 and not outage["ongoing"]
+
+
+def test_checkpoint_and_catch_up(tmp_path):
+    path = str(tmp_path / "incidents.json")
+    detector = IncidentDetector(path)
+    readings = feed(detector, [-70] * 20 + [-95] * 5)
+    detector.save()
+    restored = IncidentDetector(path)
+    assert restored.loaded and restored.query(0, float("inf")) == detector.query(0, float("inf"))
+    # Readings it already saw are skipped
+    assert restored.catch_up(readings) == 0
+    more = [{"id": 26 + i, "operator": "MTN", "epoch": START + (26 + i) * 60, "signal_strength": -70,
+             "availability": True} for i in range(10)]
+    assert restored.catch_up(readings + more) == 10
+    assert not restored.query(0, float("inf"))[0]["ongoing"]
@@ -0,0 +1,64 @@
+import io, json
+
+import pytest
+
+from application.ingest import iter_json_items
+
+READINGS = [{"operator": "MTN", "signal_strength": -70 - i, "network_type": "4G", "latitude": 6.5, "longitude": 3.3}
+            for i in range(5)]
+
+
+def items(body, chunk_size=7):
+    return list(iter_json_items(io.BytesIO(body.encode()), chunk_size=chunk_size))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64 * 1024])
+def test_json_array(chunk_size):
+    assert items(json.dumps(READINGS, indent=2), chunk_size) == [(reading, None) for reading in READINGS]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64 * 1024])
+def test_ndjson(chunk_size):
+    body = "".join(json.dumps(reading) + "\n" for reading in READINGS)
+    assert items(body, chunk_size) == [(reading, None) for reading in READINGS]
+    assert items(body.rstrip("\n"), chunk_size)[-1] == (READINGS[-1], None)   # no trailing newline
+
+
+def test_ndjson_bad_line_is_reported_and_skipped():
+    result = items('{"a": 1}\n{"a": \n{"a": 3}\n')
+    assert result[0] == ({"a": 1}, None)
+    assert result[1][0] is None and result[1][1].startswith("Invalid JSON")
+    assert result[2] == ({"a": 3}, None)
+
+
+def test_multibyte_characters_split_across_chunks():
+    body = json.dumps([{"operator": "Ōrange ñ"}], ensure_ascii=False)
+    assert items(body, chunk_size=1) == [({"operator": "Ōrange ñ"}, None)]
+
+
+@pytest.mark.parametrize("body", ["", "  \n", "[]", " [ ] "])
+def test_empty_bodies(body):
+    assert items(body) == []
+
+
+@pytest.mark.parametrize("body", ['[{"a": 1}', '[{"a": 1} {"a": 2}]', '[{"a": 1},]', '[{"a": '])
+def test_malformed_array_raises(body):
+    with pytest.raises(ValueError):
+        items(body)
+
+
+@pytest.mark.parametrize("body", ["", "[]", "\n"])
+def test_batch_without_readings_is_rejected(client, body):
+    response = client.post("/api/record/batch", data=body, content_type="application/json")
+    assert response.status_code == 400
+    assert response.get_json()["message"] == "No readings in request body"
+
+
+def test_batch_accepts_array_and_ndjson(client):
+    response = client.post("/api/record/batch", data=json.dumps(READINGS), content_type="application/json")
+    assert response.status_code == 201 and response.get_json()["accepted"] == len(READINGS)
+    body = "".join(json.dumps(reading) + "\n" for reading in READINGS[:2]) + "not json\n"
+    response = client.post("/api/record/batch", data=body, content_type="application/x-ndjson")
+    result = response.get_json()
+    assert response.status_code == 200 and result["status"] == "partial"
+    assert (result["accepted"], result["rejected"]) == (2, 1)
@@ -0,0 +1,83 @@
+import json, time, threading
+
+from application.live import LiveFeed
+
+
+def test_subscriber_receives_published_events():
+    feed = LiveFeed()
+    subscription = feed.subscribe()
+    feed.publish({"signal_strength": -70})
+    assert json.loads(subscription.get(timeout=1)) == {"signal_strength": -70}
+    assert subscription.get(timeout=0.05) is None
+    feed.unsubscribe(subscription)
+    feed.publish({"signal_strength": -71})
+    assert subscription.closed and subscription.get() is None
+    assert feed.stats()["subscribers"] == 0
+
+
+def test_slow_subscriber_drops_oldest_without_blocking_publish():
+    feed = LiveFeed(max_queue=3)
+    slow, fast = feed.subscribe(), feed.subscribe()
+    received = []
+
+    def read():
+        while len(received) < 10:
+            received.append(json.loads(fast.get(timeout=1))["n"])
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    started = time.monotonic()
+    for n in range(10):
+        feed.publish({"n": n})
+        time.sleep(0.01)
+    assert time.monotonic() - started < 1
+    reader.join(2)
+    assert received == list(range(10))
+    assert [json.loads(slow.get())["n"] for _ in range(3)] == [7, 8, 9]
+    assert slow.dropped == 7 and fast.dropped == 0
+    assert feed.stats()["dropped"] == 7
+
+
+def test_subscriber_limit():
+    feed = LiveFeed(max_subscribers=2)
+    first, second = feed.subscribe(), feed.subscribe()
+    assert feed.subscribe() is None
+    feed.unsubscribe(first)
+    assert feed.subscribe() is not None
+
+
+def reading(signal):
+    return {"operator": "MTN", "signal_strength": signal, "network_type": "4G", "latitude": 6.5, "longitude": 3.3}
+
+
+def events(response):
+    """Data of each ``reading`` event on an open SSE response"""
+    for chunk in response.response:
+        chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if chunk.startswith("event: reading"):
+            yield json.loads(chunk.split("data: ", 1)[1])
+
+
+def test_stream_sends_latest_then_new_readings(client):
+    from application.routes import data_handler
+    assert client.post("/api/record", json=reading(-61)).status_code == 201
+    subscribers = data_handler.live.stats()["subscribers"]
+    response = client.get("/api/live/stream", buffered=False)
+    try:
+        assert response.status_code == 200 and response.mimetype == "text/event-stream"
+        stream = events(response)
+        assert next(stream)["signal_strength"] == -61
+        assert client.post("/api/record", json=reading(-62)).status_code == 201
+        event = next(stream)
+        assert event["signal_strength"] == -62 and "signal_quality" in event
+    finally:
+        response.close()
+    assert data_handler.live.stats()["subscribers"] == subscribers
+
+
+def test_stream_over_subscriber_limit_is_503(client, monkeypatch):
+    from application.routes import data_handler
+    monkeypatch.setattr(data_handler.live, "max_subscribers", len(data_handler.live.subscribers))
+    response = client.get("/api/live/stream")
+    assert response.status_code == 503
+    assert response.get_json()["message"] == "Too many live clients"
@@ -0,0 +1,64 @@
+from application.metrics import Registry
+
+
+def test_counter_and_label_escaping():
+    registry = Registry()
+    counter = registry.counter("events_total", "Events seen", ("path",))
+    counter.inc(path='C:\\data\n"quoted"')
+    counter.inc(2, path='C:\\data\n"quoted"')
+    assert registry.counter("events_total", "ignored") is counter
+    assert registry.render().splitlines() == [
+        "# HELP events_total Events seen",
+        "# TYPE events_total counter",
+        'events_total{path="C:\\\\data\\n\\"quoted\\""} 3',
+    ]
+
+
+def test_gauge_functions_are_read_at_scrape_time():
+    registry = Registry()
+    gauge = registry.gauge("queue_depth", "Items waiting")
+    depth = [4]
+    gauge.set_function(lambda: depth[0])
+    assert "queue_depth 4" in registry.render()
+    depth[0] = 7
+    assert "queue_depth 7" in registry.render()
+    gauge.remove()
+    assert registry.render().splitlines()[2:] == []
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    histogram = registry.histogram("op_seconds", "Operation time", ("op",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, op="read")
+    histogram.observe(0.2, op="write")
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP op_seconds Operation time", "# TYPE op_seconds histogram"]
+    assert lines[2:7] == [
+        'op_seconds_bucket{op="read",le="0.1"} 2',
+        'op_seconds_bucket{op="read",le="1.0"} 3',
+        'op_seconds_bucket{op="read",le="+Inf"} 4',
+        'op_seconds_sum{op="read"} 3.65',
+        'op_seconds_count{op="read"} 4',
+    ]
+    assert 'op_seconds_bucket{op="write",le="+Inf"} 1' in lines
+    assert 'op_seconds_count{op="write"} 1' in lines
+
+
+def test_histogram_without_labels():
+    registry = Registry()
+    with registry.histogram("tick_seconds", "Tick", buckets=(1.0,)).time():
+        pass
+    lines = registry.render().splitlines()
+    assert lines[2:4] == ['tick_seconds_bucket{le="1.0"} 1', 'tick_seconds_bucket{le="+Inf"} 1']
+    assert lines[-1] == "tick_seconds_count 1"
+
+
+def test_metrics_route(client):
+    client.get("/api/modem/health")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    body = response.get_data(as_text=True)
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert 'http_request_duration_seconds_count{endpoint="modem_health",method="GET",status="200"}' in body
@@ -0,0 +1,87 @@
+import time
+
+import pytest
+import serial
+
+from application.modem import ATChannel, ATResponse, split_batch
+from simulator import SIM800CSimulator
+
+COMMANDS = ["AT+CSQ", "AT+COPS?", "AT+CGREG?", "AT+CIPGSMLOC=1,1"]
+
+
+def test_split_batch_ok():
+    response = ATResponse("AT+CSQ;+COPS?;+CGREG?;+CIPGSMLOC=1,1",
+                          ["+CSQ: 20,0", '+COPS: 0,0,"MTN NG"', "+CGREG: 0,1", "+CIPGSMLOC: 0,6.5,3.3"], "OK", 0.1)
+    replies = split_batch(COMMANDS, response)
+    assert [reply.final for reply in replies] == ["OK"] * 4
+    assert [reply.lines for reply in replies] == [[line] for line in response.lines]
+
+
+def test_split_batch_stops_at_failing_command():
+    response = ATResponse("AT+CSQ;+COPS?;+CGREG?;+CIPGSMLOC=1,1", ["+CSQ: 20,0"], "ERROR", 0.1)
+    replies = split_batch(COMMANDS, response)
+    assert [reply.final for reply in replies] == ["OK", "ERROR", None, None]
+    assert replies[0].line("+CSQ:") == "+CSQ: 20,0"
+
+
+def test_split_batch_timeout():
+    replies = split_batch(COMMANDS[:2], ATResponse("AT+CSQ;+COPS?", ["+CSQ: 20,0"], None, 5))
+    assert all(reply.timed_out for reply in replies)
+
+
+@pytest.fixture
+def simulator():
+    with SIM800CSimulator(latency=0, baudrate=0, seed=1) as simulator:
+        yield simulator
+
+
+@pytest.fixture
+def channel(simulator):
+    ser = serial.Serial(simulator.port, 9600, timeout=0.1)
+    channel = ATChannel(ser)
+    yield channel
+    channel.close()
+    ser.close()
+
+
+def test_command_framing(channel):
+    response = channel.command("AT+CSQ")
+    assert response.ok
+    assert len(response.lines) == 1 and response.lines[0].startswith("+CSQ: ")  # no echo, no blank lines
+
+
+def test_error_result(simulator, channel):
+    simulator.failing = {"AT+COPS"}
+    response = channel.command("AT+COPS?")
+    assert response.final == "ERROR" and not response.ok
+
+
+def test_unsolicited_lines_go_to_listeners(simulator, channel):
+    received = []
+    channel.add_listener(received.append, "+CMTI:")
+    simulator.urc_rate = 1.0
+    response = channel.command("AT+CSQ")
+    simulator.urc_rate = 0.0
+    assert len(response.lines) == 1 and response.lines[0].startswith("+CSQ: ")
+    simulator.receive_sms("+2348030000003", "hello")
+    deadline = time.monotonic() + 2
+    while len(received) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(received) == 2 and all(line.startswith("+CMTI:") for line in received)
+
+
+def test_batch(channel):
+    replies = channel.batch(["AT+CSQ", "AT+COPS?", "AT+CGREG?"])
+    assert [reply.final for reply in replies] == ["OK"] * 3
+    assert replies[1].lines == ['+COPS: 0,0,"MTN NG"']
+
+
+@pytest.mark.parametrize("echo", ["ATE1", "ATE0"])
+def test_late_reply_is_not_credited_to_next_command(simulator, channel, echo):
+    assert channel.command(echo).ok
+    simulator.latencies["AT+CIPGSMLOC"] = 0.5
+    assert channel.command("AT+CIPGSMLOC=1,1", timeout=0.1).timed_out
+    response = channel.command("AT+CSQ", timeout=3)
+    assert response.ok
+    assert len(response.lines) == 1 and response.lines[0].startswith("+CSQ: ")
+    assert channel.command("AT+COPS?").lines == ['+COPS: 0,0,"MTN NG"']
@@ -0,0 +1,171 @@
+import os, sys, time, subprocess, threading
+
+import pytest
+
+import config
+from application.devices import DeviceManager
+from application.locks import try_claim
+from application.status import ModemStatus, SharedStatus
+
+BACKENDS = ["json", "log", "sqlite", "binary"]
+
+# Holds an flock on argv[1] like another worker process would, until stdin closes
+HOLD_LOCK = """
+import os, sys, fcntl
+fd = os.open(sys.argv[1], os.O_RDWR | os.O_CREAT, 0o644)
+fcntl.flock(fd, fcntl.LOCK_EX)
+print("locked", flush=True)
+sys.stdin.read()
+"""
+
+
+@pytest.fixture(autouse=True)
+def no_follower(monkeypatch):
+    # The tests call follow() themselves
+    monkeypatch.setattr(config, "FOLLOW_INTERVAL", 0)
+
+
+def reading(dbm, lat=6.5):
+    return {"operator": "MTN", "network_type": "4G", "signal_strength": dbm, "latitude": lat, "longitude": 3.3,
+            "availability": True}
+
+
+def ids(handler):
+    return [r["id"] for r in handler.store]
+
+
+def rollup_count(handler):
+    return sum(row["count"] for row in handler.rollups.query(0, time.time() + 60, resolution="day"))
+
+
+def coverage_count(handler):
+    return sum(row["count"] for row in handler.coverage.query(-90, -180, 90, 180, resolution="coarse"))
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_concurrent_writers_get_unique_increasing_ids(open_handler, backend):
+    writers = [open_handler(backend=backend), open_handler(backend=backend)]
+
+    def save(handler, n):
+        for i in range(25):
+            handler.save_reading(reading(-70 - i % 20, lat=6.5 + n))
+
+    threads = [threading.Thread(target=save, args=(writers[n % 2], n)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert ids(open_handler(backend=backend)) == list(range(1, 101))
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_foreign_readings_come_in_id_order(open_handler, backend):
+    first, second, reader = (open_handler(backend=backend) for _ in range(3))
+    first.save_reading(reading(-70))
+    second.save_readings([reading(-71), reading(-72)])
+    first.save_reading(reading(-73))
+    second.save_reading(reading(-74))
+    reader.store.refresh()
+    assert [r["id"] for r in reader.store.take_foreign()] == [1, 2, 3, 4, 5]
+    assert reader.store.take_foreign() == []
+    # The readings the others saved come after our own in first's view too
+    first.store.refresh()
+    assert [r["id"] for r in first.store.take_foreign()] == [5]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_followers_count_each_reading_once(open_handler, backend):
+    first, second = open_handler(backend=backend), open_handler(backend=backend)
+    levels = [-70] * 20 + [-100] * 10
+    for i, dbm in enumerate(levels):
+        (first if i % 3 else second).save_reading(reading(dbm))
+        if i % 7 == 0:
+            first.follow()
+            second.follow()
+    first.follow(), first.follow()
+    second.follow(), second.follow()
+    for handler in (first, second):
+        assert rollup_count(handler) == coverage_count(handler) == 30
+        assert handler.get_latest_reading()["id"] == 30
+        assert handler.incidents.last_id == 30
+    assert first.incidents.query(0, float("inf")) == second.incidents.query(0, float("inf"))
+    assert [i["kind"] for i in first.incidents.query(0, float("inf"))] == ["degradation"]
+    # A restart catches up over the overlap window without counting anything twice
+    first.close()
+    restarted = open_handler(backend=backend)
+    assert rollup_count(restarted) == coverage_count(restarted) == 30
+
+
+def test_primary_lock_is_exclusive_until_released(tmp_path):
+    path = str(tmp_path / "primary.lock")
+    fd = try_claim(path)
+    assert fd is not None and try_claim(path) is None
+    with open(path) as f:
+        assert f.read() == str(os.getpid())
+    os.close(fd)
+    fd = try_claim(path)
+    assert fd is not None
+    os.close(fd)
+
+
+def test_secondary_takes_over_when_the_primary_exits(open_handler, monkeypatch):
+    monkeypatch.setattr(config, "PRIMARY_RETRY_INTERVAL", 0.05)
+    owner = subprocess.Popen([sys.executable, "-c", HOLD_LOCK, config.PRIMARY_LOCK_FILE],
+                             stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    devices = None
+    try:
+        assert owner.stdout.readline().strip() == "locked"
+        handler = open_handler()
+        assert not handler.claim_primary()
+        devices = DeviceManager(handler, []).start(sampling=False)
+        assert devices.ready.wait(5) and devices.state == "secondary"
+        assert isinstance(devices.status, SharedStatus)
+        owner.stdin.close()
+        owner.wait(5)
+        deadline = time.monotonic() + 5
+        while devices.state != "no_device" and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert devices.state == "no_device" and handler.primary
+        assert devices.status.get()["error"] == "SIM800C module not connected."
+        # The new primary publishes its snapshot for the remaining workers
+        shared = SharedStatus(config.STATUS_FILE).get()
+        assert shared["error"] == "SIM800C module not connected."
+    finally:
+        if devices:
+            devices.stop()
+        if owner.poll() is None:
+            owner.kill()
+
+
+class Modem(object):
+    def __init__(self, signal=-73):
+        self.signal = signal
+
+    def connect(self):
+        return True
+
+    def query(self, names):
+        return {"module_detected": True, "sim": True, "signal": self.signal, "operator": "MTN"}
+
+
+def test_status_snapshot_is_shared_through_status_file(tmp_path):
+    path = str(tmp_path / "modem_status.json")
+    shared = SharedStatus(path, max_age=60)
+    assert shared.get()["error"].startswith("Waiting for the worker")
+    status = ModemStatus(Modem(), path=path)
+    snapshot = status.get()
+    assert shared.get() == snapshot and shared.loads == 1
+    shared.get()
+    assert shared.loads == 1
+    time.sleep(0.01)
+    status.update("signal", -91)
+    assert shared.get()["signal_strength"] == -91 and shared.loads == 2
+
+
+def test_stale_status_file_is_unavailable(tmp_path):
+    path = str(tmp_path / "modem_status.json")
+    ModemStatus(Modem(), path=path).get()
+    shared = SharedStatus(path, max_age=0.1)
+    assert shared.get()["signal_strength"] == -73
+    time.sleep(0.15)
+    assert shared.get()["error"].startswith("Waiting for the worker")
@@ -0,0 +1,31 @@
+import pytest
+
+from application.pool import ModemPool
+from simulator import SIM800CSimulator
+
+
+class Handler(object):
+    def save_reading(self, reading):
+        return True
+
+
+@pytest.fixture
+def simulator():
+    with SIM800CSimulator(latency=0, baudrate=0, seed=1) as simulator:
+        yield simulator
+
+
+def test_unplugged_modem_is_stopped_outside_the_lock(simulator):
+    pool = ModemPool(Handler(), {"signal": 60}, ports=[simulator.port])
+    pool.scan()
+    device = pool.devices[simulator.port]
+    assert device["device_id"] == simulator.imei
+
+    held = []
+    stop = device["sampler"].stop
+    device["sampler"].stop = lambda: (held.append(pool.lock.locked()), stop())
+    pool.ports = ["/dev/nonexistent-modem"]
+    pool.scan()
+    assert held == [False]
+    assert pool.devices == {}
+    assert not device["sampler"].running
@@ -0,0 +1,58 @@
+import os, time
+
+import config
+from application.retention import ColdStore
+
+DAY = "2026-10-01"
+START = time.mktime(time.strptime(DAY, "%Y-%m-%d"))
+
+
+def readings(ids):
+    return [{"id": i, "operator": ("MTN", "Glo")[i % 2], "signal_strength": -70, "epoch": START + i * 60}
+            for i in ids]
+
+
+def test_write_and_scan_day(tmp_path):
+    cold = ColdStore(str(tmp_path), block_rows=10)
+    assert cold.write_day(DAY, readings(range(1, 51))) == 50
+    assert list(cold.scan()) == readings(range(1, 51))
+    assert [r["id"] for r in cold.scan(START + 600, START + 1200)] == list(range(10, 20))
+    assert [r["id"] for r in cold.scan(START + 600, START + 1200, operator="Glo")] == [11, 13, 15, 17, 19]
+    assert cold.bounds() == (START + 60, START + 3000)
+    # Headers are read back from the files
+    assert [r["id"] for r in ColdStore(str(tmp_path)).scan(START + 600, START + 720)] == [10, 11]
+
+
+def test_rewriting_a_day_merges_and_deduplicates(tmp_path):
+    cold = ColdStore(str(tmp_path))
+    cold.write_day(DAY, readings(range(1, 11)))
+    cold.write_day(DAY, readings(range(6, 16)))     # an interrupted compaction repeated
+    assert [r["id"] for r in cold.scan()] == list(range(1, 16))
+    assert cold.stats()["readings"] == 15
+
+
+def test_purge(tmp_path):
+    cold = ColdStore(str(tmp_path))
+    cold.write_day(DAY, readings(range(1, 11)))
+    assert cold.purge(START) == 0
+    assert cold.purge(START + 86400) == 10
+    assert list(cold.scan()) == [] and cold.bounds() == (None, None)
+
+
+def test_rollups_rebuild_from_cold_and_hot_readings(open_handler):
+    now = time.time()
+    handler = open_handler(backend="sqlite")
+    handler.store.append_many([{"operator": ("MTN", "Glo")[i % 2], "network_type": "4G", "signal_strength": -60 - i % 40,
+                                "epoch": now - 30 * 86400 + i * 3600} for i in range(30 * 24)])
+    handler.rebuild_rollups()
+    expected = handler.get_rollups(days=40, resolution="day")
+    assert sum(row["count"] for row in expected) == 30 * 24
+
+    result = handler.compact(now)
+    assert result["moved"] > 0 and handler.cold.stats()["readings"] == result["moved"]
+    handler.rebuild_rollups()
+    assert handler.get_rollups(days=40, resolution="day") == expected
+    # A lost rollups file is rebuilt from both on start
+    handler.close()
+    os.remove(config.ROLLUPS_FILE)
+    assert open_handler(backend="sqlite").get_rollups(days=40, resolution="day") == expected
@@ -0,0 +1,119 @@
+import math, time, random
+from datetime import datetime
+
+import pytest
+
+from application.rollups import RollupStore
+
+START = datetime(2026, 10, 14, 0, 0).timestamp()
+
+
+def quality(dbm):
+    return max(0, min(100, int((dbm + 120) / 70 * 100)))
+
+
+def readings(count=2000, seed=7):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        rows.append({"id": i + 1, "epoch": START + i * 97.3, "operator": rng.choice(["MTN", "Glo"]),
+                     "network_type": rng.choice(["3G", "4G"]), "signal_strength": rng.randint(-115, -55),
+                     "availability": rng.random() > 0.1})
+    return rows
+
+
+def naive(rows, bucket):
+    """Per (bucket, operator, network type): count, min, avg, max, p50 and availability"""
+    groups = {}
+    for row in rows:
+        key = (bucket(row["epoch"]), row["operator"], row["network_type"])
+        groups.setdefault(key, []).append(row)
+    result = {}
+    for key, group in groups.items():
+        values = sorted(row["signal_strength"] for row in group)
+        result[key] = {"count": len(group), "min_dbm": values[0], "max_dbm": values[-1],
+                       "avg_dbm": round(sum(values) / len(values), 1),
+                       "p50_dbm": values[math.ceil(len(values) * 0.5) - 1],
+                       "availability": round(sum(row["availability"] for row in group) / len(group), 4)}
+    return result
+
+
+def hour(epoch):
+    return datetime.fromtimestamp(epoch).replace(minute=0, second=0, microsecond=0).timestamp()
+
+
+def day(epoch):
+    return datetime.fromtimestamp(epoch).replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+
+
+def rows_by_key(rollups, resolution):
+    keys = ("count", "min_dbm", "avg_dbm", "max_dbm", "p50_dbm", "availability")
+    return {(row["start"], row["operator"], row["network_type"]): {key: row[key] for key in keys}
+            for row in rollups.query(START - 86400, START + 30 * 86400, resolution=resolution)}
+
+
+@pytest.fixture
+def rollups(tmp_path):
+    return RollupStore(str(tmp_path / "rollups.json"), quality)
+
+
+@pytest.mark.parametrize("resolution, bucket", [("hour", hour), ("day", day)])
+def test_rollups_match_a_naive_computation(rollups, resolution, bucket):
+    rows = readings()
+    rollups.add_many(rows)
+    assert rows_by_key(rollups, resolution) == naive(rows, bucket)
+
+
+def test_quality_and_percentiles_of_one_bucket(rollups):
+    rollups.add_many([{"id": i + 1, "epoch": START + i, "operator": "MTN", "network_type": "4G",
+                       "signal_strength": -60 - i} for i in range(20)])
+    row, = rollups.query(START, START + 3600, resolution="hour")
+    assert (row["p5_dbm"], row["p50_dbm"], row["p95_dbm"]) == (-79, -70, -61)
+    assert row["avg_quality"] == round(sum(quality(-60 - i) for i in range(20)) / 20, 1)
+    assert row["availability"] == 1
+
+
+def test_unknown_signal_counts_for_availability_only(rollups):
+    rollups.add_many([{"id": 1, "epoch": START, "operator": "MTN", "network_type": "4G", "signal_strength": -70},
+                      {"id": 2, "epoch": START + 1, "operator": "MTN", "network_type": "4G",
+                       "signal_strength": "Unknown", "availability": False}])
+    row, = rollups.query(START, START + 60, resolution="minute")
+    assert (row["count"], row["min_dbm"], row["max_dbm"], row["availability"]) == (2, -70, -70, 0.5)
+
+
+def test_rebuild_and_reload_match_incremental_updates(tmp_path, rollups):
+    rows = readings(500)
+    for row in rows:
+        rollups.add_many([row])
+    rebuilt = RollupStore(str(tmp_path / "rebuilt.json"), quality)
+    rebuilt.rebuild(iter(rows))
+    reloaded = RollupStore(str(tmp_path / "rebuilt.json"), quality)
+    assert reloaded.loaded and reloaded.last_id == 500
+    for resolution in ("minute", "hour", "day"):
+        assert rows_by_key(rebuilt, resolution) == rows_by_key(rollups, resolution)
+        assert rows_by_key(reloaded, resolution) == rows_by_key(rollups, resolution)
+
+
+def test_catch_up_skips_readings_already_counted(tmp_path, rollups):
+    rows = readings(300)
+    rollups.add_many(rows[:200])
+    rollups.save()
+    restarted = RollupStore(rollups.path, quality)
+    assert restarted.catch_up(iter(rows[150:])) == 100
+    assert restarted.catch_up(iter(rows[150:])) == 0
+    expected = RollupStore(str(tmp_path / "all.json"), quality)
+    expected.add_many(rows)
+    assert rows_by_key(restarted, "hour") == rows_by_key(expected, "hour")
+
+
+def test_retention_is_per_resolution(tmp_path):
+    rollups = RollupStore(str(tmp_path / "rollups.json"), quality, retention={"minute": 3 * 3600, "hour": None})
+    rows = readings()
+    rollups.add_many(rows)
+    now = rows[-1]["epoch"]
+    rollups.prune(now)
+    assert min(start for start, _, _ in rollups.buckets["minute"]) >= now - 3 * 3600
+    assert rows_by_key(rollups, "hour") == naive(rows, hour)
+    # Too old for minute buckets: the query falls back to hours
+    assert rollups.pick_resolution(time.time() - 4 * 3600, time.time() - 3 * 3600) == "hour"
+    assert rollups.pick_resolution(time.time() - 3600, time.time()) == "minute"
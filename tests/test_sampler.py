@@ -0,0 +1,105 @@
+import time
+
+import pytest
+
+from application.logic import SIM800C
+from application.modem import ModemConnection
+from application.sampler import Sampler
+from simulator import SIM800CSimulator
+
+ALL = {"signal": 1, "operator": 1, "network_type": 1, "location": 1}
+
+
+class Handler(object):
+    def __init__(self):
+        self.readings = []
+
+    def save_reading(self, reading):
+        self.readings.append(reading)
+        return True
+
+
+@pytest.fixture
+def simulator():
+    with SIM800CSimulator(latency=0, baudrate=0, seed=1) as simulator:
+        yield simulator
+
+
+@pytest.fixture
+def modem(simulator):
+    modem = SIM800C(simulator.port)
+    modem.connection = ModemConnection(simulator.port, settle=0)
+    assert modem.connection.open()
+    yield modem
+    modem.connection.close()
+
+
+def test_batch_sends_signal_first(modem):
+    sampler = Sampler(modem, Handler(), ALL)
+    sampler._sample(["location", "network_type", "operator", "signal"])
+    reading = sampler.handler.readings[0]
+    assert reading["availability"] is True
+    assert isinstance(reading["signal_strength"], int)
+    assert reading["operator"] != "Unknown"
+    assert reading["latitude"] != "Unknown"
+
+
+def test_failing_location_still_saves_signal(simulator, modem):
+    simulator.failing = {"AT+CIPGSMLOC"}
+    sampler = Sampler(modem, Handler(), ALL)
+    sampler._sample(list(ALL))
+    assert len(sampler.handler.readings) == 1
+    reading = sampler.handler.readings[0]
+    assert reading["availability"] is True
+    assert reading["operator"] != "Unknown"
+    assert sampler.metrics["location"]["errors"] == 1
+    assert sampler.metrics["signal"]["errors"] == 0
+
+
+def test_failed_metrics_keep_last_good_value(simulator, modem):
+    sampler = Sampler(modem, Handler(), ALL)
+    sampler._sample(list(ALL))
+    good = dict(sampler.values)
+    # +COPS fails: the module skips +CGREG and +CIPGSMLOC after it
+    simulator.failing = {"AT+COPS"}
+    sampler._sample(list(ALL))
+    assert sampler.values == good
+    first, second = sampler.handler.readings
+    assert second["availability"] is True
+    assert (second["operator"], second["network_type"]) == (first["operator"], first["network_type"])
+    assert [sampler.metrics[name]["errors"] for name in ALL] == [0, 1, 1, 1]
+
+
+def test_signal_not_executed_is_not_saved():
+    class Modem(object):
+        def query(self, names):
+            return {"signal": None, "operator": None, "errors": {"operator": "ERROR", "signal": "not executed"}}
+
+    sampler = Sampler(Modem(), Handler(), {"signal": 1, "operator": 1})
+    sampler._sample(["signal", "operator"])
+    assert sampler.handler.readings == []
+    assert sampler.values["operator"] == "Unknown"
+    assert sampler.metrics["signal"]["errors"] == 1
+
+
+def test_dead_serial_link_is_not_saved_as_an_outage(simulator, modem):
+    sampler = Sampler(modem, Handler(), ALL)
+    sampler._sample(["signal"])
+    simulator.stop()        # modem unplugged
+    deadline = time.monotonic() + 5
+    while modem.connection.state == "connected" and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert modem.connection.state == "reconnecting"
+    sampler._sample(["signal"])
+    sampler._sample(list(ALL))
+    assert len(sampler.handler.readings) == 1
+    assert sampler.device_faults == 2 and sampler.stats()["device_faults"] == 2
+
+
+def test_signal_error_from_the_module_is_an_outage(simulator, modem):
+    simulator.failing = {"AT+CSQ"}
+    sampler = Sampler(modem, Handler(), ALL)
+    sampler._sample(["signal"])
+    sampler._sample(list(ALL))
+    assert [reading["availability"] for reading in sampler.handler.readings] == [False, False]
+    assert sampler.device_faults == 0
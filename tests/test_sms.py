@@ -0,0 +1,84 @@
+import time
+
+import pytest
+
+from application.modem import ModemConnection
+from application.sms import MessageStore, SMSReceiver, parse_cmgl, parse_cmgr, parse_cmti, parse_sms_date
+from simulator import SIM800CSimulator
+
+
+def test_parsers():
+    assert parse_cmti('+CMTI: "SM",3') == ("SM", 3)
+    assert parse_cmti("+CMTI: garbage") is None
+    assert parse_sms_date("26/10/17,09:15:02+04") == parse_sms_date("26/10/17,08:15:02+00")
+    assert parse_sms_date("26/10/17,09:15:02-04") - parse_sms_date("26/10/17,09:15:02+00") == 3600
+    message = parse_cmgr(['+CMGR: "REC UNREAD","+2348030000002","","26/10/17,10:01:44+04"', "Line one", "Line two"])
+    assert (message["sender"], message["status"], message["body"]) == ("+2348030000002", "REC UNREAD",
+                                                                       "Line one\nLine two")
+    assert parse_cmgr([]) is None
+    messages = parse_cmgl(['+CMGL: 1,"REC READ","+234801","","26/10/17,09:15:02+04"', "Hi, there",
+                           '+CMGL: 4,"REC UNREAD","+234802","","26/10/17,09:16:02+04"', "a", "b"])
+    assert [(m["index"], m["body"]) for m in messages] == [(1, "Hi, there"), (4, "a\nb")]
+
+
+def test_message_store_deduplicates(tmp_path):
+    store = MessageStore(str(tmp_path / "sms.jsonl"))
+    message = {"sender": "+234801", "date": "2026-10-17 09:15:02", "body": "hello"}
+    assert store.append(dict(message))["id"] == 1
+    assert store.append(dict(message)) is None
+    store = MessageStore(str(tmp_path / "sms.jsonl"))
+    assert store.append(dict(message, body="again"))["id"] == 2
+    assert [m["body"] for m in store.list()] == ["again", "hello"]
+
+
+@pytest.fixture
+def connection():
+    with SIM800CSimulator(latency=0, baudrate=0, seed=1) as simulator:
+        connection = ModemConnection(simulator.port, settle=0)
+        assert connection.open()
+        connection.simulator = simulator
+        yield connection
+        connection.close()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def test_receiver_saves_unread_and_announced_messages(tmp_path, connection):
+    store = MessageStore(str(tmp_path / "sms.jsonl"))
+    receiver = SMSReceiver(connection, store, delete=True).start()
+    try:
+        # Messages already on the SIM are picked up after setup (the simulator ignores the CMGL filter)
+        assert wait_for(lambda: receiver.saved == 2)
+        index = connection.simulator.receive_sms("+2348030000003", "New message")
+        assert wait_for(lambda: receiver.saved == 3)
+        assert wait_for(lambda: index not in connection.simulator.messages)
+        assert [m["body"] for m in store.list()] == ["New message", "Recharge successful",
+                                                 "Your data balance is 1.2GB"]
+    finally:
+        receiver.stop()
+
+
+def test_sms_commands_share_the_port_connection():
+    import threading
+    from application.logic import SIM800C, SMSCommands
+    from application.modem import close_connection, connection_for
+    with SIM800CSimulator(latency=0, baudrate=0, seed=1) as simulator:
+        connection = connection_for(simulator.port, settle=0)
+        try:
+            modem = SIM800C(simulator.port)
+            assert modem.connect() and modem.connection is connection
+            sms = SMSCommands(simulator.port)
+            assert sms.connection is connection
+            assert [m["index"] for m in sms.list_sms_messages()] == [1, 2]
+            assert sms.read_sms(2)["body"] == "Recharge successful"
+            assert sms.delete_sms(1) and 1 not in simulator.messages
+            assert sms.get_signal_info().isdigit() and modem.get_signal_strength() is not None
+            readers = [thread for thread in threading.enumerate() if thread.name == f"at-reader-{simulator.port}"]
+            assert len(readers) == 1
+        finally:
+            close_connection(simulator.port)
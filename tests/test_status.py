@@ -0,0 +1,87 @@
+import time, threading
+
+from application.status import ModemStatus
+
+
+class CountingModem(object):
+    """Stands in for SIM800C, counting refreshes and holding each one for ``delay`` seconds"""
+    def __init__(self, delay=0.2, signal=-73):
+        self.delay = delay
+        self.signal = signal
+        self.connects = 0
+
+    def connect(self):
+        self.connects += 1
+        time.sleep(self.delay)
+        return True
+
+    def is_module_detected(self):
+        return True
+
+    def is_sim_inserted(self):
+        return True
+
+    def get_signal_strength(self):
+        return self.signal
+
+    def get_operator(self):
+        return "MTN"
+
+    def query(self, names):
+        return {"module_detected": True, "sim": True, "signal": self.signal, "operator": "MTN"}
+
+
+def test_concurrent_gets_share_one_refresh():
+    modem = CountingModem()
+    status = ModemStatus(modem)
+    barrier = threading.Barrier(8)
+    results = []
+
+    def get():
+        barrier.wait()
+        results.append(status.get())
+
+    threads = [threading.Thread(target=get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert modem.connects == 1 and status.refreshes == 1
+    assert status.waits == 7
+    assert all(result["signal_strength"] == -73 and result["csq"] == 20 for result in results)
+
+
+def test_snapshot_is_served_until_ttl():
+    modem = CountingModem(delay=0)
+    status = ModemStatus(modem, ttl=0.5, max_age=60)
+    status.get()
+    status.get()
+    assert modem.connects == 1 and status.stats()["fresh"]
+    time.sleep(0.55)
+    status.get()
+    assert modem.connects == 2
+
+
+def test_sampler_updates_defer_refresh_until_max_age():
+    modem = CountingModem(delay=0)
+    status = ModemStatus(modem, ttl=0.3, max_age=1.0)
+    status.get()
+    deadline = time.monotonic() + 0.7
+    while time.monotonic() < deadline:
+        status.update("signal", -81)
+        assert status.get()["signal_strength"] == -81
+        time.sleep(0.05)
+    # Sampled values keep the snapshot fresh past the TTL...
+    assert modem.connects == 1
+    time.sleep(0.35)
+    status.update("signal", -81)
+    # ...but the SIM state is still re-read every max_age
+    assert status.get()["signal_strength"] == -73 and modem.connects == 2
+
+
+def test_missing_signal_does_not_refresh_snapshot():
+    status = ModemStatus(CountingModem(delay=0), ttl=60)
+    status.get()
+    status.update("signal", None)
+    status.update("operator", "Glo")
+    assert status.get()["signal_strength"] == -73 and status.get()["operator"] == "Glo"
@@ -0,0 +1,280 @@
+import os, json, time
+
+import pytest
+
+from application.retention import ColdStore, compact
+from application.storage import BinaryStore, CompactReading, SegmentLogStore, SQLiteStore, TimeIndex
+
+NOW = time.time()
+
+
+def reading(i, operator=None):
+    return {"operator": operator or ("MTN", "Glo", "Airtel")[i % 3], "network_type": "4G",
+            "signal_strength": -60 - i % 50, "latitude": 6.5, "longitude": 3.3, "availability": True,
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(int(NOW) + i)), "epoch": NOW + i}
+
+
+def without_id(readings):
+    return [{key: value for key, value in dict(r).items() if key != 'id'} for r in readings]
+
+
+STORES = {
+    "binary": lambda path: BinaryStore(str(path / "readings.bin")),
+    "log": lambda path: SegmentLogStore(str(path / "readings"), fsync="never", segment_bytes=2048),
+    "sqlite": lambda path: SQLiteStore(str(path / "network.db")),
+}
+
+
+@pytest.fixture(params=sorted(STORES))
+def opener(request, tmp_path):
+    """Opens the store under test on the same files every call; closes them all afterwards"""
+    opened = []
+
+    def open_store():
+        opened.append(STORES[request.param](tmp_path))
+        return opened[-1]
+    yield open_store
+    for store in opened:
+        store.close()
+
+
+def test_append_assigns_increasing_ids(opener):
+    store = opener()
+    saved = store.append_many([reading(i) for i in range(20)])
+    assert [r["id"] for r in saved] == list(range(1, 21))
+    assert store.append(reading(20))["id"] == 21
+    assert [r["id"] for r in store] == list(range(1, 22))
+    assert store.count() == 21
+    assert store.latest()["id"] == 21
+
+
+def test_reopen_keeps_readings_and_next_id(opener):
+    store = opener()
+    store.append_many([reading(i) for i in range(50)])
+    store.close()
+    store = opener()
+    assert without_id(store) == [reading(i) for i in range(50)]
+    assert store.append(reading(50))["id"] == 51
+
+
+def test_scan_by_time_and_operator(opener):
+    store = opener()
+    store.append_many([reading(i) for i in range(60)])
+    assert [r["id"] for r in store.scan()] == list(range(1, 61))
+    assert [r["id"] for r in store.scan(NOW + 10, NOW + 20)] == list(range(11, 21))
+    assert [r["id"] for r in store.scan(NOW + 10, NOW + 20, operator="Glo")] == [11, 14, 17, 20]
+    assert list(store.scan(NOW + 10, NOW + 20, operator="Nobody")) == []
+    assert list(store.scan(NOW + 100)) == []
+    assert store.bounds() == (NOW, NOW + 59)
+
+
+def test_scan_keeps_time_order_when_the_clock_goes_back(opener):
+    store = opener()
+    store.append_many([reading(i) for i in (0, 5, 2, 9, 1)])
+    assert [r["epoch"] - NOW for r in store.scan()] == [0, 1, 2, 5, 9]
+    assert [r["id"] for r in store.scan(NOW + 1, NOW + 6)] == [5, 3, 2]
+
+
+def test_extra_fields_round_trip(opener):
+    store = opener()
+    odd = dict(reading(0), device_id="861234567890123", signal_strength="Unknown", latitude="Unknown")
+    store.append(dict(odd))
+    store.close()
+    assert without_id(opener()) == [odd]
+
+
+def test_compact_moves_old_readings_to_cold(opener, tmp_path):
+    store = opener()
+    for i in range(40):
+        store.append(reading(i))
+    cold = ColdStore(str(tmp_path / "cold"), block_rows=8)
+    result = compact(store, cold, NOW + 25)
+    moved, hot = [r["id"] for r in cold.scan()], [r["id"] for r in store]
+    # The log store only expires whole sealed segments
+    assert 0 < result["moved"] == result["removed_hot"] == len(moved) <= 25
+    assert moved + hot == list(range(1, 41))
+    assert all(r["epoch"] < NOW + 25 for r in cold.scan())
+    store.close()
+    store = opener()
+    assert [r["id"] for r in store] == hot
+    assert store.append(reading(40))["id"] == 41
+
+
+def test_time_index():
+    index = TimeIndex()
+    for locator, (epoch, operator) in enumerate([(10, "MTN"), (20, "Glo"), (15, "MTN"), (30, None)]):
+        index.add(epoch, locator, operator)
+    assert list(index.range()) == [0, 2, 1, 3]
+    assert list(index.range(15, 30)) == [2, 1]
+    assert list(index.range(operator="MTN")) == [0, 2]
+    assert list(index.range(16, operator="MTN")) == []
+    assert list(index.range(operator="Nobody")) == []
+    assert (index.first_epoch(), index.last_epoch(), len(index)) == (10, 30, 4)
+
+
+def log_segments(store):
+    return [store._segment_path(segment["name"]) for segment in store.index["segments"]]
+
+
+def test_log_rolls_over_segments(tmp_path):
+    store = SegmentLogStore(str(tmp_path / "readings"), fsync="never", segment_bytes=2048)
+    for i in range(100):
+        store.append(reading(i))
+    assert len(log_segments(store)) > 1
+    store.close()
+    store = SegmentLogStore(str(tmp_path / "readings"), fsync="never", segment_bytes=2048)
+    assert [r["id"] for r in store] == list(range(1, 101))
+    store.close()
+
+
+def test_log_truncates_torn_tail_on_reopen(tmp_path):
+    store = SegmentLogStore(str(tmp_path / "readings"), fsync="never")
+    store.append_many([reading(i) for i in range(10)])
+    store.close()
+    with open(log_segments(store)[-1], 'ab') as f:
+        f.write(b'{"id": 11, "operator": "MT')      # crash in the middle of a write
+    store = SegmentLogStore(str(tmp_path / "readings"), fsync="never")
+    assert store.count() == 10
+    assert store.append(reading(10))["id"] == 11
+    store.close()
+    store = SegmentLogStore(str(tmp_path / "readings"), fsync="never")
+    assert without_id(store) == [reading(i) for i in range(11)]
+    store.close()
+
+
+def test_log_recovers_records_after_last_checkpoint(tmp_path):
+    crashed = SegmentLogStore(str(tmp_path / "readings"), fsync="never", checkpoint_every=1000)
+    crashed.append_many([reading(i) for i in range(5)])
+    crashed.flush()
+    # Reopened without close(): index.json still says the log is empty
+    store = SegmentLogStore(str(tmp_path / "readings"), fsync="never")
+    assert [r["id"] for r in store] == [1, 2, 3, 4, 5]
+    assert store.append(reading(5))["id"] == 6
+    store.close()
+    crashed.close()
+
+
+def test_log_migrates_legacy_json_array(tmp_path):
+    legacy = tmp_path / "network_readings.json"
+    legacy.write_text(json.dumps([dict(reading(i), id=i + 10) for i in range(3)]))
+    store = SegmentLogStore(str(tmp_path / "readings"), fsync="never", legacy_file=str(legacy))
+    assert [r["id"] for r in store] == [10, 11, 12]
+    assert store.append(reading(3))["id"] == 13
+    store.close()
+    # Only once
+    store = SegmentLogStore(str(tmp_path / "readings"), fsync="never", legacy_file=str(legacy))
+    assert store.count() == 4
+    store.close()
+
+
+def test_log_rebuilds_missing_time_index(tmp_path):
+    store = SegmentLogStore(str(tmp_path / "readings"), fsync="never")
+    store.append_many([reading(i) for i in range(30)])
+    store.close()
+    for path in log_segments(store):
+        os.remove(path[:-len(".ndjson")] + ".tix")
+    store = SegmentLogStore(str(tmp_path / "readings"), fsync="never")
+    assert [r["id"] for r in store.scan(NOW + 10, NOW + 20, operator="Glo")] == [11, 14, 17, 20]
+    store.close()
+
+
+def test_binary_truncates_torn_record_on_reopen(tmp_path):
+    path = str(tmp_path / "readings.bin")
+    store = BinaryStore(path)
+    store.append_many([reading(i) for i in range(10)])
+    store.close()
+    with open(path, 'ab') as f:
+        f.write(b"\x0b\x00\x00\x00\x01\x02")     # crash in the middle of a write
+    store = BinaryStore(path)
+    assert store.count() == 10
+    assert store.append(reading(10))["id"] == 11
+    store.close()
+    store = BinaryStore(path)
+    assert without_id(store) == [reading(i) for i in range(11)]
+    store.close()
+
+
+def test_binary_compact_reading(tmp_path):
+    store = BinaryStore(str(tmp_path / "readings.bin"))
+    store.append(dict(reading(0), signal_strength=-71.5, device_id="861234567890123", longitude="Unknown"))
+    stored = store.latest()
+    assert isinstance(stored, CompactReading)
+    assert stored["signal_strength"] == -71.5 and stored["longitude"] == "Unknown"
+    assert stored.get("device_id") == "861234567890123"
+    assert stored.get("missing", "default") == "default"
+    assert stored["timestamp"] == reading(0)["timestamp"]
+    assert dict(stored) == dict(reading(0), id=1, signal_strength=-71.5, device_id="861234567890123",
+                                longitude="Unknown")
+    store.close()
+
+
+def test_binary_new_operators_go_to_the_dictionary(tmp_path):
+    operators = tmp_path / "network_operators.json"
+    operators.write_text(json.dumps([{"id": 1, "name": "MTN"}, {"id": 3, "name": "Glo"}]))
+    path = str(tmp_path / "readings.bin")
+    store = BinaryStore(path, operators_file=str(operators))
+    store.append_many([reading(0, "Glo"), reading(1, "9mobile")])
+    assert store.dictionary()["operators"] == [None, "MTN", None, "Glo", "9mobile"]
+    store.close()
+    store = BinaryStore(path, operators_file=str(operators))
+    assert [r["operator"] for r in store] == ["Glo", "9mobile"]
+    assert [r["id"] for r in store.scan(operator="9mobile")] == [2]
+    store.close()
+
+
+def test_binary_view_maps_the_file(tmp_path):
+    store = BinaryStore(str(tmp_path / "readings.bin"))
+    assert len(store.view()) == 0
+    store.append_many([reading(i) for i in (0, 5, 2, 9, 1)])
+    records = store.view()
+    assert records.dtype.itemsize == 26
+    assert list(records["id"]) == [1, 2, 3, 4, 5]
+    assert list(records["dbm"]) == [-600, -650, -620, -690, -610]
+    assert records.base is not None
+    # One contiguous run is still a view; anything else is gathered in time order
+    assert list(store.view(NOW + 2, NOW + 6)["id"]) == [3, 2]
+    assert list(store.view(NOW, NOW + 3)["id"]) == [1, 5, 3]
+    store.close()
+
+
+def test_binary_sees_other_instances(tmp_path):
+    path = str(tmp_path / "readings.bin")
+    ours, theirs = BinaryStore(path), BinaryStore(path)
+    ours.append_many([reading(i) for i in range(5)])
+    assert theirs.append(reading(5))["id"] == 6
+    ours.refresh()
+    assert [r["id"] for r in ours.take_foreign()] == [6]
+    assert ours.take_foreign() == []
+    assert ours.count() == 6
+    # expire() swaps in a new file; the other instance reopens it before appending
+    assert theirs.expire(theirs.plan_expiry(NOW + 3)) == 3
+    assert ours.append(reading(6))["id"] == 7
+    theirs.refresh()
+    assert [r["id"] for r in theirs] == [4, 5, 6, 7]
+    assert [r["id"] for r in theirs.take_foreign()] == [7]
+    ours.close()
+    theirs.close()
+
+
+def test_binary_migrates_legacy_json_array(tmp_path):
+    legacy = tmp_path / "network_readings.json"
+    legacy.write_text(json.dumps([dict(reading(i), id=i + 10) for i in range(3)]))
+    store = BinaryStore(str(tmp_path / "readings.bin"), legacy_file=str(legacy))
+    assert [r["id"] for r in store] == [10, 11, 12]
+    assert store.take_foreign() == []
+    assert store.append(reading(3))["id"] == 13
+    store.close()
+    store = BinaryStore(str(tmp_path / "readings.bin"), legacy_file=str(legacy))
+    assert store.count() == 4
+    store.close()
+
+
+def test_sqlite_import_keeps_ids_and_seeds_operators(tmp_path):
+    operators_file = tmp_path / "operators.json"
+    operators_file.write_text(json.dumps([{"id": 1, "name": "MTN", "country_code": "NG", "network_code": "003"}]))
+    store = SQLiteStore(str(tmp_path / "network.db"), operators_file=str(operators_file))
+    assert [operator["name"] for operator in store.get_operators()] == ["MTN"]
+    assert store.import_readings([dict(reading(i), id=i * 10) for i in range(1, 4)]) == 3
+    assert [r["id"] for r in store] == [10, 20, 30]
+    assert store.append(reading(4))["id"] == 31
+    store.close()
@@ -0,0 +1,149 @@
+import time, threading
+
+import pytest
+
+from application.writer import GroupCommitWriter, WriterBusy
+
+
+class Store(object):
+    """commit/sync pair that records groups and can be held to fill the queue"""
+    def __init__(self):
+        self.groups = []
+        self.syncs = 0
+        self.release = threading.Event()
+        self.release.set()
+
+    def commit(self, readings):
+        self.release.wait(5)
+        self.groups.append(list(readings))
+
+    def sync(self):
+        self.syncs += 1
+
+
+def test_queued_readings_are_committed_in_groups():
+    store = Store()
+    store.release.clear()
+    writer = GroupCommitWriter(store.commit, max_batch=100, max_delay=0.05)
+    writer.submit([{"i": 0}])
+    for i in range(1, 10):
+        writer.submit([{"i": i}])
+    store.release.set()
+    writer.close()
+    assert [reading["i"] for group in store.groups for reading in group] == list(range(10))
+    # The first reading went out alone while the rest queued behind it
+    assert len(store.groups) < 10
+    assert writer.stats()["committed"] == 10 and writer.stats()["batches"] == len(store.groups)
+
+
+def test_full_queue_raises_writer_busy():
+    store = Store()
+    store.release.clear()
+    writer = GroupCommitWriter(store.commit, max_queue=2, max_delay=0)
+    writer.submit([{"i": 0}])
+    while writer.depth():       # the writer thread holds the first entry in commit()
+        pass
+    writer.submit([{"i": 1}])
+    writer.submit([{"i": 2}])
+    with pytest.raises(WriterBusy):
+        writer.submit([{"i": 3}])
+    assert writer.stats()["rejected"] == 1
+    store.release.set()
+    writer.close()
+    assert sum(len(group) for group in store.groups) == 3
+
+
+def test_durable_submit_waits_for_commit_and_sync():
+    store = Store()
+    writer = GroupCommitWriter(store.commit, sync=store.sync)
+    writer.submit([{"i": 0}])
+    writer.close()
+    assert store.syncs == 0
+    writer = GroupCommitWriter(store.commit, sync=store.sync)
+    writer.submit([{"i": 1}], durable=True)
+    assert store.groups[-1] == [{"i": 1}] and store.syncs == 1
+    writer.close()
+
+
+def test_durable_submit_raises_the_commit_error():
+    def commit(readings):
+        raise IOError("disk full")
+    writer = GroupCommitWriter(commit)
+    with pytest.raises(IOError):
+        writer.submit([{"i": 0}], durable=True)
+    writer.close()
+
+
+def test_close_drains_the_queue_and_refuses_new_writes():
+    store = Store()
+    store.release.clear()
+    writer = GroupCommitWriter(store.commit, max_batch=10, max_delay=0)
+    for i in range(50):
+        writer.submit([{"i": i}])
+    store.release.set()
+    writer.close()
+    assert sum(len(group) for group in store.groups) == 50
+    assert writer.depth() == 0
+    with pytest.raises(WriterBusy):
+        writer.submit([{"i": 50}])
+
+
+def test_full_queue_answers_429(client, monkeypatch):
+    from application import routes
+    store = Store()
+    store.release.clear()
+    writer = GroupCommitWriter(store.commit, max_queue=1, max_delay=0)
+    monkeypatch.setattr(routes.data_handler, "writer", writer)
+    reading = {"operator": "MTN", "signal_strength": -70, "network_type": "4G", "latitude": 6.5, "longitude": 3.3}
+    assert client.post("/api/record", json=dict(reading)).status_code == 201
+    while writer.depth():
+        pass
+    assert client.post("/api/record", json=dict(reading)).status_code == 201
+    response = client.post("/api/record", json=dict(reading))
+    assert response.status_code == 429 and response.headers["Retry-After"] == "1"
+    response = client.post("/api/record/batch", json=[dict(reading)])
+    assert response.status_code == 429
+    store.release.set()
+    writer.close()
+    assert sum(len(group) for group in store.groups) == 2
+
+
+def test_failed_group_is_retried():
+    store, failures = Store(), [IOError("locked")]
+
+    def commit(readings):
+        if failures:
+            raise failures.pop()
+        store.commit(readings)
+    writer = GroupCommitWriter(commit, retry_delay=0)
+    writer.submit([{"i": 0}], durable=True)
+    assert store.groups == [[{"i": 0}]]
+    assert writer.stats()["failures"] == 1 and writer.stats()["lost"] == 0
+    writer.close()
+
+
+def test_readings_of_a_group_that_keeps_failing_are_counted_as_lost():
+    from application.metrics import WRITER_LOST
+
+    def commit(readings):
+        raise IOError("disk full")
+    lost = WRITER_LOST.values.get((), 0)
+    writer = GroupCommitWriter(commit, retries=1, retry_delay=0)
+    writer.submit([{"i": 0}, {"i": 1}])
+    writer.close()
+    assert writer.stats()["failures"] == 2 and writer.stats()["lost"] == 2
+    assert WRITER_LOST.values[()] == lost + 2
+
+
+def test_close_does_not_hang_on_a_stuck_full_queue():
+    store = Store()
+    store.release.clear()
+    writer = GroupCommitWriter(store.commit, max_queue=1, max_delay=0)
+    writer.submit([{"i": 0}])
+    while writer.depth():
+        pass
+    writer.submit([{"i": 1}])
+    started = time.monotonic()
+    writer.close(timeout=0.2)
+    assert time.monotonic() - started < 1
+    store.release.set()
@@ -0,0 +1,13 @@
+"""WSGI entry point for production serving.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Every worker process imports the app and opens the same data directory.
+Writes are serialised with file locks, ids stay unique and increasing, and
+each worker picks up the readings the others saved (see FOLLOW_INTERVAL).
+The first worker to handle a request claims the SIM800C module; the
+others serve its status and take over if it exits.
+"""
+from application import app
+
+application = app